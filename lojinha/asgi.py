@@ -0,0 +1,27 @@
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lojinha.settings')
+django_application = get_asgi_application()
+
+from shop.services.payments import close_async_clients, register_loop  # noqa: E402 (depois do setup)
+
+
+async def application(scope, receive, send):
+    """
+    Django + lifespan: o loop do servidor guarda o pool httpx do Mercado Pago
+    (registrado também na primeira requisição, para servidores sem lifespan)
+    e o fecha no shutdown.
+    """
+    if scope["type"] == "lifespan":
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                register_loop()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await close_async_clients()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+    register_loop()
+    await django_application(scope, receive, send)
@@ -1,30 +1,61 @@
 from pathlib import Path
 import os
 
-# __file__ may be missing in some environments (e.g., notebooks/sandboxes)
-if '__file__' in globals():
-    BASE_DIR = Path(__file__).resolve().parent.parent
-else:
-    cwd = Path().resolve()
-    candidates = [cwd, *cwd.parents]
-    base_guess = None
-    for p in candidates:
-        if (p / 'manage.py').exists() or (p.name == 'lojinha' and (p / 'lojinha').exists()):
-            base_guess = p
-            break
-    BASE_DIR = base_guess or cwd
+BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Parcelamento (sem juros)
 INSTALLMENTS_MAX = 6                 # máximo de parcelas
 INSTALLMENTS_MIN_PER_CENTS = 1000    # parcela mínima em centavos (R$ 10,00)
-# Token do Mercado Pago (use seu TEST/PROD)
-MERCADO_PAGO_ACCESS_TOKEN = os.getenv("MERCADO_PAGO_ACCESS_TOKEN", "")
+# Facetas do catálogo (contagens por categoria/faixa de preço) em cache por N segundos
+CATALOG_FACETS_TTL = int(os.getenv("CATALOG_FACETS_TTL", "60"))
+# Árvore de categorias (menu, breadcrumbs, filtro por subárvore) em cache; cai junto com o catálogo
+CATEGORY_TREE_TTL = 3600
+# Produtos relacionados exibidos no detalhe (tabela recalculada por `manage.py rebuild_related`)
+RELATED_PRODUCTS_MAX = 8
+# Sugestões da busca: índice de prefixos em memória por processo (limite de chaves)
+# e intervalo para conferir a versão do catálogo e aplicar as mudanças
+SUGGEST_MAX_ENTRIES = int(os.getenv("SUGGEST_MAX_ENTRIES", "500000"))
+SUGGEST_REFRESH_SECONDS = float(os.getenv("SUGGEST_REFRESH_SECONDS", "5"))
+# Catálogo sem SQL para filtrar/ordenar: índice colunar em memória por processo (shop/catalog_index.py),
+# conferido contra a versão do catálogo a cada N segundos e remontado a cada MAX_AGE (popularidade)
+CATALOG_INDEX_ENABLED = os.getenv("CATALOG_INDEX_ENABLED", "").lower() in ("1", "true", "yes")
+CATALOG_INDEX_REFRESH_SECONDS = float(os.getenv("CATALOG_INDEX_REFRESH_SECONDS", "5"))
+CATALOG_INDEX_MAX_AGE = float(os.getenv("CATALOG_INDEX_MAX_AGE", "300"))
+# Snapshot estático (`manage.py build_snapshot`) servido pelo nginx/CDN: destino e
+# quantas páginas de cada listagem (categoria x ordenação) são pré-renderizadas
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", str(BASE_DIR / "snapshot")))
+SNAPSHOT_CATALOG_PAGES = int(os.getenv("SNAPSHOT_CATALOG_PAGES", "3"))
+
+# Proxy de imagens dos produtos: miniaturas WebP em disco com limite de tamanho (LRU)
+PRODUCT_IMAGE_WIDTHS = (240, 480, 960)
+PRODUCT_IMAGE_CACHE_DIR = BASE_DIR / "media" / "thumbs"
+PRODUCT_IMAGE_CACHE_MAX_BYTES = int(os.getenv("PRODUCT_IMAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Origem que falhou (404, timeout, imagem inválida) não é consultada de novo por N segundos
+PRODUCT_IMAGE_FAILURE_TTL = int(os.getenv("PRODUCT_IMAGE_FAILURE_TTL", "60"))
+
+# Pedidos pendentes mais velhos que isso são cancelados por `manage.py expire_pending_orders`
+PENDING_ORDER_TTL_MINUTES = int(os.getenv("PENDING_ORDER_TTL_MINUTES", str(24 * 60)))
+# Reserva de estoque feita no checkout; vencida, as unidades voltam a ficar disponíveis
+STOCK_RESERVATION_TTL_MINUTES = int(os.getenv("STOCK_RESERVATION_TTL_MINUTES", "30"))
+# Página do pedido: resumo dos itens em cache e duração máxima de cada conexão SSE (ASGI);
+# sob WSGI a resposta é curta e o navegador reconecta a cada ORDER_STREAM_RETRY_MS
+ORDER_SUMMARY_TTL = 3600
+ORDER_STREAM_MAX_SECONDS = int(os.getenv("ORDER_STREAM_MAX_SECONDS", "300"))
+ORDER_STREAM_RETRY_MS = int(os.getenv("ORDER_STREAM_RETRY_MS", "3000"))
+# Histórico de pedidos após o OTP: validade do token assinado e pedidos por página
+ORDER_HISTORY_TOKEN_TTL = int(os.getenv("ORDER_HISTORY_TOKEN_TTL", "900"))
+ORDER_HISTORY_PAGE_SIZE = 20
+
+# Idempotency-Key nos checkouts: por quanto tempo a resposta é reaproveitada e
+# quanto uma duplicata concorrente espera a requisição original terminar
+IDEMPOTENCY_TTL_HOURS = int(os.getenv("IDEMPOTENCY_TTL_HOURS", "24"))
+IDEMPOTENCY_WAIT_SECONDS = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "10"))
 
 # Habilite MOCK para desenvolver sem token real
 PAYMENTS_MOCK = os.getenv("PAYMENTS_MOCK", "").lower() in ("1", "true", "yes")
 
 SECRET_KEY = "troque-por-uma-chave-segura"
-DEBUG = True
+DEBUG = os.getenv("DJANGO_DEBUG", "1").lower() in ("1", "true", "yes")
 ALLOWED_HOSTS = ["*"]
 
 INSTALLED_APPS = [
@@ -38,6 +69,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "shop.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -46,10 +78,53 @@ MIDDLEWARE = [
     "django.contrib.messages.middleware.MessageMiddleware",
 ]
 
+# /metrics: fração das requisições que alimenta os histogramas (0..1) e token opcional
+METRICS_SAMPLE_RATE = float(os.getenv("METRICS_SAMPLE_RATE", "1.0"))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+# Cache compartilhado: locmem (por processo) | file | redis (qualquer servidor
+# compatível com o protocolo Redis, ex.: Valkey/KeyDB/um redis-server local)
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "locmem")
+CACHES = {
+    "default": {
+        "locmem": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "lojinha",
+            "OPTIONS": {"MAX_ENTRIES": 10000},
+        },
+        "file": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.getenv("CACHE_LOCATION") or str(BASE_DIR / ".cache"),
+            "OPTIONS": {"MAX_ENTRIES": 50000},
+        },
+        "redis": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.getenv("CACHE_LOCATION") or "redis://127.0.0.1:6379/1",
+        },
+    }[CACHE_BACKEND]
+}
+CACHES["default"]["KEY_PREFIX"] = "lojinha"
+CACHES["default"]["TIMEOUT"] = 300
+
+# Sessões (carrinho): db | cached_db (cache + escrita no banco) | cache | file
+SESSION_PROFILE = os.getenv("SESSION_PROFILE", "db")
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "cache": "django.contrib.sessions.backends.cache",
+    "file": "django.contrib.sessions.backends.file",
+}[SESSION_PROFILE]
+SESSION_FILE_PATH = os.getenv("SESSION_FILE_PATH") or None
+SESSION_COOKIE_AGE = int(os.getenv("SESSION_COOKIE_AGE", str(14 * 24 * 3600)))
+
+# Boot de um worker (django.setup() + URLs) não deve passar disso; ver `manage.py profile_imports`
+STARTUP_BUDGET_MS = float(os.getenv("STARTUP_BUDGET_MS", "1500"))
+
 ROOT_URLCONF = "lojinha.urls"
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates + medição do tempo de render (ver shop.metrics)
+        "BACKEND": "shop.metrics.InstrumentedDjangoTemplates",
         "DIRS": [],
         "APP_DIRS": True,
         "OPTIONS": {"context_processors": [
@@ -61,6 +136,8 @@ TEMPLATES = [
     }
 ]
 WSGI_APPLICATION = "lojinha.wsgi.application"
+# ASGI (ex.: `uvicorn lojinha.asgi:application`): checkout, webhook e lookup são views async
+ASGI_APPLICATION = "lojinha.asgi.application"
 
 DATABASES = {
     "default": {
@@ -69,7 +146,20 @@ DATABASES = {
     }
 }
 
-STATIC_URL = "static/"
+# Estáticos: em produção (DEBUG=0) o collectstatic gera nomes com hash do
+# conteúdo + variantes .gz/.br; em desenvolvimento servimos os originais.
+STATIC_URL = "/static/"
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {
+        "BACKEND": (
+            "django.contrib.staticfiles.storage.StaticFilesStorage"
+            if DEBUG
+            else "shop.staticfiles.CompressedManifestStaticFilesStorage"
+        ),
+    },
+}
 
 TIME_ZONE = "America/Sao_Paulo"
 USE_TZ = True
@@ -77,16 +167,14 @@ USE_TZ = True
 EMAIL_BACKEND = os.getenv("EMAIL_BACKEND", "django.core.mail.backends.console.EmailBackend")
 DEFAULT_FROM_EMAIL = os.getenv("DEFAULT_FROM_EMAIL", "noreply@sualoja.com")
 
+# Token do Mercado Pago (use seu TEST/PROD)
 MERCADO_PAGO_ACCESS_TOKEN = os.getenv("MERCADO_PAGO_ACCESS_TOKEN", "")
 MERCADO_PAGO_WEBHOOK_SECRET = os.getenv("MERCADO_PAGO_WEBHOOK_SECRET", "")
-
-BASE_DIR = Path(__file__).resolve().parent.parent
-STATIC_URL = "/static/"
-STATICFILES_DIRS = [
-    os.path.join(BASE_DIR, "static")
-]
-
-
+# Notificações com `ts` da assinatura mais distante que isso (segundos) são recusadas
+MERCADO_PAGO_WEBHOOK_TOLERANCE = int(os.getenv("MERCADO_PAGO_WEBHOOK_TOLERANCE", "300"))
+# Base da API (aponte para um stub local em testes/benchmarks) e tamanho do pool async
+MERCADO_PAGO_API_BASE = os.getenv("MERCADO_PAGO_API_BASE", "https://api.mercadopago.com")
+MERCADO_PAGO_MAX_CONNECTIONS = int(os.getenv("MERCADO_PAGO_MAX_CONNECTIONS", "100"))
 
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'painel:lista_produtos'
@@ -1,9 +1,15 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
+
+from shop.metrics import metrics_view
+from shop.staticfiles import serve_static
 
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('accounts/', include('django.contrib.auth.urls')),
     path('painel/', include('shop.painel_urls')),
+    path("metrics", metrics_view, name="metrics"),
+    # em DEBUG o runserver intercepta /static/ antes; em produção prefira nginx/CDN
+    re_path(r"^static/(?P<path>.+)$", serve_static, name="static"),
     path("", include("shop.urls")),
 ]
\ No newline at end of file
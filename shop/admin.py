@@ -1,31 +1,119 @@
 from django.contrib import admin
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q, QuerySet
+from django.db.models.functions import Lower
+from django.utils.functional import cached_property
+
 from .models import Product, Order, OrderItem, Category
+from .utils import normalize_email, normalize_short_code
+
+
+class LargeTablePaginator(Paginator):
+    """
+    Paginador das listas grandes: sem filtros no PostgreSQL, usa a estimativa
+    de linhas do planner (pg_class.reltuples) em vez de um COUNT(*) na tabela
+    inteira. Com filtros, ou em outros bancos, conta normalmente.
+    """
+    ESTIMATE_FROM = 100_000
+
+    @cached_property
+    def count(self):
+        qs = self.object_list
+        if isinstance(qs, QuerySet) and not qs.query.where:
+            connection = connections[qs.db]
+            if connection.vendor == "postgresql":
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [qs.model._meta.db_table])
+                    row = cursor.fetchone()
+                if row and row[0] >= self.ESTIMATE_FROM:
+                    return row[0]
+        return super().count
+
+
+def prefix_q(field, prefix):
+    """
+    Prefixo que usa índice btree: a faixa [prefixo, prefixo com o último
+    caractere + 1) é uma busca no índice (ordem binária: SQLite, ou collation
+    "C" no PostgreSQL); o LIKE só confere as linhas da faixa. Um istartswith
+    sozinho vira LIKE/UPPER(...) LIKE e varre a tabela.
+    """
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return Q(**{f"{field}__gte": prefix, f"{field}__lt": upper, f"{field}__startswith": prefix})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Perfil das tabelas que crescem sem limite: sem COUNT(*) extra nem selects gigantes."""
+    paginator = LargeTablePaginator
+    show_full_result_count = False
+    list_per_page = 50
+
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Admins com `search_q(queryset, termo) -> (queryset, Q)` montam filtros que
+        usam índice; sem ele (ou sem termo), vale a busca padrão do Django.
+        """
+        search_q = getattr(self, "search_q", None)
+        term = search_term.strip()
+        if search_q is None or not term:
+            return super().get_search_results(request, queryset, search_term)
+        queryset, q = search_q(queryset, term)
+        return queryset.filter(q), False
+
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ("name", "slug", "featured")
+    list_display = ("name", "slug", "path", "featured")
+    list_select_related = ("parent",)
+    ordering = ("path",)  # pai seguido das subcategorias
+    autocomplete_fields = ("parent",)
+    search_fields = ("name", "=slug")  # usado pelo autocomplete de Product.category
     prepopulated_fields = {"slug": ("name",)}
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ("title", "price_cents", "stock", "active", "featured", "category", "created_at")
+class ProductAdmin(LargeTableAdmin):
+    list_display = ("title", "price_cents", "stock", "reserved", "active", "featured", "category", "created_at")
     list_filter = ("active", "featured", "category")
-    search_fields = ("title", "slug", "description")
+    list_select_related = ("category",)
+    # liga a caixa de busca (e o autocomplete); a consulta de verdade está em search_q
+    search_fields = ("^title", "=slug")
+    date_hierarchy = "created_at"
+    autocomplete_fields = ("category",)
     prepopulated_fields = {"slug": ("title",)}
 
+    def search_q(self, queryset, term):
+        # prefixo sem diferenciar maiúsculas no índice em lower(title), e slug exato
+        queryset = queryset.alias(title_lower=Lower("title"))
+        return queryset, Q(slug=term) | prefix_q("title_lower", term.lower())
+
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
     readonly_fields = ('product', 'qty', 'unit_price_cents') 
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("product")
+
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
-    list_display = ("id", "short_code", "status", "customer_email", "total_cents", "created_at")
+class OrderAdmin(LargeTableAdmin):
+    list_display = ("id", "short_code", "status", "customer_email", "total_cents", "stock_shortfall", "created_at")
     list_filter = ("status",)
-    search_fields = ("short_code", "customer_email")
+    search_fields = ("=short_code", "^customer_email")
+    date_hierarchy = "created_at"
     inlines = (OrderItemInline,)
-    readonly_fields = ('created_at', 'total_cents', 'customer_email', 'customer_phone', 'public_token', 'short_code') 
+    readonly_fields = ('created_at', 'total_cents', 'customer_email', 'customer_phone', 'public_token', 'short_code', 'stock_shortfall') 
+
+    def search_q(self, queryset, term):
+        # short_code e e-mail são gravados normalizados: igualdade e faixa no índice, sem UPPER()
+        return queryset, Q(short_code=normalize_short_code(term)) | prefix_q("customer_email", normalize_email(term))
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
-    list_display = ("order", "product", "qty", "unit_price_cents")
\ No newline at end of file
+class OrderItemAdmin(LargeTableAdmin):
+    list_display = ("order", "product", "qty", "unit_price_cents")
+    list_select_related = ("order", "product")
+    search_fields = ("=order__short_code",)
+    raw_id_fields = ("order",)
+    autocomplete_fields = ("product",)
+
+    def search_q(self, queryset, term):
+        return queryset, Q(order__short_code=normalize_short_code(term))
@@ -0,0 +1,297 @@
+"""
+Utilitários do benchmark da loja: geração de catálogo sintético, medição de
+cenários (latência + queries) e comparação com um baseline salvo em JSON.
+Usado pelo comando `manage.py bench`.
+"""
+import json
+import random
+import statistics
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from pathlib import Path
+from urllib.parse import parse_qs
+
+from django.db import OperationalError, connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from . import inventory
+from .models import Category, Order, OrderItem, Product
+
+BATCH = 5000
+
+
+def seed_catalog(products=10000, categories=50, orders=1000, seed=42, stdout=None):
+    """
+    Cria um catálogo sintético determinístico (mesmo `seed` => mesmos dados).
+    Usa bulk_create em lotes para aguentar de 10k a 1M de produtos.
+    """
+    rng = random.Random(seed)
+    cats = Category.objects.bulk_create(
+        [Category(name=f"Categoria {i}", slug=f"bench-cat-{i}", featured=i % 10 == 0) for i in range(categories)],
+        batch_size=BATCH,
+    )
+    words = ["camiseta", "caneca", "livro", "fone", "mochila", "relógio", "tênis", "garrafa", "boné", "caderno"]
+
+    created = 0
+    while created < products:
+        n = min(BATCH, products - created)
+        Product.objects.bulk_create(
+            [
+                Product(
+                    title=f"{rng.choice(words).title()} {created + i}",
+                    slug=f"bench-{created + i}",
+                    description=f"Produto sintético {created + i}",
+                    price_cents=rng.randint(500, 100000),
+                    stock=rng.randint(0, 50),
+                    category=rng.choice(cats) if cats else None,
+                    featured=rng.random() < 0.05,
+                    views=rng.randint(0, 10000),
+                )
+                for i in range(n)
+            ],
+            batch_size=BATCH,
+        )
+        created += n
+        if stdout:
+            stdout.write(f"  produtos: {created}/{products}")
+
+    product_ids = list(Product.objects.filter(slug__startswith="bench-").values_list("id", "price_cents"))
+    done = 0
+    while done < orders:
+        n = min(BATCH, orders - done)
+        batch = Order.objects.bulk_create(
+            [
+                Order(
+                    customer_email=f"cliente{rng.randint(1, max(1, orders // 3))}@bench.test",
+                    status=rng.choice(["pending", "paid", "paid", "canceled"]),
+                )
+                for _ in range(n)
+            ],
+            batch_size=BATCH,
+        )
+        items = []
+        for order in batch:
+            for pid, price in rng.sample(product_ids, k=min(len(product_ids), rng.randint(1, 3))):
+                items.append(OrderItem(order=order, product_id=pid, qty=rng.randint(1, 3), unit_price_cents=price))
+        OrderItem.objects.bulk_create(items, batch_size=BATCH)
+        done += n
+    return {"products": products, "categories": categories, "orders": orders}
+
+
+def percentile(values, pct):
+    """Percentil por interpolação linear (pct em 0..100)."""
+    if not values:
+        return 0.0
+    data = sorted(values)
+    k = (len(data) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(data) - 1)
+    return data[lo] + (data[hi] - data[lo]) * (k - lo)
+
+
+class Recorder:
+    """Acumula latências (ms) e queries por cenário."""
+
+    def __init__(self):
+        self.samples = {}
+
+    def measure(self, scenario, fn):
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            result = fn()
+            elapsed = (time.perf_counter() - start) * 1000
+        lat, queries = self.samples.setdefault(scenario, ([], []))
+        lat.append(elapsed)
+        queries.append(len(ctx.captured_queries))
+        return result
+
+    def summary(self):
+        out = {}
+        for scenario, (lat, queries) in sorted(self.samples.items()):
+            out[scenario] = {
+                "n": len(lat),
+                "p50_ms": round(percentile(lat, 50), 3),
+                "p95_ms": round(percentile(lat, 95), 3),
+                "p99_ms": round(percentile(lat, 99), 3),
+                "queries": round(statistics.mean(queries), 2),
+            }
+        return out
+
+
+def compare(current, baseline, tolerance=0.2):
+    """
+    Lista de regressões: p95 acima de baseline*(1+tolerance) ou mais queries
+    por requisição do que no baseline. Cenários novos são ignorados.
+    """
+    problems = []
+    for scenario, cur in current.items():
+        base = baseline.get(scenario)
+        if not base:
+            continue
+        if cur["queries"] > base["queries"]:
+            problems.append(f"{scenario}: queries {base['queries']} -> {cur['queries']}")
+        limit = base["p95_ms"] * (1 + tolerance)
+        if cur["p95_ms"] > limit:
+            problems.append(f"{scenario}: p95 {base['p95_ms']}ms -> {cur['p95_ms']}ms (limite {limit:.1f}ms)")
+    return problems
+
+
+def load_baseline(path):
+    path = Path(path)
+    if not path.exists():
+        return None
+    return json.loads(path.read_text())["scenarios"]
+
+
+def save_results(path, summary, meta):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps({"meta": meta, "scenarios": summary}, indent=2, sort_keys=True))
+
+
+def stress_reservations(product, threads=8, attempts=50, qty=1):
+    """
+    Dispara `threads` x `attempts` checkouts concorrentes do mesmo produto
+    (pedido + reserva numa transação). Retorna {reserved, rejected, retries,
+    seconds, per_second}; `reserved * qty` nunca passa do estoque.
+    Bloqueios do banco (SQLite serializa escritas) são repetidos e contados.
+    """
+    counts = {"reserved": 0, "rejected": 0, "retries": 0}
+    lock = threading.Lock()
+    start_gate = threading.Barrier(threads)
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def buyer():
+        try:
+            start_gate.wait()
+            for _ in range(attempts):
+                while True:
+                    try:
+                        with transaction.atomic():
+                            order = Order.objects.create(total_cents=product.price_cents * qty)
+                            inventory.reserve(order, [(product.pk, qty)])
+                        bump("reserved")
+                    except inventory.OutOfStock:
+                        bump("rejected")
+                    except OperationalError:
+                        bump("retries")
+                        time.sleep(0.001)
+                        continue
+                    break
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=buyer) for _ in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    seconds = time.perf_counter() - start
+    total = counts["reserved"] + counts["rejected"]
+    return {**counts, "seconds": round(seconds, 3), "per_second": round(total / seconds, 1) if seconds else 0.0}
+
+
+class StubMercadoPago:
+    """
+    Stub HTTP local da API do Mercado Pago com latência artificial, para
+    benchmarks e testes sem rede. Use `MERCADO_PAGO_API_BASE=stub.url`.
+      - POST /checkout/preferences -> {id, init_point}
+      - GET  /v1/payments/<id>     -> status de `payments` (padrão: approved)
+      - GET  /v1/payments/search   -> busca paginada sobre `payments` (ver search)
+    """
+
+    def __init__(self, latency_ms=0, payments=None):
+        self.latency = latency_ms / 1000.0
+        self.payments = payments if payments is not None else {}
+        self.hits = 0
+        self.searches = 0
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_POST(self):
+                stub._hit()
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if self.path.rstrip("/") != "/checkout/preferences":
+                    return self._reply(404, {"message": "not found"})
+                pref_id = f"stub_pref_{next(stub._ids)}"
+                ref = payload.get("external_reference", "")
+                self._reply(201, {"id": pref_id, "init_point": f"https://stub.invalid/checkout?ref={ref}"})
+
+            def do_GET(self):
+                stub._hit()
+                path, _, query = self.path.partition("?")
+                if path.rstrip("/") == "/v1/payments/search":
+                    return self._reply(200, stub.search(parse_qs(query)))
+                prefix = "/v1/payments/"
+                if not self.path.startswith(prefix):
+                    return self._reply(404, {"message": "not found"})
+                payment_id = self.path[len(prefix):]
+                info = stub.payments.get(payment_id, {"status": "approved", "external_reference": payment_id})
+                self._reply(200, {"id": payment_id, **info})
+
+        class Server(ThreadingHTTPServer):
+            daemon_threads = True
+            request_queue_size = 512
+
+        self.httpd = Server(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+
+    def search(self, query):
+        """/v1/payments/search: filtro por external_reference e faixa de date_created, paginado."""
+        def param(name, default=None):
+            return query.get(name, [default])[0]
+
+        begin, end = param("begin_date"), param("end_date")
+        found = [
+            {"id": pid, **info}
+            for pid, info in self.payments.items()
+            if (not param("external_reference") or info.get("external_reference") == param("external_reference"))
+            and (not begin or "date_created" not in info
+                 or datetime.fromisoformat(begin) <= datetime.fromisoformat(info["date_created"]) <= datetime.fromisoformat(end))
+        ]
+        found.sort(key=lambda p: (p.get("date_created") or "", p["id"]))
+        offset, limit = int(param("offset", 0)), int(param("limit", 30))
+        with self._lock:
+            self.searches += 1
+        return {"paging": {"total": len(found), "offset": offset, "limit": limit}, "results": found[offset:offset + limit]}
+
+    def _hit(self):
+        with self._lock:
+            self.hits += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,182 @@
+"""
+Ferramentas de cache da loja, sobre o backend `default` do Django:
+  - get_or_compute / @memoize: memoização com invalidação por tags
+  - proteção contra stampede: recálculo antecipado probabilístico (XFetch)
+    + lock curto via cache.add, servindo o valor antigo enquanto outro recalcula
+  - estatísticas de hit/miss por namespace (também expostas em /metrics)
+"""
+import functools
+import hashlib
+import math
+import random
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.query import QuerySet
+
+from . import metrics
+
+BETA = 1.0            # agressividade do recálculo antecipado (XFetch)
+LOCK_TIMEOUT = 30     # segundos; evita lock órfão se o processo morrer
+WAIT_FOR_VALUE = 2.0  # sem valor antigo, quanto esperar o recálculo alheio
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _count(namespace, result):
+    with _stats_lock:
+        ns = _stats.setdefault(namespace, {"hit": 0, "miss": 0, "stale": 0})
+        ns[result] += 1
+    metrics.registry.counter(
+        "cache_requests_total", "Consultas ao cache por namespace e resultado."
+    ).inc(namespace=namespace, result=result)
+
+
+def stats() -> dict:
+    """{namespace: {"hit", "miss", "stale", "hit_ratio"}} deste processo."""
+    with _stats_lock:
+        out = {ns: dict(v) for ns, v in _stats.items()}
+    for v in out.values():
+        total = v["hit"] + v["miss"] + v["stale"]
+        v["hit_ratio"] = round((v["hit"] + v["stale"]) / total, 4) if total else 0.0
+    return out
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _tag_key(tag):
+    return f"tag:{tag}"
+
+
+def tag_versions(tags) -> tuple:
+    """Versão atual de cada tag (criada sob demanda)."""
+    if not tags:
+        return ()
+    keys = [_tag_key(t) for t in tags]
+    found = cache.get_many(keys)
+    versions = []
+    for k in keys:
+        v = found.get(k)
+        if v is None:
+            v = _fresh_version()
+            cache.add(k, v, None)
+            v = cache.get(k, v)
+        versions.append(v)
+    return tuple(versions)
+
+
+def _fresh_version():
+    # baseado no relógio: se a chave da tag for despejada do cache, a versão
+    # recriada não coincide com a de entradas antigas
+    return time.time_ns() // 1000
+
+
+def _bump_tags(tags):
+    for tag in tags:
+        key = _tag_key(tag)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _fresh_version(), None)
+
+
+def invalidate_tags(*tags):
+    """
+    Invalida todas as entradas marcadas com as tags. Invalida já e de novo no
+    commit: quem recalcular durante a transação não deixa valor velho para trás.
+    """
+    _bump_tags(tags)
+    transaction.on_commit(lambda: _bump_tags(tags))
+
+
+def _entry_key(namespace, key, tags):
+    versions = ".".join(str(v) for v in tag_versions(tags))
+    return f"{namespace}:{versions}:{key}"
+
+
+def _materialize(value):
+    # querysets são preguiçosos: guardamos o resultado, não a consulta
+    if isinstance(value, QuerySet):
+        return list(value)
+    return value
+
+
+def _store(entry_key, compute, timeout):
+    start = time.perf_counter()
+    value = _materialize(compute())
+    delta = time.perf_counter() - start
+    cache.set(entry_key, (value, delta, time.time() + timeout), timeout)
+    return value
+
+
+def get_or_compute(namespace, key, compute, timeout=60, tags=()):
+    """
+    Valor em cache para (namespace, key), recalculando com `compute()` quando
+    ausente, invalidado por tag ou perto de expirar (XFetch). Só um processo
+    recalcula por vez; os demais usam o valor antigo se houver.
+    """
+    entry_key = _entry_key(namespace, key, tags)
+    entry = cache.get(entry_key)
+    lock_key = f"lock:{entry_key}"
+
+    if entry is not None:
+        value, delta, expires_at = entry
+        early = time.time() - delta * BETA * math.log(random.random() or 1e-12) >= expires_at
+        if not early:
+            _count(namespace, "hit")
+            return value
+        if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+            _count(namespace, "stale")
+            return value
+        try:
+            _count(namespace, "miss")
+            return _store(entry_key, compute, timeout)
+        finally:
+            cache.delete(lock_key)
+
+    _count(namespace, "miss")
+    if not cache.add(lock_key, 1, LOCK_TIMEOUT):
+        # outro processo está calculando: espera um pouco pelo resultado
+        deadline = time.monotonic() + WAIT_FOR_VALUE
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            entry = cache.get(entry_key)
+            if entry is not None:
+                return entry[0]
+        return _materialize(compute())
+    try:
+        return _store(entry_key, compute, timeout)
+    finally:
+        cache.delete(lock_key)
+
+
+def _args_key(args, kwargs):
+    raw = repr((args, sorted(kwargs.items())))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def memoize(namespace, timeout=60, tags=(), key_func=None):
+    """
+    Decorator de memoização via get_or_compute. Querysets devolvidos pela função
+    são avaliados e guardados como lista. `key_func(*args, **kwargs)` substitui a
+    chave padrão (hash do repr dos argumentos).
+
+        @memoize("home", timeout=300, tags=("catalog",))
+        def destaques():
+            return Product.objects.filter(featured=True)[:8]
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs) if key_func else _args_key(args, kwargs)
+            return get_or_compute(namespace, key, lambda: func(*args, **kwargs), timeout, tags)
+
+        wrapper.invalidate = lambda: invalidate_tags(*tags)
+        return wrapper
+    return decorator
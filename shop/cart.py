@@ -4,11 +4,14 @@ from .models import Product
 CART_KEY = "cart_v1"
 
 def _get(session) -> Dict[str, int]:
-    return session.get(CART_KEY, {}) or {}
+    # cópia: alterações só chegam à sessão via _save
+    return dict(session.get(CART_KEY) or {})
 
 def _save(session, cart: Dict[str, int]):
+    # sem mudança no carrinho => sessão não é marcada como modificada (sem escrita no backend)
+    if (session.get(CART_KEY) or {}) == cart:
+        return
     session[CART_KEY] = cart
-    session.modified = True
 
 def add(session, product_id: int, qty: int = 1):
     cart = _get(session)
@@ -26,6 +29,10 @@ def set_qty(session, product_id: int, qty: int):
         cart[pid] = qty
     _save(session, cart)
 
+def snapshot(session) -> Dict[str, int]:
+    """Cópia do carrinho cru ({product_id: qty}), sem consultar produtos."""
+    return dict(_get(session))
+
 def clear(session):
     _save(session, {})
 
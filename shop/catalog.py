@@ -0,0 +1,137 @@
+from django.db.models import Q
+
+from .categories import subtree_ids
+from .models import CatalogVersion, Product
+from .templatetags.images import product_srcset, thumb_url
+
+# Mapeia o parâmetro `sort` da querystring para o order_by do ORM
+SORT_MAP = {
+    "created": "created_at",
+    "-created": "-created_at",
+    "price": "price_cents",
+    "-price": "-price_cents",
+    "pop": "-views",
+}
+DEFAULT_SORT = "-created"
+PAGE_SIZE = 12
+
+
+def to_cents(val):
+    """Converte "12,50" / "12.5" (reais) em centavos; None se inválido."""
+    if not val:
+        return None
+    try:
+        return int(round(float(str(val).replace(",", ".")) * 100))
+    except Exception:
+        return None
+
+
+def parse_filters(params) -> dict:
+    """
+    Normaliza os filtros do catálogo a partir de um QueryDict/dict:
+      - q (busca), cat (slug; inclui as subcategorias), featured=1
+      - min_price / max_price (em reais) -> min_cents / max_cents
+      - sort (chave de SORT_MAP; valores desconhecidos viram o padrão)
+    """
+    sort = (params.get("sort") or DEFAULT_SORT).strip()
+    if sort not in SORT_MAP:
+        sort = DEFAULT_SORT
+    return {
+        "q": (params.get("q") or "").strip(),
+        "cat": (params.get("cat") or "").strip(),
+        "featured": params.get("featured") == "1",
+        "min_cents": to_cents(params.get("min_price")),
+        "max_cents": to_cents(params.get("max_price")),
+        "sort": sort,
+    }
+
+
+def filter_products(filters: dict, with_category: bool = True):
+    """Queryset de produtos ativos com os filtros aplicados (sem ordenação)."""
+    products = Product.objects.filter(active=True)
+    q = filters.get("q")
+    if q:
+        products = products.filter(Q(title__icontains=q) | Q(description__icontains=q))
+    if with_category and filters.get("cat"):
+        # a categoria e todas as subcategorias, resolvidas na árvore em cache
+        ids = subtree_ids(filters["cat"])
+        products = products.filter(category_id__in=ids) if ids is not None else products.none()
+    if filters.get("featured"):
+        products = products.filter(featured=True)
+    if filters.get("min_cents") is not None:
+        products = products.filter(price_cents__gte=filters["min_cents"])
+    if filters.get("max_cents") is not None:
+        products = products.filter(price_cents__lte=filters["max_cents"])
+    return products
+
+
+def sorted_products(filters: dict):
+    return filter_products(filters).order_by(SORT_MAP[filters["sort"]])
+
+
+# Campos expostos pela API JSON do catálogo -> colunas necessárias no ORM
+API_FIELDS = {
+    "id": ("id",),
+    "title": ("title",),
+    "slug": ("slug",),
+    "price_cents": ("price_cents",),
+    "stock": ("stock",),
+    "image_url": ("image_url",),
+    "image": ("image_url",),
+    "featured": ("featured",),
+    "views": ("views",),
+    "created_at": ("created_at",),
+    "category": ("category", "category__slug", "category__name"),
+    "url": ("slug",),
+}
+DEFAULT_API_FIELDS = ("id", "title", "slug", "price_cents", "image_url", "category", "url")
+
+
+def parse_fields(raw) -> tuple:
+    """`fields=id,title` -> tupla de campos válidos (ou os padrões)."""
+    if not raw:
+        return DEFAULT_API_FIELDS
+    wanted = tuple(f for f in (x.strip() for x in raw.split(",")) if f in API_FIELDS)
+    return wanted or DEFAULT_API_FIELDS
+
+
+def only_columns(fields) -> list:
+    cols = {"id"}
+    for f in fields:
+        cols.update(API_FIELDS[f])
+    return sorted(cols)
+
+
+def serialize_product(p, fields) -> dict:
+    out = {}
+    for f in fields:
+        if f == "category":
+            out["category"] = (
+                {"slug": p.category.slug, "name": p.category.name} if p.category_id else None
+            )
+        elif f == "image":
+            out["image"] = (
+                {"src": thumb_url(p, 480), "srcset": product_srcset(p)} if p.image_url else None
+            )
+        elif f == "url":
+            out["url"] = p.get_absolute_url()
+        elif f == "created_at":
+            out["created_at"] = p.created_at.isoformat()
+        else:
+            out[f] = getattr(p, f)
+    return out
+
+
+def catalog_version() -> int:
+    """Versão atual do catálogo (incrementada a cada escrita em Product/Category)."""
+    return CatalogVersion.current()[0]
+
+
+def catalog_last_modified():
+    """Instante da última alteração do catálogo (ou None se nunca houve)."""
+    return CatalogVersion.current()[1]
+
+
+def catalog_fingerprint() -> str:
+    """Resumo barato do estado do catálogo para validadores HTTP."""
+    return str(catalog_version())
@@ -0,0 +1,222 @@
+"""
+Índice colunar do catálogo em memória, um por processo (opcional:
+CATALOG_INDEX_ENABLED). Os produtos ativos viram colunas (id, categoria, preço,
+criação, views, destaque) em arrays NumPy, ou no módulo `array` se o NumPy não
+estiver instalado; os filtros viram máscaras vetorizadas e cada ordenação do
+SORT_MAP tem uma permutação pré-calculada. Uma página do catálogo é
+permutação[máscara[permutação]][início:fim], e o banco só é consultado para
+hidratar os 12 ids da página.
+
+A busca textual (q) não é indexada: com q o catálogo continua no SQL.
+
+Atualização em shop/live_index.py, como no typeahead: a cada
+CATALOG_INDEX_REFRESH_SECONDS aplica os produtos alterados. `views` não muda a
+versão (ver CatalogQuerySet.untracked_fields), então a ordem por popularidade
+é recalculada a cada CATALOG_INDEX_MAX_AGE segundos.
+"""
+import array
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+
+from . import categories
+from .catalog import SORT_MAP
+from .live_index import LiveIndex
+from .models import Product
+from .utils import optional_import
+
+np = optional_import("numpy")
+
+# coluna do índice para cada campo usado no SORT_MAP
+FIELD_COLUMNS = {"created_at": "created", "price_cents": "price", "views": "views"}
+_EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+ROW_FIELDS = ("id", "category_id", "price_cents", "created_at", "views", "featured")
+COLUMNS = ("id", "category", "price", "created", "views", "featured")
+
+
+def _row(pid, category_id, price_cents, created_at, views, featured):
+    # created_at em microssegundos desde 1970; sem categoria = 0 (ids começam em 1)
+    micros = (created_at - _EPOCH) // timedelta(microseconds=1)
+    return (pid, category_id or 0, price_cents, micros, views, int(featured))
+
+
+class ColumnIndex:
+    """
+    Colunas paralelas (posição i = um produto) + permutações por ordenação.
+    Imutável depois de montado: atualizações geram um índice novo e trocam a
+    referência, então leitores concorrentes nunca veem meio índice.
+    """
+
+    def __init__(self, rows, use_numpy=None):
+        self.numpy = (np is not None) if use_numpy is None else use_numpy
+        rows = list(rows)
+        columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+        if self.numpy:
+            self.columns = {
+                name: np.array(values, dtype=np.bool_ if name == "featured" else np.int64)
+                for name, values in zip(COLUMNS, columns)
+            }
+        else:
+            self.columns = {
+                name: array.array("b" if name == "featured" else "q", values)
+                for name, values in zip(COLUMNS, columns)
+            }
+        self.perms = {}
+        for sort, order in SORT_MAP.items():
+            column = FIELD_COLUMNS.get(order.lstrip("-"))
+            if column:
+                self.perms[sort] = self._argsort(column, descending=order.startswith("-"))
+
+    def __len__(self):
+        return len(self.columns["id"])
+
+    def _argsort(self, name, descending):
+        # empates desempatados pelo id, para a paginação ser estável
+        ids, values = self.columns["id"], self.columns[name]
+        if self.numpy:
+            return np.lexsort((ids, -values if descending else values))
+        sign = -1 if descending else 1
+        return array.array("q", sorted(range(len(ids)), key=lambda i: (sign * values[i], ids[i])))
+
+    def rows(self):
+        """Linhas (id, categoria, preço, criação, views, destaque), para reaplicar deltas."""
+        if self.numpy:
+            return zip(*(self.columns[name].tolist() for name in COLUMNS))
+        return zip(*(self.columns[name] for name in COLUMNS))
+
+    def supports(self, filters):
+        return not filters.get("q") and filters.get("sort") in self.perms
+
+    def search(self, filters):
+        """Array de ids, na ordem de `filters["sort"]`, que passam pelos filtros (sem q)."""
+        category_ids = None
+        if filters.get("cat"):
+            category_ids = categories.subtree_ids(filters["cat"])
+            if category_ids is None:
+                return array.array("q")
+        perm = self.perms[filters["sort"]]
+        if self.numpy:
+            mask = self._numpy_mask(filters, category_ids)
+            order = perm if mask is None else perm[mask[perm]]
+            return self.columns["id"][order]
+        mask = self._python_mask(filters, category_ids)
+        ids = self.columns["id"]
+        return array.array("q", (ids[i] for i in perm) if mask is None else (ids[i] for i in perm if mask[i]))
+
+    def _numpy_mask(self, filters, category_ids):
+        cols = self.columns
+        conditions = []
+        if filters.get("featured"):
+            conditions.append(cols["featured"])
+        if category_ids is not None:
+            conditions.append(np.isin(cols["category"], category_ids))
+        if filters.get("min_cents") is not None:
+            conditions.append(cols["price"] >= filters["min_cents"])
+        if filters.get("max_cents") is not None:
+            conditions.append(cols["price"] <= filters["max_cents"])
+        if not conditions:
+            return None
+        return np.logical_and.reduce(conditions)
+
+    def _python_mask(self, filters, category_ids):
+        cols = self.columns
+        n = len(self)
+        mask = None
+
+        def narrow(keep):
+            nonlocal mask
+            mask = bytearray(keep(i) for i in range(n)) if mask is None else bytearray(
+                m and keep(i) for i, m in enumerate(mask)
+            )
+
+        if filters.get("featured"):
+            narrow(cols["featured"].__getitem__)
+        if category_ids is not None:
+            wanted, cats = set(category_ids), cols["category"]
+            narrow(lambda i: cats[i] in wanted)
+        if filters.get("min_cents") is not None:
+            low, prices = filters["min_cents"], cols["price"]
+            narrow(lambda i: prices[i] >= low)
+        if filters.get("max_cents") is not None:
+            high, prices = filters["max_cents"], cols["price"]
+            narrow(lambda i: prices[i] <= high)
+        return mask
+
+
+class Results:
+    """
+    Sequência de produtos sobre a lista de ids ordenada, para o Paginator:
+    len() não toca no banco e cada fatia hidrata só os seus ids com o
+    queryset base (select_related/only do chamador), na ordem do índice.
+    """
+
+    def __init__(self, ids, queryset):
+        self.ids = ids
+        self.queryset = queryset
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            return self[key:key + 1][0]
+        ids = [int(pk) for pk in self.ids[key]]  # int64 do NumPy não vai como parâmetro SQL
+        by_id = self.queryset.order_by().in_bulk(ids)
+        # produtos alterados depois do último refresh e que deixaram de casar com o filtro ficam de fora
+        return [by_id[pk] for pk in ids if pk in by_id]
+
+
+def enabled():
+    return bool(getattr(settings, "CATALOG_INDEX_ENABLED", False))
+
+
+def refresh_seconds():
+    return float(getattr(settings, "CATALOG_INDEX_REFRESH_SECONDS", 5))
+
+
+def max_age():
+    return float(getattr(settings, "CATALOG_INDEX_MAX_AGE", 300))
+
+
+def _build():
+    rows = Product.objects.filter(active=True).values_list(*ROW_FIELDS)
+    return ColumnIndex(_row(*row) for row in rows.iterator(chunk_size=5000))
+
+
+def _apply(index, changed):
+    touched = {row[0] for row in changed}
+    rows = [row for row in index.rows() if row[0] not in touched]
+    rows.extend(_row(*row[:-1]) for row in changed if row[-1])
+    return ColumnIndex(rows, use_numpy=index.numpy)
+
+
+_live = LiveIndex(
+    build=_build,
+    apply=_apply,
+    size=len,
+    fields=ROW_FIELDS,
+    refresh_seconds=refresh_seconds,
+    max_age=max_age,
+)
+
+
+def reset():
+    """Descarta o índice do processo (testes, ou após carga em massa)."""
+    _live.reset()
+
+
+def get_index():
+    return _live.get()
+
+
+def search(filters, queryset):
+    """
+    Results para o Paginator se o índice estiver ligado e cobrir os filtros;
+    None para o chamador seguir com o SQL. `queryset` define a hidratação.
+    """
+    if not enabled() or filters.get("q"):
+        return None
+    index = get_index()
+    if not index.supports(filters):
+        return None
+    return Results(index.search(filters), queryset)
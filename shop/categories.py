@@ -0,0 +1,86 @@
+"""
+Árvore de categorias em cache. Uma consulta monta a árvore inteira (ordenada
+para exibição, com profundidade); menu, breadcrumbs e o filtro por subárvore do
+catálogo leem daqui. Invalidada pela tag "catalog" a cada escrita no catálogo.
+"""
+from django.conf import settings
+
+from .caching import get_or_compute
+from .models import Category
+
+
+def _build():
+    rows = list(Category.objects.values("id", "slug", "name", "path", "parent_id", "featured"))
+    children = {}
+    for row in rows:
+        row["depth"] = row["path"].count(Category.SEP) - 1
+        children.setdefault(row["parent_id"], []).append(row)
+
+    ordered = []
+    stack = sorted(children.get(None, []), key=_by_name, reverse=True)
+    while stack:  # pré-ordem: cada categoria seguida das filhas, irmãs por nome
+        node = stack.pop()
+        ordered.append(node)
+        stack.extend(sorted(children.get(node["id"], []), key=_by_name, reverse=True))
+    return ordered
+
+
+def _by_name(node):
+    return node["name"].lower()
+
+
+def category_tree():
+    """Todas as categorias em ordem de exibição (dicts com slug, name, path, depth...)."""
+    return get_or_compute(
+        "category-tree", "all", _build,
+        timeout=getattr(settings, "CATEGORY_TREE_TTL", 3600), tags=("catalog",),
+    )
+
+
+def find(slug=None, pk=None):
+    for node in category_tree():
+        if node["slug"] == slug or (pk is not None and node["id"] == pk):
+            return node
+    return None
+
+
+def subtree_path(slug):
+    """Prefixo `path` da categoria, para filtrar a subárvore; None se não existe."""
+    node = find(slug)
+    return node["path"] if node else None
+
+
+def subtree_ids(slug):
+    """
+    Ids da categoria e de todas as subcategorias, lidos da árvore em cache; None
+    se não existe. `category_id IN (...)` usa o índice da FK, ao contrário de
+    `category__path__startswith`, que vira LIKE e varre shop_category.
+    """
+    path = subtree_path(slug)
+    if path is None:
+        return None
+    return [node["id"] for node in category_tree() if node["path"].startswith(path)]
+
+
+def breadcrumbs(slug=None, pk=None):
+    """Da raiz até a categoria: [{"slug", "name", ...}, ...] (vazio se não existe)."""
+    node = find(slug, pk)
+    if node is None:
+        return []
+    ancestors = set(node["path"].split(Category.SEP)[:-1])
+    return [n for n in category_tree() if n["slug"] in ancestors and node["path"].startswith(n["path"])]
+
+
+def with_counts(counts):
+    """
+    Árvore com `facet_count` de cada categoria somando a subárvore, a partir de
+    {path: produtos diretamente na categoria}, e `indent` para o <select> do menu.
+    """
+    return [
+        {
+            **node,
+            "facet_count": sum(n for path, n in counts.items() if path.startswith(node["path"])),
+            "indent": "\u00a0\u00a0" * node["depth"],
+        }
+        for node in category_tree()
+    ]
@@ -0,0 +1,109 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.db.models import Count, Q
+
+from .caching import get_or_compute
+from .catalog import filter_products
+from .categories import subtree_path
+
+# Faixas de preço em centavos: [min, max) ; None = sem limite
+PRICE_BUCKETS = [
+    (0, 5000),
+    (5000, 10000),
+    (10000, 25000),
+    (25000, 50000),
+    (50000, None),
+]
+
+
+def _bucket_label(lo, hi):
+    if hi is None:
+        return f"Acima de R$ {lo // 100}"
+    if lo == 0:
+        return f"Até R$ {hi // 100}"
+    return f"R$ {lo // 100} a R$ {hi // 100}"
+
+
+def _bucket_q(lo, hi):
+    q = Q(price_cents__gte=lo)
+    if hi is not None:
+        q &= Q(price_cents__lt=hi)
+    return q
+
+
+def cache_key(filters: dict) -> str:
+    """Chave estável para o conjunto de filtros (a ordenação não afeta contagens)."""
+    norm = {k: filters.get(k) for k in ("q", "cat", "featured", "min_cents", "max_cents")}
+    norm["q"] = (norm["q"] or "").lower()
+    raw = json.dumps(norm, sort_keys=True)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def compute_facets(filters: dict) -> dict:
+    """
+    Calcula, em UMA query agrupada por categoria, as contagens do catálogo:
+      - categories: contagem por categoria (ignorando o próprio filtro `cat`,
+        para o menu mostrar quantos itens cada opção teria)
+      - featured / price_buckets / total: restritos à categoria selecionada
+        (e suas subcategorias)
+    """
+    annotations = {
+        "n": Count("id"),
+        "n_featured": Count("id", filter=Q(featured=True)),
+    }
+    for i, (lo, hi) in enumerate(PRICE_BUCKETS):
+        annotations[f"b{i}"] = Count("id", filter=_bucket_q(lo, hi))
+
+    rows = list(
+        filter_products(filters, with_category=False)
+        .order_by()
+        .values("category__slug", "category__name", "category__path")
+        .annotate(**annotations)
+    )
+
+    cat = filters.get("cat")
+    cat_path = subtree_path(cat) if cat else None
+    selected = [r for r in rows if not cat or (cat_path and (r["category__path"] or "").startswith(cat_path))]
+
+    categories = sorted(
+        (
+            {"slug": r["category__slug"], "name": r["category__name"], "path": r["category__path"], "count": r["n"]}
+            for r in rows
+            if r["category__slug"]
+        ),
+        key=lambda c: c["name"].lower(),
+    )
+    buckets = [
+        {
+            "min_cents": lo,
+            "max_cents": hi,
+            "label": _bucket_label(lo, hi),
+            # valores prontos para os parâmetros min_price/max_price (reais, max inclusivo)
+            "min_price": f"{lo / 100:.2f}",
+            "max_price": f"{(hi - 1) / 100:.2f}" if hi is not None else "",
+            "count": sum(r[f"b{i}"] for r in selected),
+        }
+        for i, (lo, hi) in enumerate(PRICE_BUCKETS)
+    ]
+    return {
+        "total": sum(r["n"] for r in selected),
+        "featured": sum(r["n_featured"] for r in selected),
+        "categories": categories,
+        "price_buckets": buckets,
+    }
+
+
+def catalog_facets(filters: dict) -> dict:
+    """
+    Facetas do catálogo com cache por conjunto de filtros normalizado,
+    invalidadas pela tag "catalog" a cada escrita em produtos/categorias.
+    """
+    return get_or_compute(
+        "facets",
+        cache_key(filters),
+        lambda: compute_facets(filters),
+        timeout=getattr(settings, "CATALOG_FACETS_TTL", 60),
+        tags=("catalog",),
+    )
@@ -10,4 +10,4 @@ class ProductForm(forms.ModelForm):
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
-        fields = ['name', 'slug', 'featured']
\ No newline at end of file
+        fields = ['name', 'slug', 'parent', 'featured']
\ No newline at end of file
@@ -0,0 +1,122 @@
+import asyncio
+import hashlib
+import json
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 128
+
+
+def fingerprint(*parts) -> str:
+    """Hash estável do conteúdo da requisição (payload, carrinho...)."""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def client_scope(request, name) -> str:
+    """
+    Escopo da chave por cliente (sessão + IP): a mesma Idempotency-Key vinda
+    de outro cliente não recebe a resposta guardada (com o pedido) do primeiro.
+    """
+    session_key = request.session.session_key or ""
+    ip = request.META.get("REMOTE_ADDR") or ""
+    return f"{name}:{session_key}:{ip}"
+
+
+def _ttl():
+    return timedelta(hours=int(getattr(settings, "IDEMPOTENCY_TTL_HOURS", 24)))
+
+
+def _claim(scope, key, fp):
+    """
+    Tenta reservar (scope, key). Retorna (registro, criado). Registros mais
+    velhos que o TTL são descartados e a chave volta a valer como nova.
+    """
+    IdempotencyKey.objects.filter(scope=scope, key=key, created_at__lt=timezone.now() - _ttl()).delete()
+    try:
+        with transaction.atomic():
+            return IdempotencyKey.objects.create(scope=scope, key=key, fingerprint=fp or ""), True
+    except IntegrityError:
+        return IdempotencyKey.objects.get(scope=scope, key=key), False
+
+
+def _store(record, response):
+    record.state = "done"
+    record.response_status = response.status_code
+    record.response_body = response.content.decode()
+    record.response_content_type = response.get("Content-Type", "")
+    record.save(update_fields=["state", "response_status", "response_body", "response_content_type"])
+
+
+def _replay(record):
+    response = HttpResponse(
+        record.response_body, status=record.response_status, content_type=record.response_content_type or None
+    )
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+async def _wait_done(record):
+    """Espera a requisição original terminar (polling com backoff até o timeout)."""
+    timeout = float(getattr(settings, "IDEMPOTENCY_WAIT_SECONDS", 10))
+    delay = 0.02
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        await asyncio.sleep(delay)
+        fresh = await IdempotencyKey.objects.filter(pk=record.pk).afirst()
+        if fresh is None:  # a original falhou e liberou a chave
+            return None
+        if fresh.state == "done":
+            return fresh
+        delay = min(delay * 2, 0.25)
+    return record
+
+
+async def run_idempotent(request, scope, fp, handler):
+    """
+    Executa `handler()` (coroutine que devolve a resposta) no máximo uma vez
+    por `Idempotency-Key` dentro de `scope`:
+      - primeira requisição: executa e guarda a resposta (2xx/4xx);
+        falhas 5xx liberam a chave para o cliente tentar de novo
+      - duplicata concluída: devolve a resposta guardada
+      - duplicata concorrente: espera a original e devolve a mesma resposta
+    `fp=None` aceita qualquer conteúdo (ex.: carrinho já consumido pelo pedido original).
+    Sem o cabeçalho, apenas executa.
+    """
+    key = (request.headers.get(HEADER) or "").strip()
+    if not key:
+        return await handler()
+    if len(key) > MAX_KEY_LENGTH:
+        return JsonResponse({"error": f"{HEADER} longo demais"}, status=400)
+
+    record, created = await sync_to_async(_claim)(scope, key, fp)
+    if not created:
+        if fp is not None and record.fingerprint and record.fingerprint != fp:
+            return JsonResponse({"error": f"{HEADER} já usada com outro conteúdo"}, status=422)
+        if record.state != "done":
+            record = await _wait_done(record)
+            if record is None:
+                return await run_idempotent(request, scope, fp, handler)
+            if record.state != "done":
+                return JsonResponse({"error": "requisição original ainda em andamento"}, status=409)
+        return _replay(record)
+
+    try:
+        response = await handler()
+    except BaseException:
+        await IdempotencyKey.objects.filter(pk=record.pk).adelete()
+        raise
+    if response.status_code >= 500:
+        await IdempotencyKey.objects.filter(pk=record.pk).adelete()
+    else:
+        await sync_to_async(_store)(record, response)
+    return response
@@ -0,0 +1,157 @@
+import hashlib
+import io
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .utils import lazy_import, optional_import
+
+# Carregados só quando uma miniatura é gerada (as páginas só montam URLs).
+requests = lazy_import("requests")
+# Pillow é opcional: sem ele o proxy redireciona para a imagem original
+Image = optional_import("PIL.Image")
+
+DEFAULT_WIDTHS = (240, 480, 960)
+
+
+class ImageError(Exception):
+    pass
+
+
+def widths():
+    return tuple(getattr(settings, "PRODUCT_IMAGE_WIDTHS", DEFAULT_WIDTHS))
+
+
+def cache_dir() -> Path:
+    return Path(getattr(settings, "PRODUCT_IMAGE_CACHE_DIR", settings.BASE_DIR / "media" / "thumbs"))
+
+
+def url_key(url: str) -> str:
+    """Identifica a imagem de origem; muda quando o `image_url` do produto muda."""
+    return hashlib.sha1(url.encode()).hexdigest()[:16]
+
+
+def available() -> bool:
+    return Image is not None
+
+
+def failure_ttl() -> int:
+    return int(getattr(settings, "PRODUCT_IMAGE_FAILURE_TTL", 60))
+
+
+def _failure_key(url: str) -> str:
+    return f"thumb-failed:{url_key(url)}"
+
+
+def _write_atomic(path: Path, data: bytes):
+    # temporário único: duas threads do mesmo worker podem gerar a mesma miniatura
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _fetch_original(url: str) -> bytes:
+    """Baixa a imagem de origem uma única vez e guarda no disco."""
+    path = cache_dir() / f"{url_key(url)}.orig"
+    if path.exists():
+        os.utime(path)
+        return path.read_bytes()
+
+    max_bytes = int(getattr(settings, "PRODUCT_IMAGE_MAX_SOURCE_BYTES", 10 * 1024 * 1024))
+    timeout = float(getattr(settings, "PRODUCT_IMAGE_FETCH_TIMEOUT", 10))
+    try:
+        with requests.get(url, stream=True, timeout=timeout) as r:
+            r.raise_for_status()
+            buf = io.BytesIO()
+            for chunk in r.iter_content(64 * 1024):
+                buf.write(chunk)
+                if buf.tell() > max_bytes:
+                    raise ImageError("imagem de origem grande demais")
+    except requests.RequestException as e:
+        raise ImageError(f"falha ao baixar imagem: {e}") from e
+
+    data = buf.getvalue()
+    _write_atomic(path, data)
+    return data
+
+
+def _resize(data: bytes, width: int) -> bytes:
+    try:
+        img = Image.open(io.BytesIO(data))
+        img.load()
+    except Exception as e:
+        raise ImageError(f"imagem inválida: {e}") from e
+    if img.mode not in ("RGB", "RGBA"):
+        img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+    if img.width > width:
+        height = max(1, round(img.height * width / img.width))
+        img = img.resize((width, height), Image.LANCZOS)
+    out = io.BytesIO()
+    img.save(out, "WEBP", quality=int(getattr(settings, "PRODUCT_IMAGE_QUALITY", 80)))
+    return out.getvalue()
+
+
+def enforce_size_cap():
+    """Remove os arquivos menos usados (mtime mais antigo) até caber no limite."""
+    cap = int(getattr(settings, "PRODUCT_IMAGE_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+    root = cache_dir()
+    if not root.exists():
+        return
+    entries = []
+    total = 0
+    for entry in os.scandir(root):
+        if entry.is_file() and not entry.name.endswith(".tmp"):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+    if total <= cap:
+        return
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= cap:
+            break
+
+
+def thumbnail(url: str, width: int) -> Path:
+    """
+    Caminho local da miniatura WebP de `url` com largura `width`.
+    Gera sob demanda; acessos renovam o mtime (base do LRU em disco).
+    Uma origem que falhou (404, imagem inválida...) fica PRODUCT_IMAGE_FAILURE_TTL
+    segundos sem ser consultada de novo.
+    """
+    if not available():
+        raise ImageError("Pillow não instalado")
+    if width not in widths():
+        raise ImageError("largura não suportada")
+
+    path = cache_dir() / f"{url_key(url)}-{width}.webp"
+    if path.exists():
+        os.utime(path, (time.time(), time.time()))
+        return path
+
+    failed = cache.get(_failure_key(url))
+    if failed is not None:
+        raise ImageError(f"{failed} (em cache)")
+    try:
+        data = _resize(_fetch_original(url), width)
+    except ImageError as e:
+        cache.set(_failure_key(url), str(e), failure_ttl())
+        raise
+    _write_atomic(path, data)
+    enforce_size_cap()
+    return path
@@ -0,0 +1,240 @@
+"""
+Reservas de estoque. Disponível = stock - reserved; cada checkout prende as
+unidades com um UPDATE condicional (`stock >= reserved + qty`), de modo que o
+próprio banco decide quem leva a última unidade sob concorrência. A reserva:
+  - vira baixa de estoque quando o pagamento é aprovado (convert_order[s])
+  - é liberada no cancelamento ou quando expira (release_orders / release_expired)
+Pedido pago sem reserva ativa só leva unidades livres; o que faltar fica em
+Order.stock_shortfall para tratamento manual, em vez de vender o que já está
+reservado para outro checkout.
+"""
+import logging
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import metrics
+from .models import Order, OrderItem, Product, StockReservation
+
+log = logging.getLogger(__name__)
+
+
+class OutOfStock(Exception):
+    def __init__(self, product_id, requested):
+        super().__init__(f"sem estoque suficiente para o produto {product_id} (pedido: {requested})")
+        self.product_id = product_id
+        self.requested = requested
+
+
+def reservation_ttl():
+    return timedelta(minutes=int(getattr(settings, "STOCK_RESERVATION_TTL_MINUTES", 30)))
+
+
+def _merge(lines):
+    """Soma quantidades por produto e ordena por id (ordem fixa de locks evita deadlock)."""
+    merged = {}
+    for product_id, qty in lines:
+        merged[product_id] = merged.get(product_id, 0) + int(qty)
+    return sorted(merged.items())
+
+
+def reserve(order, lines, ttl=None):
+    """
+    Reserva `lines` [(product_id, qty)] para `order`, tudo ou nada.
+    Levanta OutOfStock (e desfaz as reservas já feitas) se faltar algum item.
+    """
+    lines = _merge(lines)
+    expires_at = timezone.now() + (ttl or reservation_ttl())
+    with transaction.atomic():
+        for product_id, qty in lines:
+            if qty <= 0:
+                raise OutOfStock(product_id, qty)
+            held = Product.objects.filter(pk=product_id, active=True, stock__gte=F("reserved") + qty).update(
+                reserved=F("reserved") + qty
+            )
+            if not held:
+                raise OutOfStock(product_id, qty)
+        StockReservation.objects.bulk_create(
+            [StockReservation(order=order, product_id=pid, qty=qty, expires_at=expires_at) for pid, qty in lines]
+        )
+
+
+class _Raced(Exception):
+    """Outra transação mudou reservas entre o SELECT e o UPDATE do lote."""
+
+
+def _group_by_qty(totals):
+    """{produto: qty} -> {qty: [produtos]}: um UPDATE por quantidade distinta, não por produto."""
+    groups = defaultdict(list)
+    for product_id, qty in totals.items():
+        groups[qty].append(product_id)
+    return groups
+
+
+def _adjust_products(totals, new_state):
+    for qty, product_ids in _group_by_qty(totals).items():
+        changes = {"reserved": Greatest(F("reserved") - qty, 0)}
+        if new_state == "converted":
+            changes["stock"] = Greatest(F("stock") - qty, 0)
+        Product.objects.filter(pk__in=product_ids).update(**changes)
+
+
+def _settle_one(rid, product_id, qty, new_state):
+    with transaction.atomic():
+        if not StockReservation.objects.filter(pk=rid, state="held").update(state=new_state):
+            return 0
+        _adjust_products({product_id: qty}, new_state)
+        return 1
+
+
+def _settle(reservations, new_state):
+    """
+    Move as reservas "held" de `reservations` para `new_state` em lote: um
+    UPDATE nas reservas e um por quantidade distinta nos produtos. As linhas
+    ficam travadas (select_for_update); se mesmo assim o UPDATE condicional
+    pegar menos linhas que o SELECT (outra transação liberou/converteu antes,
+    p.ex. no SQLite, que não trava linhas), refaz linha a linha: só quem trocar
+    o estado mexe no produto, então nada é descontado duas vezes.
+    """
+    with transaction.atomic():
+        rows = list(reservations.select_for_update().filter(state="held").values_list("id", "product_id", "qty"))
+        if not rows:
+            return 0
+        try:
+            with transaction.atomic():
+                changed = StockReservation.objects.filter(id__in=[r[0] for r in rows], state="held").update(
+                    state=new_state
+                )
+                if changed != len(rows):
+                    raise _Raced
+                totals = defaultdict(int)
+                for _, product_id, qty in rows:
+                    totals[product_id] += qty
+                _adjust_products(totals, new_state)
+            return len(rows)
+        except _Raced:
+            return sum(_settle_one(*row, new_state) for row in rows)
+
+
+def _take_one(product_id, qty):
+    """Baixa até `qty` unidades livres de um produto; retorna quantas levou."""
+    row = Product.objects.select_for_update().filter(pk=product_id).values_list("stock", "reserved").first()
+    take = min(qty, max(row[0] - row[1], 0)) if row else 0
+    if take and Product.objects.filter(pk=product_id, stock__gte=F("reserved") + take).update(
+        stock=F("stock") - take
+    ):
+        return take
+    return 0
+
+
+def _take_free(totals):
+    """
+    Baixa {produto: qty} só das unidades livres (stock - reserved), sem tocar
+    nas reservas de outros checkouts. Um UPDATE condicional por quantidade
+    distinta; produtos sem saldo para tudo vão um a um e levam o que houver.
+    Levanta _Raced se um UPDATE do lote pegar menos linhas que o esperado.
+    Retorna {produto: qty levada}.
+    """
+    free = dict(
+        Product.objects.select_for_update().filter(pk__in=list(totals))
+        .annotate(free=F("stock") - F("reserved")).values_list("id", "free")
+    )
+    fits = {pid: qty for pid, qty in totals.items() if free.get(pid, 0) >= qty}
+    for qty, product_ids in _group_by_qty(fits).items():
+        updated = Product.objects.filter(pk__in=product_ids, stock__gte=F("reserved") + qty).update(
+            stock=F("stock") - qty
+        )
+        if updated != len(product_ids):
+            raise _Raced  # não dá para saber quais pegaram: o chamador refaz um a um
+    taken = dict(fits)
+    for pid, qty in totals.items():
+        if pid not in fits:
+            taken[pid] = _take_one(pid, qty)
+    return taken
+
+
+def _record_shortfall(wanted, taken):
+    """
+    Distribui o que faltou de cada produto entre os pedidos (os mais novos
+    primeiro) e marca Order.stock_shortfall. `wanted`: {produto: [(pedido, qty)]}.
+    """
+    per_order = defaultdict(int)
+    for product_id, lines in wanted.items():
+        missing = sum(qty for _, qty in lines) - taken.get(product_id, 0)
+        for order_id, qty in sorted(lines, reverse=True):
+            if missing <= 0:
+                break
+            short = min(qty, missing)
+            per_order[order_id] += short
+            missing -= short
+            log.warning("pedido %s pago sem estoque livre: faltam %s un. do produto %s", order_id, short, product_id)
+    for order_id, units in per_order.items():
+        Order.objects.filter(pk=order_id).update(stock_shortfall=F("stock_shortfall") + units)
+    if per_order:
+        metrics.registry.counter(
+            "stock_shortfall_units_total", "Unidades vendidas sem estoque livre (pedido marcado para revisão)."
+        ).inc(sum(per_order.values()))
+
+
+def convert_orders(order_ids):
+    """
+    Pagamento aprovado: reservas dos pedidos viram baixa de estoque. Itens sem
+    reserva ativa (pedido antigo ou reserva já expirada) levam só unidades
+    livres; o que faltar vai para Order.stock_shortfall (ver _record_shortfall).
+    O chamador garante que cada pedido é convertido uma vez só (troca de status
+    condicional na mesma transação).
+    """
+    order_ids = list(order_ids)
+    with transaction.atomic():
+        _settle(StockReservation.objects.filter(order_id__in=order_ids), "converted")
+        covered = set(
+            StockReservation.objects.filter(order_id__in=order_ids, state="converted").values_list("order_id", "product_id")
+        )
+        wanted = defaultdict(list)
+        for order_id, product_id, qty in OrderItem.objects.filter(order_id__in=order_ids).values_list(
+            "order_id", "product_id", "qty"
+        ):
+            if (order_id, product_id) not in covered:
+                wanted[product_id].append((order_id, qty))
+        if not wanted:
+            return
+        totals = {pid: sum(qty for _, qty in lines) for pid, lines in wanted.items()}
+        try:
+            with transaction.atomic():
+                taken = _take_free(totals)
+        except _Raced:
+            taken = {pid: _take_one(pid, qty) for pid, qty in totals.items()}
+        _record_shortfall(wanted, taken)
+
+
+def convert_order(order):
+    convert_orders([order.pk])
+
+
+def release_orders(order_ids):
+    """Libera as reservas ativas dos pedidos (cancelados, rejeitados...)."""
+    return _settle(StockReservation.objects.filter(order_id__in=list(order_ids)), "released")
+
+
+def release_expired(now=None, batch_size=1000):
+    """Libera reservas vencidas; retorna quantas foram liberadas."""
+    now = now or timezone.now()
+    total = 0
+    while True:
+        batch = list(
+            StockReservation.objects.filter(state="held", expires_at__lt=now)
+            .order_by("id")
+            .values_list("id", flat=True)[:batch_size]
+        )
+        if not batch:
+            return total
+        total += _settle(StockReservation.objects.filter(id__in=batch), "released")
+
+
+def available(product):
+    return max(product.stock - product.reserved, 0)
@@ -0,0 +1,88 @@
+"""
+Índices de produtos em memória, um por processo, que acompanham o catálogo
+(typeahead, índice colunar). Este módulo cuida do que é comum: montar no
+primeiro uso, conferir a versão do catálogo a cada `refresh_seconds()` e
+aplicar só os produtos com `updated_at` novo.
+
+Exclusões não deixam rastro em updated_at: depois de aplicar o delta, se o
+número de produtos no índice não bater com o de ativos no banco, remonta tudo.
+Lotes maiores que FULL_REBUILD_AT também remontam, por ser mais barato.
+"""
+import threading
+import time
+
+from .models import CatalogVersion, Product
+
+FULL_REBUILD_AT = 2000  # acima disso, remontar é mais barato que aplicar o delta
+
+
+class LiveIndex:
+    """
+    Guarda o índice do processo e decide quando montar ou atualizar. O dono
+    fornece:
+      - build() -> índice novo a partir do banco
+      - apply(índice, linhas) -> índice novo com as linhas alteradas, cada uma
+        (*fields, active)
+      - size(índice) -> quantos produtos ele contém
+    `refresh_seconds` e `max_age` são funções (os settings mudam em testes);
+    com `max_age`, o índice é remontado inteiro depois desse tempo (para
+    campos que não mudam a versão, como `views`).
+    """
+
+    def __init__(self, build, apply, size, fields, refresh_seconds, max_age=None):
+        self.build = build
+        self.apply = apply
+        self.size = size
+        self.fields = fields
+        self.refresh_seconds = refresh_seconds
+        self.max_age = max_age
+        self.index = None
+        self.version = None
+        self.built_at = None   # maior updated_at de produto já aplicado
+        self.checked_at = 0.0
+        self.rebuilt_at = 0.0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        """Descarta o índice do processo (testes, ou após carga em massa)."""
+        with self.lock:
+            self.index = None
+
+    def get(self):
+        """Índice do processo: montado no primeiro uso, atualizado quando a versão do catálogo muda."""
+        index = self.index
+        if index is not None and time.time() - self.checked_at < self.refresh_seconds():
+            return index
+        with self.lock:
+            if self.index is None:
+                self._build()
+            elif time.time() - self.checked_at >= self.refresh_seconds():
+                self._refresh()
+            return self.index
+
+    def _build(self):
+        self.checked_at = self.rebuilt_at = time.time()
+        self.version, _ = CatalogVersion.current()
+        self.built_at = Product.objects.order_by("-updated_at").values_list("updated_at", flat=True).first()
+        self.index = self.build()
+
+    def _refresh(self):
+        self.checked_at = time.time()
+        if self.max_age is not None and self.checked_at - self.rebuilt_at >= self.max_age():
+            return self._build()
+        version, _ = CatalogVersion.current()
+        if version == self.version:
+            return
+        changed = Product.objects.all()
+        if self.built_at is not None:
+            changed = changed.filter(updated_at__gt=self.built_at)
+        rows = list(changed.values_list(*self.fields, "active", "updated_at")[:FULL_REBUILD_AT + 1])
+        if len(rows) > FULL_REBUILD_AT:
+            return self._build()
+
+        index = self.apply(self.index, [row[:-1] for row in rows])
+        if self.size(index) != Product.objects.filter(active=True).count():
+            return self._build()
+        self.index, self.version = index, version
+        if rows:
+            self.built_at = max(row[-1] for row in rows)
@@ -0,0 +1,146 @@
+import json
+import random
+from itertools import cycle
+from unittest.mock import patch
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from shop.bench import Recorder, compare, load_baseline, save_results, seed_catalog
+from shop.catalog import SORT_MAP
+from shop.models import Category, Order, OrderItem, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark dos caminhos quentes (catálogo, detalhe, carrinho, checkout, webhook) "
+        "sobre um catálogo sintético, com p50/p95/p99, queries por requisição e "
+        "comparação com um baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=10000)
+        parser.add_argument("--categories", type=int, default=50)
+        parser.add_argument("--orders", type=int, default=1000)
+        parser.add_argument("--iterations", type=int, default=50, help="requisições por cenário")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--baseline", default=str(settings.BASE_DIR / "bench" / "baseline.json"))
+        parser.add_argument("--save-baseline", action="store_true", help="grava o resultado como novo baseline")
+        parser.add_argument("--tolerance", type=float, default=0.2, help="folga do p95 antes de acusar regressão")
+        parser.add_argument("--output", help="grava o resultado em JSON neste caminho")
+        parser.add_argument("--keepdb", action="store_true", help="reaproveita o banco de benchmark já populado")
+        parser.add_argument(
+            "--no-isolate", action="store_true",
+            help="roda no banco atual em vez de criar um banco de teste descartável",
+        )
+
+    def handle(self, *args, **opts):
+        # e-mails dos fluxos vão para a memória, não para o console
+        with override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend"):
+            if opts["no_isolate"]:
+                summary = self._run(opts)
+            else:
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=opts["keepdb"])
+                try:
+                    summary = self._run(opts)
+                finally:
+                    connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=opts["keepdb"])
+
+        self._report(summary)
+        meta = {k: opts[k] for k in ("products", "categories", "orders", "iterations", "seed")}
+        if opts["output"]:
+            save_results(opts["output"], summary, meta)
+        if opts["save_baseline"]:
+            save_results(opts["baseline"], summary, meta)
+            self.stdout.write(self.style.SUCCESS(f"baseline salvo em {opts['baseline']}"))
+            return
+
+        baseline = load_baseline(opts["baseline"])
+        if baseline is None:
+            self.stdout.write(f"sem baseline em {opts['baseline']} (use --save-baseline)")
+            return
+        problems = compare(summary, baseline, opts["tolerance"])
+        if problems:
+            raise CommandError("regressões:\n  " + "\n  ".join(problems))
+        self.stdout.write(self.style.SUCCESS("sem regressões em relação ao baseline"))
+
+    def _run(self, opts):
+        if not Product.objects.filter(slug="bench-0").exists():
+            self.stdout.write("populando catálogo sintético...")
+            seed_catalog(opts["products"], opts["categories"], opts["orders"], opts["seed"], stdout=self.stdout)
+
+        rng = random.Random(opts["seed"])
+        rec = Recorder()
+        n = opts["iterations"]
+        client = Client()
+
+        cat_slugs = list(Category.objects.values_list("slug", flat=True)[:20]) or [""]
+        catalog = reverse("shop:catalog")
+        filters = {
+            "all": {},
+            "cat": {"cat": cat_slugs[0]},
+            "featured": {"featured": "1"},
+            "price": {"min_price": "50", "max_price": "200"},
+            "q": {"q": "caneca"},
+        }
+        for fname, params in filters.items():
+            for sort in SORT_MAP:
+                for i in range(n):
+                    page = str(1 + i % 3)
+                    rec.measure(
+                        f"catalog[{fname},{sort}]",
+                        lambda: client.get(catalog, {**params, "sort": sort, "page": page}),
+                    )
+
+        slugs = list(Product.objects.filter(active=True).values_list("slug", flat=True)[:1000])
+        for _ in range(n):
+            slug = rng.choice(slugs)
+            rec.measure("product_detail", lambda: client.get(reverse("shop:product_detail", args=[slug])))
+
+        buyable = list(Product.objects.filter(active=True, stock__gte=10).values_list("id", flat=True)[:1000])
+        add_url, update_url = reverse("shop:api_cart_add"), reverse("shop:api_cart_update")
+        for _ in range(n):
+            body = json.dumps({"product_id": rng.choice(buyable), "qty": 1})
+            rec.measure("cart_add", lambda: client.post(add_url, body, content_type="application/json"))
+            rec.measure("cart_update", lambda: client.post(update_url, body, content_type="application/json"))
+
+        checkout_url = reverse("shop:checkout_from_cart")
+        with override_settings(PAYMENTS_MOCK=True):
+            for _ in range(n):
+                client.post(add_url, json.dumps({"product_id": rng.choice(buyable), "qty": 1}),
+                            content_type="application/json")
+                rec.measure(
+                    "checkout_from_cart",
+                    lambda: client.post(checkout_url, '{"email": "bench@bench.test"}', content_type="application/json"),
+                )
+
+        pending = []
+        for _ in range(n):
+            pid = rng.choice(buyable)
+            order = Order.objects.create(customer_email="webhook@bench.test", total_cents=1000)
+            OrderItem.objects.create(order=order, product_id=pid, qty=1, unit_price_cents=1000)
+            pending.append(order.id)
+        refs = cycle(pending)
+        webhook_url = reverse("shop:mp_webhook")
+        with patch(
+            "shop.services.payments.MercadoPago.get_payment_info",
+            side_effect=lambda pid: {"status": "approved", "external_reference": str(next(refs)), "id": pid},
+        ):
+            for i in range(n):
+                rec.measure(
+                    "mp_webhook",
+                    lambda: client.post(webhook_url, json.dumps({"data": {"id": f"pay_{i}"}}),
+                                        content_type="application/json"),
+                )
+        return rec.summary()
+
+    def _report(self, summary):
+        self.stdout.write(f"{'cenário':<34}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>9}")
+        for scenario, row in summary.items():
+            self.stdout.write(
+                f"{scenario:<34}{row['n']:>6}{row['p50_ms']:>10.2f}{row['p95_ms']:>10.2f}"
+                f"{row['p99_ms']:>10.2f}{row['queries']:>9.1f}"
+            )
@@ -0,0 +1,94 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.core.paginator import Paginator
+from django.db import connection
+
+from shop import catalog_index
+from shop.bench import Recorder, seed_catalog
+from shop.catalog import PAGE_SIZE, SORT_MAP, parse_filters, sorted_products
+from shop.models import Category, Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara o catálogo em SQL com o índice colunar em memória (shop/catalog_index.py) num banco "
+        "descartável: montagem, memória e p50/p95 por página (filtro + ordenação + contagem + "
+        "hidratação dos 12 produtos) em cada combinação de filtro e ordenação."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100000)
+        parser.add_argument("--categories", type=int, default=200)
+        parser.add_argument("--iterations", type=int, default=30, help="páginas medidas por cenário")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--no-numpy", action="store_true", help="usa o fallback com o módulo array")
+        parser.add_argument("--keepdb", action="store_true", help="reaproveita o banco de benchmark já populado")
+
+    def handle(self, *args, **opts):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=opts["keepdb"])
+        try:
+            self._run(opts)
+        finally:
+            catalog_index.reset()
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=opts["keepdb"])
+
+    def _run(self, opts):
+        if not Product.objects.filter(slug="bench-0").exists():
+            self.stdout.write("populando catálogo sintético...")
+            seed_catalog(opts["products"], opts["categories"], orders=0, seed=opts["seed"])
+
+        rows = Product.objects.filter(active=True).values_list(*catalog_index.ROW_FIELDS)
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = catalog_index.ColumnIndex(
+            (catalog_index._row(*row) for row in rows.iterator(chunk_size=5000)),
+            use_numpy=False if opts["no_numpy"] else None,
+        )
+        build = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.stdout.write(
+            f"produtos: {len(index):,} | backend: {'numpy' if index.numpy else 'array'} | "
+            f"montagem: {build:.2f}s | pico de memória: {peak / 1024 / 1024:.1f} MiB"
+        )
+
+        rng = random.Random(opts["seed"])
+        cat = Category.objects.order_by("id").values_list("slug", flat=True).first() or ""
+        scenarios = {
+            "all": {},
+            "cat": {"cat": cat},
+            "featured": {"featured": "1"},
+            "price": {"min_price": "50", "max_price": "200"},
+            "cat+price": {"cat": cat, "min_price": "50", "max_price": "500"},
+        }
+        rec = Recorder()
+        for name, params in scenarios.items():
+            for sort in SORT_MAP:
+                filters = parse_filters({**params, "sort": sort})
+                for _ in range(opts["iterations"]):
+                    page = rng.randint(1, 3)
+
+                    def sql():
+                        qs = sorted_products(filters).select_related("category")
+                        return list(Paginator(qs, PAGE_SIZE).get_page(page).object_list)
+
+                    def indexed():
+                        qs = sorted_products(filters).select_related("category")
+                        results = catalog_index.Results(index.search(filters), qs)
+                        return list(Paginator(results, PAGE_SIZE).get_page(page).object_list)
+
+                    rec.measure(f"sql[{name},{sort}]", sql)
+                    rec.measure(f"index[{name},{sort}]", indexed)
+
+        summary = rec.summary()
+        self.stdout.write(f"{'cenário':<28}{'sql p50':>10}{'sql p95':>10}{'idx p50':>10}{'idx p95':>10}{'x p50':>8}")
+        for name in scenarios:
+            for sort in SORT_MAP:
+                s, i = summary[f"sql[{name},{sort}]"], summary[f"index[{name},{sort}]"]
+                self.stdout.write(
+                    f"{name + ',' + sort:<28}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}"
+                    f"{i['p50_ms']:>10.2f}{i['p95_ms']:>10.2f}{s['p50_ms'] / max(i['p50_ms'], 1e-3):>8.1f}"
+                )
@@ -0,0 +1,67 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from shop.bench import StubMercadoPago, percentile
+from shop.services.payments import AsyncMercadoPago, MercadoPago, async_clients
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara criação de preferences em paralelo: cliente síncrono em pool de threads "
+        "(modelo WSGI) vs. cliente assíncrono com pool HTTP (modelo ASGI), contra um stub local."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=200)
+        parser.add_argument("--concurrency", type=int, default=100, help="checkouts simultâneos no modo async")
+        parser.add_argument("--threads", type=int, default=8, help="threads de worker no modo síncrono")
+        parser.add_argument("--latency-ms", type=int, default=200, help="latência simulada do provedor")
+
+    def handle(self, *args, **opts):
+        with StubMercadoPago(latency_ms=opts["latency_ms"]) as stub, override_settings(
+            PAYMENTS_MOCK=False, MERCADO_PAGO_ACCESS_TOKEN="TEST-bench", MERCADO_PAGO_API_BASE=stub.url
+        ):
+            results = {
+                f"sync ({opts['threads']} threads)": self._run_sync(opts),
+                f"async (concorrência {opts['concurrency']})": asyncio.run(self._run_async(opts)),
+            }
+
+        self.stdout.write(f"{'modo':<30}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+        for name, (elapsed, latencies) in results.items():
+            self.stdout.write(
+                f"{name:<30}{len(latencies) / elapsed:>10.1f}"
+                f"{percentile(latencies, 50):>10.1f}{percentile(latencies, 95):>10.1f}"
+            )
+
+    @staticmethod
+    def _kwargs(i):
+        return dict(title="Bench", quantity=1, unit_price=10.0, external_reference=str(i))
+
+    def _run_sync(self, opts):
+        def one(i):
+            start = time.perf_counter()
+            MercadoPago.create_preference(**self._kwargs(i))
+            return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=opts["threads"]) as pool:
+            latencies = list(pool.map(one, range(opts["requests"])))
+        return time.perf_counter() - start, latencies
+
+    async def _run_async(self, opts):
+        sem = asyncio.Semaphore(opts["concurrency"])
+
+        async def one(i):
+            async with sem:
+                start = time.perf_counter()
+                await AsyncMercadoPago.create_preference(**self._kwargs(i))
+                return (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        async with async_clients():
+            latencies = await asyncio.gather(*(one(i) for i in range(opts["requests"])))
+        return time.perf_counter() - start, list(latencies)
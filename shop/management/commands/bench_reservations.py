@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from shop.bench import stress_reservations
+from shop.models import Product
+
+
+class Command(BaseCommand):
+    help = (
+        "Teste de estresse das reservas de estoque: várias threads disputam o mesmo produto "
+        "num banco descartável; mede reservas/s e confere que nada foi vendido além do estoque."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=16)
+        parser.add_argument("--attempts", type=int, default=100, help="checkouts por thread")
+        parser.add_argument("--stock", type=int, default=500)
+        parser.add_argument("--qty", type=int, default=1, help="unidades por checkout")
+
+    def handle(self, *args, **opts):
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            product = Product.objects.create(
+                title="Flash sale", slug="bench-flash-sale", price_cents=1000, stock=opts["stock"]
+            )
+            result = stress_reservations(product, opts["threads"], opts["attempts"], opts["qty"])
+            product.refresh_from_db()
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self.stdout.write(
+            f"reservas: {result['reserved']} | recusadas: {result['rejected']} | "
+            f"repetições por bloqueio: {result['retries']} | {result['per_second']} checkouts/s"
+        )
+        if result["reserved"] * opts["qty"] > opts["stock"] or product.reserved > product.stock:
+            raise CommandError(f"oversell: reservado {product.reserved} de {product.stock}")
+        self.stdout.write(self.style.SUCCESS(f"sem oversell (reservado {product.reserved} de {product.stock})"))
@@ -0,0 +1,64 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+
+from shop.bench import percentile
+from shop.typeahead import TypeaheadIndex, normalize
+
+WORDS = [
+    "camiseta", "caneca", "livro", "fone", "mochila", "relógio", "tênis", "garrafa", "boné", "caderno",
+    "azul", "preta", "térmica", "algodão", "couro", "infantil", "edição", "especial", "bluetooth", "café",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Latência das sugestões de busca sobre um índice sintético em memória (sem banco): "
+        "tempo de montagem, memória e p50/p95/p99 por consulta. --check falha se o p95 "
+        "passar de --budget-ms."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--titles", type=int, default=100000)
+        parser.add_argument("--queries", type=int, default=20000)
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--budget-ms", type=float, default=1.0)
+        parser.add_argument("--check", action="store_true")
+
+    def handle(self, *args, **opts):
+        rng = random.Random(opts["seed"])
+        rows = [
+            (i, " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 5))) + f" {i}", f"p-{i}", rng.randint(0, 5000))
+            for i in range(opts["titles"])
+        ]
+        categories = [(f"cat-{i}", f"Categoria {WORDS[i % len(WORDS)]} {i}") for i in range(50)]
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        index = TypeaheadIndex.from_rows(rows, categories, max_entries=10 * len(rows))
+        build = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        # prefixos de 2 a 8 letras de palavras reais, mais alguns sem resultado
+        pool = [normalize(w)[:n] for w in WORDS for n in range(2, 9)] + ["xyz", "qq"]
+        samples = []
+        for _ in range(opts["queries"]):
+            q = rng.choice(pool)
+            t0 = time.perf_counter()
+            index.search(q)
+            samples.append((time.perf_counter() - t0) * 1000)
+
+        p95 = percentile(samples, 95)
+        self.stdout.write(
+            f"títulos: {len(rows):,} | chaves: {len(index):,} | montagem: {build:.2f}s | "
+            f"pico de memória: {peak / 1024 / 1024:.1f} MiB"
+        )
+        self.stdout.write(
+            f"consultas: {len(samples):,} | p50 {percentile(samples, 50):.3f} ms | "
+            f"p95 {p95:.3f} ms | p99 {percentile(samples, 99):.3f} ms"
+        )
+        if opts["check"] and p95 > opts["budget_ms"]:
+            raise CommandError(f"p95 {p95:.3f} ms acima do limite de {opts['budget_ms']} ms")
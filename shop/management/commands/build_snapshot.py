@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from shop.snapshot import build, listing_pages, snapshot_dir
+
+
+class Command(BaseCommand):
+    help = (
+        "Gera o snapshot estático (HTML + JSON) das páginas de produto e das primeiras páginas do "
+        "catálogo por categoria/ordenação, para o nginx/CDN servir sem passar pelo Django. "
+        "Incremental por padrão: só renderiza o que mudou desde a última execução."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="ignora o manifesto e renderiza tudo")
+        parser.add_argument("--dir", default=None, help=f"destino (padrão: {snapshot_dir()})")
+        parser.add_argument("--pages", type=int, default=listing_pages(), help="páginas por listagem")
+
+    def handle(self, *args, **opts):
+        stats = build(full=opts["full"], root=opts["dir"], pages=opts["pages"])
+        seconds = stats["seconds"] or 1e-9
+        self.stdout.write(
+            f"produtos: {stats['products']} | listagens: {stats['listings']} | "
+            f"gravados: {stats['written']} | iguais: {stats['unchanged']} | removidos: {stats['removed']}"
+        )
+        self.stdout.write(f"{seconds:.2f}s ({(stats['products'] + stats['listings']) / seconds:,.0f} páginas/s)")
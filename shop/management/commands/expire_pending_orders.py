@@ -0,0 +1,91 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from shop import inventory, order_events
+from shop.models import IdempotencyKey, Order, StockReservation
+
+
+def _batches(qs, batch_size):
+    """Percorre os ids de `qs` em lotes por keyset (id > último), sem OFFSET."""
+    last_id = 0
+    while True:
+        ids = list(qs.filter(id__gt=last_id).order_by("id").values_list("id", flat=True)[:batch_size])
+        if not ids:
+            return
+        yield ids
+        last_id = ids[-1]
+
+
+class Command(BaseCommand):
+    help = (
+        "Cancela pedidos pendentes antigos, libera reservas de estoque vencidas, limpa OTPs "
+        "expirados e chaves de idempotência vencidas, sempre em lotes curtos (UPDATE/DELETE por faixa de ids) para não segurar locks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-minutes", type=int,
+            default=getattr(settings, "PENDING_ORDER_TTL_MINUTES", 24 * 60),
+            help="idade mínima de um pedido pendente para ser cancelado",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--sleep", type=float, default=0.0, help="pausa (s) entre lotes para aliviar o banco")
+        parser.add_argument("--dry-run", action="store_true", help="só conta o que seria alterado")
+
+    def handle(self, *args, **opts):
+        now = timezone.now()
+        batch, pause, dry = opts["batch_size"], opts["sleep"], opts["dry_run"]
+
+        stale = Order.objects.filter(
+            status="pending", created_at__lt=now - timedelta(minutes=opts["older_than_minutes"])
+        )
+        canceled = self._run(stale, batch, pause, dry, self._cancel)
+
+        otps = Order.objects.filter(otp_expires_at__lt=now)
+        purged_otps = self._run(
+            otps, batch, pause, dry,
+            lambda ids: Order.objects.filter(id__in=ids).update(otp_code="", otp_expires_at=None),
+        )
+
+        if dry:
+            released = StockReservation.objects.filter(state="held", expires_at__lt=now).count()
+        else:
+            released = inventory.release_expired(now, batch_size=batch)
+
+        ttl = timedelta(hours=getattr(settings, "IDEMPOTENCY_TTL_HOURS", 24))
+        keys = IdempotencyKey.objects.filter(created_at__lt=now - ttl)
+        purged_keys = self._run(
+            keys, batch, pause, dry, lambda ids: IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        )
+
+        prefix = "[dry-run] " if dry else ""
+        self.stdout.write(
+            f"{prefix}pedidos cancelados: {canceled} | OTPs limpos: {purged_otps} | "
+            f"chaves de idempotência removidas: {purged_keys} | reservas liberadas: {released}"
+        )
+
+    @staticmethod
+    def _cancel(ids):
+        with transaction.atomic():
+            # status="pending" de novo: um webhook pode ter pago o pedido entre a leitura e o UPDATE
+            canceled = Order.objects.filter(id__in=ids, status="pending").update(status="canceled")
+            # quem está com a página do pedido aberta recebe o novo status pelo stream
+            for token in Order.objects.filter(id__in=ids, status="canceled").values_list("public_token", flat=True):
+                order_events.publish_on_commit(token, "canceled")
+            # reservas já convertidas por um webhook concorrente não são tocadas
+            inventory.release_orders(ids)
+            return canceled
+
+    @staticmethod
+    def _run(qs, batch_size, pause, dry_run, apply):
+        total = 0
+        for ids in _batches(qs, batch_size):
+            total += len(ids) if dry_run else apply(ids)
+            if pause:
+                time.sleep(pause)
+        return total
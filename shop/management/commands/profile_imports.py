@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from shop import startup
+
+
+class Command(BaseCommand):
+    help = (
+        "Mede o boot de um worker (django.setup() + URLs + resolve) num processo novo e lista "
+        "os módulos mais lentos segundo `python -X importtime`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--top", type=int, default=20, help="quantos módulos listar")
+        parser.add_argument("--sort", choices=("self", "cumulative"), default="self")
+        parser.add_argument("--path", default="/", help="rota resolvida no fim do boot")
+        parser.add_argument("--check", action="store_true",
+                            help="falha se passar de STARTUP_BUDGET_MS ou carregar dependências pesadas")
+
+    def handle(self, *args, **opts):
+        result = startup.probe(opts["path"], importtime=True)
+        col = 1 if opts["sort"] == "self" else 2
+        rows = sorted(result["imports"], key=lambda r: r[col], reverse=True)[: opts["top"]]
+
+        self.stdout.write(f"{'self ms':>9}{'cumul. ms':>11}  módulo")
+        for name, self_us, cum_us in rows:
+            self.stdout.write(f"{self_us / 1000:>9.1f}{cum_us / 1000:>11.1f}  {name}")
+
+        # o boot com -X importtime é mais lento; o orçamento vale para a medição limpa
+        elapsed_ms = startup.probe(opts["path"])["seconds"] * 1000
+        budget = startup.budget_ms()
+        eager = startup.eager_heavy_modules(result["modules"])
+        self.stdout.write(
+            f"boot: {elapsed_ms:.0f} ms (orçamento {budget:.0f} ms) | "
+            f"{len(result['modules'])} módulos | pesados carregados: {', '.join(eager) or 'nenhum'}"
+        )
+        if opts["check"] and (elapsed_ms > budget or eager):
+            raise CommandError("boot acima do orçamento ou com imports pesados antecipados")
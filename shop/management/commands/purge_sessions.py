@@ -0,0 +1,45 @@
+import time
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+DB_ENGINES = (
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove sessões expiradas. Em backends de banco apaga em lotes (por faixa de "
+        "session_key) para não travar a tabela; nos demais delega ao clear_expired()."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--sleep", type=float, default=0.0, help="pausa (s) entre lotes")
+        parser.add_argument("--max-batches", type=int, default=0, help="limite de lotes por execução (0 = sem limite)")
+
+    def handle(self, *args, **opts):
+        if settings.SESSION_ENGINE not in DB_ENGINES:
+            import_module(settings.SESSION_ENGINE).SessionStore.clear_expired()
+            self.stdout.write(f"clear_expired() executado em {settings.SESSION_ENGINE}")
+            return
+
+        now = timezone.now()
+        expired = Session.objects.filter(expire_date__lt=now).order_by("session_key")
+        deleted = batches = 0
+        last_key = ""
+        while not opts["max_batches"] or batches < opts["max_batches"]:
+            keys = list(expired.filter(session_key__gt=last_key).values_list("session_key", flat=True)[: opts["batch_size"]])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+            last_key = keys[-1]
+            batches += 1
+            if opts["sleep"]:
+                time.sleep(opts["sleep"])
+        self.stdout.write(f"sessões expiradas removidas: {deleted} ({batches} lotes)")
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from shop import related
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula a tabela de produtos relacionados (categoria, preço e compras conjuntas). "
+        "Incremental por padrão: só os produtos afetados desde a última execução."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="recalcula todos os produtos ativos")
+        parser.add_argument("--batch-size", type=int, default=related.BATCH)
+        parser.add_argument("--limit", type=int, default=None, help="relacionados por produto (padrão: RELATED_PRODUCTS_MAX)")
+
+    def handle(self, *args, **opts):
+        start = time.perf_counter()
+        products, rows = related.rebuild(full=opts["full"], batch_size=opts["batch_size"], limit=opts["limit"])
+        elapsed = time.perf_counter() - start
+        self.stdout.write(f"produtos recalculados: {products} | relações gravadas: {rows} | {elapsed:.2f}s")
@@ -0,0 +1,47 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from shop.reconcile import reconcile
+from shop.services.payments import SEARCH_PAGE_SIZE
+
+
+class Command(BaseCommand):
+    help = (
+        "Concilia pedidos pendentes com a busca de pagamentos do Mercado Pago (webhooks perdidos): "
+        "pagos viram 'paid' com baixa de estoque, recusados viram 'canceled' e liberam a reserva. "
+        "Páginas da busca em paralelo (--concurrency) e atualizações em lote (--batch-size)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--since-hours", type=float, default=72, help="idade máxima dos pedidos conciliados")
+        parser.add_argument(
+            "--min-age-minutes", type=float, default=15,
+            help="pedidos mais novos que isso ficam para o webhook",
+        )
+        parser.add_argument("--concurrency", type=int, default=8, help="páginas da busca em voo ao mesmo tempo")
+        parser.add_argument("--page-size", type=int, default=SEARCH_PAGE_SIZE)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument("--dry-run", action="store_true", help="só conta o que seria alterado")
+
+    def handle(self, *args, **opts):
+        now = timezone.now()
+        stats = reconcile(
+            since=now - timedelta(hours=opts["since_hours"]),
+            until=now - timedelta(minutes=opts["min_age_minutes"]),
+            concurrency=opts["concurrency"],
+            page_size=opts["page_size"],
+            batch_size=opts["batch_size"],
+            dry_run=opts["dry_run"],
+        )
+        seconds = stats["seconds"] or 1e-9
+        prefix = "[dry-run] " if opts["dry_run"] else ""
+        self.stdout.write(
+            f"{prefix}pendentes: {stats['pending']} | pagos: {stats['paid']} | cancelados: {stats['canceled']} | "
+            f"sem pagamento: {stats['unresolved']}"
+        )
+        self.stdout.write(
+            f"busca: {stats['pages']} páginas, {stats['payments']} pagamentos | {seconds:.2f}s "
+            f"({stats['pending'] / seconds:,.0f} pedidos/s, {stats['pages'] / seconds:,.1f} req/s)"
+        )
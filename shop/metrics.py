@@ -0,0 +1,321 @@
+"""
+Métricas em processo (formato Prometheus) para views, banco, templates e
+chamadas ao Mercado Pago. Cada worker agrega as próprias séries; o scraper
+do Prometheus soma por instância.
+"""
+import bisect
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+
+PREFIX = "lojinha_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# True/False dentro de uma requisição amostrada/não amostrada; None fora de requisições
+_sampled = contextvars.ContextVar("metrics_sampled", default=None)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: tuple, extra: str = "") -> str:
+    parts = [f'{k}="{_escape(v)}"' for k, v in key]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = PREFIX + name
+        self.help = help_text
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0.0)
+
+    def expose(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(k)} {v:g}" for k, v in items]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = PREFIX + name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}  # label_key -> [counts por bucket..., sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0, 0]
+            if idx < len(self.buckets):
+                series[idx] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels):
+        series = self._series.get(_label_key(labels))
+        return series[-1] if series else 0
+
+    def expose(self):
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, series):
+                cumulative += n
+                le = 'le="%g"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(key, le)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:g}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-1]}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(name)
+                if metric is None:
+                    metric = self._metrics[name] = cls(name, help_text, **kwargs)
+        return metric
+
+    def counter(self, name, help_text=""):
+        return self._get(Counter, name, help_text)
+
+    def histogram(self, name, help_text="", buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, buckets=buckets)
+
+    def reset(self):
+        with self._lock:
+            self._metrics.clear()
+
+    def expose(self) -> str:
+        lines = []
+        for metric in sorted(self._metrics.values(), key=lambda m: m.name):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+def requests_total():
+    return registry.counter("http_requests_total", "Requisições HTTP atendidas (todas, sem amostragem).")
+
+
+def request_seconds():
+    return registry.histogram("http_request_duration_seconds", "Latência por view (amostrada).")
+
+
+def db_queries():
+    return registry.histogram(
+        "db_queries_per_request", "Queries SQL por requisição (amostrada).", buckets=QUERY_COUNT_BUCKETS
+    )
+
+
+def db_seconds():
+    return registry.histogram("db_query_duration_seconds", "Tempo de banco por requisição (amostrada).")
+
+
+def template_seconds():
+    return registry.histogram("template_render_duration_seconds", "Tempo de renderização por template.")
+
+
+def upstream_seconds():
+    return registry.histogram("upstream_request_duration_seconds", "Latência de chamadas a serviços externos.")
+
+
+@contextmanager
+def upstream_timer(service: str, endpoint: str):
+    """Mede uma chamada externa (ex.: Mercado Pago); registra também as que falham."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        upstream_seconds().observe(
+            time.perf_counter() - start, service=service, endpoint=endpoint, outcome=outcome
+        )
+
+
+class _QueryTimer:
+    """Acumulador de queries/tempo de banco da requisição corrente."""
+    __slots__ = ("count", "seconds")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+
+# Timer da requisição corrente. Por ser um ContextVar, acompanha o código
+# síncrono chamado via sync_to_async (views assíncronas usam outra thread e,
+# portanto, outra conexão).
+_query_timer = contextvars.ContextVar("metrics_query_timer", default=None)
+
+
+def _timed_execute(execute, sql, params, many, context):
+    timer = _query_timer.get()
+    if timer is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timer.seconds += time.perf_counter() - start
+        timer.count += 1
+
+
+def install_query_timer(connection, **kwargs):
+    """Receptor de `connection_created`: instala o execute_wrapper uma vez por conexão."""
+    if _timed_execute not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_timed_execute)
+
+
+def _sample_rate() -> float:
+    return float(getattr(settings, "METRICS_SAMPLE_RATE", 1.0))
+
+
+class MetricsMiddleware:
+    """
+    Registra latência por view, queries e tempo de banco por requisição.
+    Só as requisições sorteadas por METRICS_SAMPLE_RATE pagam o custo dos
+    histogramas; o contador de requisições é sempre incrementado.
+    Funciona tanto em WSGI quanto em ASGI (sem adaptar views assíncronas).
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        sampled, tokens = self._start(request)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            self._reset(tokens)
+        self._finish(request, response, sampled, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        sampled, tokens = self._start(request)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            self._reset(tokens)
+        self._finish(request, response, sampled, time.perf_counter() - start)
+        return response
+
+    def _start(self, request):
+        rate = _sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return None, (_sampled.set(False), None)
+        timer = _QueryTimer()
+        install_query_timer(connection)
+        return timer, (_sampled.set(True), _query_timer.set(timer))
+
+    def _reset(self, tokens):
+        sampled_token, timer_token = tokens
+        _sampled.reset(sampled_token)
+        if timer_token is not None:
+            _query_timer.reset(timer_token)
+
+    def _finish(self, request, response, timer, elapsed):
+        view = _view_name(request)
+        requests_total().inc(view=view, method=request.method, status=response.status_code)
+        if timer is None:
+            return
+        request_seconds().observe(elapsed, view=view, method=request.method)
+        db_queries().observe(timer.count, view=view)
+        db_seconds().observe(timer.seconds, view=view)
+
+
+def _view_name(request) -> str:
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return "<unresolved>"
+    return match.view_name or match._func_path
+
+
+class _TimedTemplate:
+    def __init__(self, template):
+        self._template = template
+        self.template = template.template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        if _sampled.get() is False:
+            return self._template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self._template.render(context, request)
+        finally:
+            template_seconds().observe(time.perf_counter() - start, template=self.origin.template_name)
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """Backend de templates do Django que mede o tempo de cada render()."""
+
+    def from_string(self, template_code):
+        return _TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return _TimedTemplate(super().get_template(template_name))
+
+
+def metrics_view(request):
+    """Endpoint /metrics (texto Prometheus). Protegido por METRICS_TOKEN, se definido."""
+    token = getattr(settings, "METRICS_TOKEN", "")
+    if token and request.headers.get("Authorization", "") != f"Bearer {token}":
+        return HttpResponseForbidden("token inválido")
+    return HttpResponse(registry.expose(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:26
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def create_singleton(apps, schema_editor):
+    CatalogVersion = apps.get_model("shop", "CatalogVersion")
+    CatalogVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_alter_category_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(create_singleton, migrations.RunPython.noop),
+    ]
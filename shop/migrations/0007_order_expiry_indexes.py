@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='otp_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['status', 'created_at'], name='order_status_created_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:43
+
+import shop.utils
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Upper
+
+
+def dedupe_short_codes(apps, schema_editor):
+    """Antes do índice único: códigos repetidos (ignorando caixa) ganham um novo sorteio."""
+    Order = apps.get_model("shop", "Order")
+    dupes = (
+        Order.objects.annotate(code=Upper("short_code"))
+        .values("code")
+        .annotate(n=Count("id"))
+        .filter(n__gt=1)
+        .values_list("code", flat=True)
+    )
+    taken = set(Order.objects.annotate(code=Upper("short_code")).values_list("code", flat=True))
+    for code in list(dupes):
+        # o pedido mais antigo fica com o código original
+        for order in Order.objects.filter(short_code__iexact=code).order_by("id")[1:]:
+            new = shop.utils.gen_short_code()
+            while new in taken:
+                new = shop.utils.gen_short_code()
+            taken.add(new)
+            order.short_code = new
+            order.save(update_fields=["short_code"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedupe_short_codes, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='short_code',
+            field=models.CharField(default=shop.utils.gen_short_code, max_length=10, unique=True),
+        ),
+    ]
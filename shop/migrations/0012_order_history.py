@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 18:55
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Lower, Trim
+
+
+def backfill(apps, schema_editor):
+    """E-mails em minúsculas e contagem de unidades dos pedidos existentes (dois UPDATEs)."""
+    Order = apps.get_model("shop", "Order")
+    OrderItem = apps.get_model("shop", "OrderItem")
+    units = OrderItem.objects.filter(order=OuterRef("pk")).values("order").annotate(n=Sum("qty")).values("n")
+    Order.objects.update(items_count=Coalesce(Subquery(units), 0))
+    Order.objects.update(customer_email=Lower(Trim("customer_email")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0011_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='order',
+            name='customer_email',
+            field=models.EmailField(blank=True, max_length=254),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['customer_email', '-created_at', '-id'], name='order_email_created_idx'),
+        ),
+    ]
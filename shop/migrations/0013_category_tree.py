@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Value
+from django.db.models.functions import Concat
+
+
+def fill_paths(apps, schema_editor):
+    """Categorias existentes são todas raízes: path = slug + "/"."""
+    Category = apps.get_model("shop", "Category")
+    Category.objects.update(path=Concat("slug", Value("/")))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0012_order_history'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='parent',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='children', to='shop.category'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(fill_paths, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='category',
+            name='path',
+            field=models.CharField(editable=False, max_length=255, unique=True),
+        ),
+    ]
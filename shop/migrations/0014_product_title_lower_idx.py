@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:27
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0013_category_tree'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(django.db.models.functions.text.Lower('title'), name='product_title_lower_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 19:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0014_product_title_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='stock_shortfall',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -1,11 +1,124 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, models, transaction
+from django.db.models.functions import Concat, Lower, Substr
 from django.urls import reverse
-from .utils import gen_public_token, gen_short_code
+from django.utils import timezone
+from . import metrics
+from .caching import invalidate_tags
+from .utils import gen_public_token, gen_short_code, normalize_email
 
-class Category(models.Model):
+
+class CatalogVersion(models.Model):
+    """
+    Linha única (pk=1) com um contador monotônico do catálogo.
+    Qualquer escrita em Product/Category incrementa `version`; caches,
+    ETags e exports comparam esse número em vez de varrer as tabelas.
+    """
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    SINGLETON_PK = 1
+
+    @classmethod
+    def current(cls):
+        """Retorna (version, updated_at) com uma única leitura por PK."""
+        row = cls.objects.filter(pk=cls.SINGLETON_PK).values_list("version", "updated_at").first()
+        return row or (0, None)
+
+    @classmethod
+    def bump(cls):
+        # entradas de cache marcadas com a tag "catalog" (facetas etc.) caem junto
+        invalidate_tags("catalog")
+        now = timezone.now()
+        updated = cls.objects.filter(pk=cls.SINGLETON_PK).update(
+            version=models.F("version") + 1, updated_at=now
+        )
+        if not updated:
+            cls.objects.get_or_create(pk=cls.SINGLETON_PK, defaults={"version": 1, "updated_at": now})
+
+
+class CatalogQuerySet(models.QuerySet):
+    """
+    QuerySet que mantém `updated_at` e a versão do catálogo em operações em
+    massa (update/bulk_*), que não passam por save() nem disparam sinais.
+    """
+    # campos que mudam a todo instante e não invalidam o catálogo
+    untracked_fields = frozenset({"views", "reserved"})
+
+    def update(self, **kwargs):
+        tracked = set(kwargs) - self.untracked_fields
+        if tracked:
+            kwargs.setdefault("updated_at", timezone.now())
+        rows = super().update(**kwargs)
+        if rows and tracked:
+            CatalogVersion.bump()
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        created = super().bulk_create(objs, *args, **kwargs)
+        if created:
+            CatalogVersion.bump()
+        return created
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if set(fields) - self.untracked_fields:
+            now = timezone.now()
+            for obj in objs:
+                obj.updated_at = now
+            if "updated_at" not in fields:
+                fields.append("updated_at")
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        if rows:
+            CatalogVersion.bump()
+        return rows
+
+
+class TrackedModel(models.Model):
+    """Base para modelos do catálogo: `updated_at` sempre acompanha o save()."""
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = CatalogQuerySet.as_manager()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and "updated_at" not in update_fields:
+            kwargs["update_fields"] = {*update_fields, "updated_at"}
+        super().save(*args, **kwargs)
+
+
+class CategoryQuerySet(CatalogQuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create não passa por save(): o caminho é montado aqui
+        objs = list(objs)
+        for obj in objs:
+            if not obj.path:
+                obj.path = obj.build_path()
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class Category(TrackedModel):
+    """
+    Categorias aninhadas com caminho materializado: `path` é a sequência de
+    slugs da raiz até a categoria ("eletronicos/celulares/"). A subárvore
+    inteira são os caminhos com o mesmo prefixo, sem recursão (o catálogo
+    resolve os ids na árvore em cache: shop/categories.py).
+    """
     name = models.CharField(max_length=120)
     slug = models.SlugField(max_length=140, unique=True)
     featured = models.BooleanField(default=False)
+    parent = models.ForeignKey(
+        "self", null=True, blank=True, on_delete=models.PROTECT, related_name="children"
+    )
+    path = models.CharField(max_length=255, unique=True, editable=False)
+
+    objects = CategoryQuerySet.as_manager()
+
+    SEP = "/"
 
     class Meta:
         verbose_name_plural = "Categories"
@@ -13,18 +126,52 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
-class Product(models.Model):
+    def build_path(self):
+        prefix = self.parent.path if self.parent_id else ""
+        return f"{prefix}{self.slug}{self.SEP}"
+
+    def clean(self):
+        super().clean()
+        if self.pk and self.parent_id and self.parent.path.startswith(self.path):
+            raise ValidationError({"parent": "Uma categoria não pode ficar dentro de si mesma."})
+
+    def save(self, *args, **kwargs):
+        old_path, self.path = self.path, self.build_path()
+        if old_path and self.path.startswith(old_path) and self.path != old_path:
+            raise ValueError("categoria não pode ficar dentro da própria subárvore")
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "path"}
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if old_path and old_path != self.path:
+                # mudou slug ou pai: reescreve o prefixo da subárvore num UPDATE só
+                Category.objects.filter(path__startswith=old_path).exclude(pk=self.pk).update(
+                    path=Concat(models.Value(self.path), Substr("path", len(old_path) + 1))
+                )
+
+    @property
+    def depth(self):
+        return self.path.count(self.SEP) - 1
+
+class Product(TrackedModel):
     title = models.CharField(max_length=180)
     slug = models.SlugField(max_length=180, unique=True)
     description = models.TextField(blank=True)
     price_cents = models.PositiveIntegerField()
     stock = models.PositiveIntegerField(default=0)
+    # unidades presas em reservas de checkouts ainda não pagos (ver shop/inventory.py)
+    reserved = models.PositiveIntegerField(default=0)
     image_url = models.URLField(blank=True)
     category = models.ForeignKey("Category", null=True, blank=True, on_delete=models.SET_NULL, related_name="products")
     active = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
     views = models.PositiveIntegerField(default=0)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        # busca do admin por prefixo do título sem diferenciar maiúsculas (shop/admin.py)
+        indexes = [models.Index(Lower("title"), name="product_title_lower_idx")]
 
     @property
     def price(self):
@@ -44,6 +191,31 @@ class Product(models.Model):
         return reverse('shop:product_detail', kwargs={'slug': self.slug})
 
 
+class RelatedProduct(models.Model):
+    """
+    Vizinhos pré-calculados de um produto (comando `rebuild_related`).
+    A página de detalhe lê os `rank` mais baixos com uma única consulta
+    pelo índice (product, rank).
+    """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="related_links")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ["product", "rank"]
+        constraints = [
+            models.UniqueConstraint(fields=["product", "related"], name="uniq_related_product_pair"),
+        ]
+        indexes = [
+            models.Index(fields=["product", "rank"], name="related_product_rank_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score:.3f})"
+
+
 class Order(models.Model):
     STATUS_CHOICES = [
         ("pending", "Pendente"),
@@ -51,24 +223,59 @@ class Order(models.Model):
         ("canceled", "Cancelado"),
     ]
     public_token = models.CharField(max_length=48, unique=True, default=gen_public_token)
-    short_code = models.CharField(max_length=10, db_index=True, default=gen_short_code)
+    short_code = models.CharField(max_length=10, unique=True, default=gen_short_code)
 
     customer_email = models.EmailField(blank=True)
     customer_phone = models.CharField(max_length=30, blank=True)
     status = models.CharField(max_length=12, choices=STATUS_CHOICES, default="pending")
     total_cents = models.PositiveIntegerField(default=0)
+    items_count = models.PositiveIntegerField(default=0)  # unidades, gravado no checkout
+    # unidades pagas sem estoque livre (reserva expirada e vendida a outro checkout): tratar à mão
+    stock_shortfall = models.PositiveIntegerField(default=0)
 
     payment_provider = models.CharField(max_length=40, blank=True)
     payment_provider_id = models.CharField(max_length=120, blank=True)
 
     otp_code = models.CharField(max_length=10, blank=True)
-    otp_expires_at = models.DateTimeField(null=True, blank=True)
+    otp_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
 
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # expiração de pendentes e fallback do webhook: status + idade
+            models.Index(fields=["status", "created_at"], name="order_status_created_idx"),
+            # histórico do cliente: paginação por (created_at, id) dentro do e-mail
+            models.Index(fields=["customer_email", "-created_at", "-id"], name="order_email_created_idx"),
+        ]
+
+    # colisões são raríssimas (32^8 códigos); mais que isso indica outro problema
+    TOKEN_ATTEMPTS = 5
 
     def __str__(self):
         return f"Order {self.id} ({self.status})"
 
+    def save(self, *args, **kwargs):
+        self.customer_email = normalize_email(self.customer_email)
+        if not self._state.adding:
+            return super().save(*args, **kwargs)
+        # INSERT: se o short_code/public_token sorteado já existir, sorteia de novo
+        for attempt in range(self.TOKEN_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    return super().save(*args, **kwargs)
+            except IntegrityError:
+                taken = Order.objects.filter(
+                    models.Q(short_code=self.short_code) | models.Q(public_token=self.public_token)
+                ).exists()
+                if not taken or attempt == self.TOKEN_ATTEMPTS - 1:
+                    raise
+                metrics.registry.counter(
+                    "order_token_collisions_total", "Sorteios de short_code/public_token repetidos."
+                ).inc()
+                self.short_code = gen_short_code()
+                self.public_token = gen_public_token()
+
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     product = models.ForeignKey(Product, on_delete=models.PROTECT)
@@ -76,4 +283,57 @@ class OrderItem(models.Model):
     unit_price_cents = models.PositiveIntegerField()
 
     def line_total_cents(self):
-        return self.qty * self.unit_price_cents
\ No newline at end of file
+        return self.qty * self.unit_price_cents
+
+class StockReservation(models.Model):
+    """
+    Unidades de um produto presas para um pedido até `expires_at`. Criada no
+    checkout junto com o incremento condicional de Product.reserved; vira baixa
+    de estoque no pagamento ou é liberada no cancelamento/expiração.
+    """
+    STATE_CHOICES = [
+        ("held", "Reservada"),
+        ("converted", "Convertida"),
+        ("released", "Liberada"),
+    ]
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="reservations")
+    product = models.ForeignKey(Product, on_delete=models.PROTECT, related_name="reservations")
+    qty = models.PositiveIntegerField()
+    state = models.CharField(max_length=10, choices=STATE_CHOICES, default="held")
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["state", "expires_at"], name="reservation_state_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.qty}x {self.product_id} p/ pedido {self.order_id} ({self.state})"
+
+class IdempotencyKey(models.Model):
+    """
+    Primeira resposta de um checkout para um `Idempotency-Key`. A constraint
+    única (scope, key) garante que só uma requisição executa; as duplicadas
+    esperam a conclusão e recebem a mesma resposta.
+    """
+    STATE_CHOICES = [
+        ("in_progress", "Em andamento"),
+        ("done", "Concluída"),
+    ]
+    scope = models.CharField(max_length=120)
+    key = models.CharField(max_length=128)
+    fingerprint = models.CharField(max_length=64, blank=True)
+    state = models.CharField(max_length=12, choices=STATE_CHOICES, default="in_progress")
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_body = models.TextField(blank=True)
+    response_content_type = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="uniq_idempotency_scope_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.scope}:{self.key} ({self.state})"
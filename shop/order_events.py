@@ -0,0 +1,117 @@
+"""
+Canal de mudanças de status de pedidos para o stream SSE de /pedido/<token>/.
+O último status publicado fica no cache (compartilhado entre workers); quem
+escuta no mesmo processo é acordado na hora, os demais percebem ao reler a
+chave do cache a cada POLL_SECONDS. Nenhum cliente conectado consulta o banco.
+"""
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Order
+
+POLL_SECONDS = 1.0
+TERMINAL = frozenset({"paid", "canceled"})
+STATUS_LABELS = dict(Order.STATUS_CHOICES)
+
+_listeners = {}  # public_token -> {(loop, asyncio.Event)}
+_lock = threading.Lock()
+
+
+def _key(public_token):
+    return f"order-status:{public_token}"
+
+
+def event_ttl():
+    return int(getattr(settings, "ORDER_STREAM_EVENT_TTL", 3600))
+
+
+def retry_ms():
+    """Intervalo de reconexão do EventSource quando o stream não fica aberto (WSGI)."""
+    return int(getattr(settings, "ORDER_STREAM_RETRY_MS", 3000))
+
+
+def publish(public_token, status):
+    """Registra o novo status e acorda os streams locais. Seguro em qualquer thread."""
+    cache.set(_key(public_token), status, event_ttl())
+    with _lock:
+        listeners = list(_listeners.get(public_token, ()))
+    for loop, event in listeners:
+        loop.call_soon_threadsafe(event.set)
+
+
+def publish_on_commit(public_token, status):
+    """Publica só depois do COMMIT, para o cliente nunca ver um status desfeito."""
+    transaction.on_commit(lambda: publish(public_token, status))
+
+
+class _Listener:
+    def __init__(self, public_token):
+        self.token = public_token
+        self.event = asyncio.Event()
+        self._entry = (asyncio.get_running_loop(), self.event)
+
+    def __enter__(self):
+        with _lock:
+            _listeners.setdefault(self.token, set()).add(self._entry)
+        return self
+
+    def __exit__(self, *exc):
+        with _lock:
+            entries = _listeners.get(self.token)
+            if entries is not None:
+                entries.discard(self._entry)
+                if not entries:
+                    del _listeners[self.token]
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.event.clear()
+
+
+def _status_event(status):
+    data = json.dumps({"status": status, "label": str(STATUS_LABELS.get(status, status))})
+    return f"event: status\ndata: {data}\n\n"
+
+
+def status_snapshot(status):
+    """
+    Resposta SSE curta para servidores WSGI: o status atual e um `retry:`, sem
+    segurar a conexão. O EventSource reconecta sozinho e relê o status, ou
+    seja, vira polling a cada retry_ms() sem prender uma thread do worker.
+    """
+    return f"retry: {retry_ms()}\n\n" + _status_event(status)
+
+
+async def status_stream(public_token, status, max_seconds, heartbeat=15.0):
+    """
+    Gerador SSE: envia o status atual e cada mudança seguinte; encerra num
+    status final ou após `max_seconds` (o EventSource do navegador reconecta).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + max_seconds
+    last_beat = loop.time()
+    yield f"retry: {retry_ms()}\n\n"
+    yield _status_event(status)
+    if status in TERMINAL:
+        return
+
+    with _Listener(public_token) as listener:
+        while loop.time() < deadline:
+            await listener.wait(min(POLL_SECONDS, max(deadline - loop.time(), 0)))
+            current = await cache.aget(_key(public_token))
+            if current and current != status:
+                status = current
+                yield _status_event(status)
+                if status in TERMINAL:
+                    return
+            elif loop.time() - last_beat >= heartbeat:
+                last_beat = loop.time()
+                yield ": ping\n\n"
@@ -0,0 +1,74 @@
+"""
+Histórico de pedidos do cliente, liberado depois do OTP (verify_otp).
+
+O acesso é um token assinado (django.core.signing) com o e-mail e validade
+curta (ORDER_HISTORY_TOKEN_TTL): nada fica gravado no servidor. A listagem
+pagina por keyset sobre o índice (customer_email, created_at, id), então a
+página N custa o mesmo que a primeira, e cada linha já traz total e unidades
+gravados no checkout (sem consultar itens por pedido).
+"""
+import base64
+import json
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db.models import Q
+
+from .models import Order
+from .utils import normalize_email
+
+SALT = "shop.order-history"
+FIELDS = ("id", "short_code", "public_token", "status", "total_cents", "items_count", "created_at")
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def token_ttl():
+    return int(getattr(settings, "ORDER_HISTORY_TOKEN_TTL", 900))
+
+
+def page_size():
+    return int(getattr(settings, "ORDER_HISTORY_PAGE_SIZE", 20))
+
+
+def issue_token(email):
+    return signing.dumps({"email": normalize_email(email)}, salt=SALT, compress=True)
+
+
+def read_token(token):
+    """E-mail do token, ou None se inválido/expirado."""
+    try:
+        return signing.loads(token or "", salt=SALT, max_age=token_ttl())["email"]
+    except (signing.BadSignature, KeyError, TypeError):
+        return None
+
+
+def encode_cursor(row):
+    raw = json.dumps([row["created_at"].isoformat(), row["id"]]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        created, pk = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return datetime.fromisoformat(created), int(pk)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+
+
+def orders_page(email, cursor=None, limit=None):
+    """
+    ([pedidos], próximo cursor ou None), do mais recente para o mais antigo.
+    Uma consulta: busca limit+1 linhas para saber se há próxima página.
+    """
+    limit = limit or page_size()
+    qs = Order.objects.filter(customer_email=normalize_email(email))
+    if cursor:
+        created, pk = decode_cursor(cursor)
+        qs = qs.filter(Q(created_at__lt=created) | Q(created_at=created, id__lt=pk))
+    rows = list(qs.order_by("-created_at", "-id").values(*FIELDS)[: limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
@@ -0,0 +1,135 @@
+"""
+Conciliação de pagamentos com o Mercado Pago, para pedidos que ficaram
+"pending" porque o webhook se perdeu. Em vez de um get_payment_info por
+pedido, percorre a busca de pagamentos (/v1/payments/search) pela janela de
+datas dos pedidos, com páginas buscadas em paralelo (limitado por
+`concurrency`) no cliente HTTP com pool, e casa os resultados pelo
+external_reference (= id do pedido). As mudanças de status e de estoque são
+aplicadas em lotes (um UPDATE por lote, não por pedido).
+"""
+import asyncio
+import time
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import inventory, order_events
+from .models import Order
+from .services.payments import SEARCH_PAGE_SIZE, AsyncMercadoPago, async_clients
+
+PAID = frozenset({"approved", "accredited"})
+FAILED = frozenset({"cancelled", "rejected", "expired"})
+
+
+def pending_orders(since, until):
+    """{external_reference: created_at} dos pedidos pendentes criados em [since, until)."""
+    rows = Order.objects.filter(status="pending", created_at__gte=since, created_at__lt=until)
+    return {str(pk): created for pk, created in rows.values_list("id", "created_at")}
+
+
+async def fetch_payments(begin, end, concurrency=8, page_size=SEARCH_PAGE_SIZE):
+    """
+    Todos os pagamentos criados em [begin, end]: a primeira página informa o
+    total, as demais saem em paralelo. Retorna (pagamentos, páginas buscadas).
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def page(offset):
+        async with sem:
+            return await AsyncMercadoPago.search_payments(begin, end, offset, page_size)
+
+    async with async_clients():
+        first = await page(0)
+        rest = await asyncio.gather(*(page(offset) for offset in range(page_size, first["total"], page_size)))
+    pages = [first, *rest]
+    return [payment for p in pages for payment in p["results"]], len(pages)
+
+
+def resolve(payments, refs):
+    """
+    {external_reference: "paid" | "canceled"} para os pedidos em `refs`.
+    Um pagamento aprovado basta; cancelado só se todas as tentativas falharam.
+    Pedidos sem pagamento (ou ainda em análise) ficam de fora.
+    """
+    statuses = defaultdict(set)
+    for payment in payments:
+        ref = str(payment.get("external_reference") or "")
+        if ref in refs:
+            statuses[ref].add((payment.get("status") or "").lower())
+    out = {}
+    for ref, seen in statuses.items():
+        if seen & PAID:
+            out[ref] = "paid"
+        elif seen <= FAILED:
+            out[ref] = "canceled"
+    return out
+
+
+class _Raced(Exception):
+    """Algum pedido do lote mudou de status entre o SELECT e o UPDATE."""
+
+
+def _stock(order_ids, status):
+    if status == "paid":
+        inventory.convert_orders(order_ids)
+    else:
+        inventory.release_orders(order_ids)
+
+
+def _transition_one(order_id, token, status):
+    with transaction.atomic():
+        if not Order.objects.filter(pk=order_id, status="pending").update(status=status):
+            return 0
+        _stock([order_id], status)
+        order_events.publish_on_commit(token, status)
+        return 1
+
+
+def transition(order_ids, status):
+    """
+    Move pedidos ainda "pending" para `status` (paid/canceled) com baixa ou
+    liberação de estoque, num lote. Se um webhook concorrente mudar algum
+    pedido entre o SELECT e o UPDATE, refaz o lote pedido a pedido.
+    """
+    with transaction.atomic():
+        rows = list(
+            Order.objects.select_for_update()
+            .filter(id__in=order_ids, status="pending")
+            .values_list("id", "public_token")
+        )
+        if not rows:
+            return 0
+        ids = [pk for pk, _ in rows]
+        try:
+            with transaction.atomic():
+                if Order.objects.filter(id__in=ids, status="pending").update(status=status) != len(ids):
+                    raise _Raced
+                _stock(ids, status)
+        except _Raced:
+            return sum(_transition_one(pk, token, status) for pk, token in rows)
+        for _, token in rows:
+            order_events.publish_on_commit(token, status)
+        return len(ids)
+
+
+def reconcile(since, until=None, concurrency=8, page_size=SEARCH_PAGE_SIZE, batch_size=500, dry_run=False):
+    """Concilia os pendentes criados em [since, until). Retorna contadores e tempo."""
+    started = time.perf_counter()
+    now = timezone.now()
+    pending = pending_orders(since, until or now)
+    stats = {"pending": len(pending), "pages": 0, "payments": 0, "paid": 0, "canceled": 0}
+    if pending:
+        # pagamentos nascem depois do pedido: da criação do pedido mais antigo até agora
+        payments, stats["pages"] = asyncio.run(fetch_payments(min(pending.values()), now, concurrency, page_size))
+        stats["payments"] = len(payments)
+        by_status = defaultdict(list)
+        for ref, status in resolve(payments, pending).items():
+            by_status[status].append(int(ref))
+        for status, ids in by_status.items():
+            for i in range(0, len(ids), batch_size):
+                batch = ids[i:i + batch_size]
+                stats[status] += len(batch) if dry_run else transition(batch, status)
+    stats["unresolved"] = stats["pending"] - stats["paid"] - stats["canceled"]
+    stats["seconds"] = time.perf_counter() - started
+    return stats
@@ -0,0 +1,164 @@
+"""
+Produtos relacionados pré-calculados. A similaridade entre dois produtos ativos
+combina mesma categoria, proximidade de preço e compras conjuntas (pedidos não
+cancelados em OrderItem). O cálculo roda fora da requisição, pelo comando
+`manage.py rebuild_related`; a página de detalhe só lê a tabela RelatedProduct.
+"""
+import bisect
+import math
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import OrderItem, Product, RelatedProduct
+
+WEIGHT_CATEGORY = 1.0
+WEIGHT_PRICE = 0.5
+WEIGHT_COPURCHASE = 2.0
+PRICE_NEIGHBOURS = 20  # vizinhos de preço (para cada lado) considerados na mesma categoria
+BATCH = 500
+
+
+def max_related() -> int:
+    return int(getattr(settings, "RELATED_PRODUCTS_MAX", 8))
+
+
+def related_for(product, limit=None):
+    """Relacionados de `product`, melhores primeiro (uma consulta, índice product+rank)."""
+    links = (
+        RelatedProduct.objects.filter(product=product, related__active=True)
+        .select_related("related")
+        .order_by("rank")[: limit or max_related()]
+    )
+    return [link.related for link in links]
+
+
+class CatalogSnapshot:
+    """(categoria, preço) de todos os produtos ativos, com índice por categoria ordenado por preço."""
+
+    def __init__(self):
+        self.info = {}
+        by_cat = defaultdict(list)
+        for pid, cat, price in Product.objects.filter(active=True).values_list("id", "category_id", "price_cents"):
+            self.info[pid] = (cat, price)
+            if cat is not None:
+                by_cat[cat].append((price, pid))
+        self._by_cat = {}
+        for cat, items in by_cat.items():
+            items.sort()
+            self._by_cat[cat] = ([price for price, _ in items], [pid for _, pid in items])
+
+    def price_neighbours(self, pid, k=PRICE_NEIGHBOURS):
+        cat, price = self.info[pid]
+        if cat is None:
+            return []
+        prices, ids = self._by_cat[cat]
+        i = bisect.bisect_left(prices, price)
+        return [other for other in ids[max(0, i - k): i + k + 1] if other != pid]
+
+
+def copurchases(product_ids):
+    """{produto: Counter(outro produto -> nº de pedidos em comum)} para `product_ids`."""
+    targets = set(product_ids)
+    orders = (
+        OrderItem.objects.filter(product_id__in=targets)
+        .exclude(order__status="canceled")
+        .values("order_id")
+    )
+    by_order = defaultdict(set)
+    for order_id, pid in OrderItem.objects.filter(order_id__in=orders).values_list("order_id", "product_id"):
+        by_order[order_id].add(pid)
+
+    out = defaultdict(Counter)
+    for pids in by_order.values():
+        for pid in pids & targets:
+            for other in pids:
+                if other != pid:
+                    out[pid][other] += 1
+    return out
+
+
+def similarity(a, b, together=0, max_together=0):
+    """Pontuação entre dois (categoria, preço); `together` = pedidos em comum."""
+    (cat_a, price_a), (cat_b, price_b) = a, b
+    score = WEIGHT_CATEGORY if cat_a is not None and cat_a == cat_b else 0.0
+    top = max(price_a, price_b)
+    score += WEIGHT_PRICE * (1 - abs(price_a - price_b) / top if top else 1.0)
+    if together:
+        score += WEIGHT_COPURCHASE * math.log1p(together) / math.log1p(max_together)
+    return score
+
+
+def rank_related(snapshot, pid, bought_with, limit):
+    """Melhores `limit` candidatos de `pid`: vizinhos de preço na categoria + compras conjuntas."""
+    candidates = set(snapshot.price_neighbours(pid)) | {o for o in bought_with if o in snapshot.info}
+    candidates.discard(pid)
+    max_together = max(bought_with.values(), default=0)
+    scored = [
+        (similarity(snapshot.info[pid], snapshot.info[other], bought_with.get(other, 0), max_together), other)
+        for other in candidates
+    ]
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    return scored[:limit]
+
+
+def stale_products(snapshot, since):
+    """
+    Produtos cujo conjunto de relacionados pode ter mudado desde `since`:
+    os alterados, seus vizinhos de preço, quem aponta para eles, os comprados
+    em pedidos novos e os ativos ainda sem linhas. `since=None` => todos.
+    """
+    if since is None:
+        return set(snapshot.info)
+    changed = set(Product.objects.filter(updated_at__gt=since).values_list("id", flat=True))
+    changed |= set(OrderItem.objects.filter(order__created_at__gt=since).values_list("product_id", flat=True))
+
+    affected = set(changed)
+    for pid in changed:
+        if pid in snapshot.info:
+            affected.update(snapshot.price_neighbours(pid))
+    ids = list(changed)
+    for i in range(0, len(ids), BATCH):
+        affected.update(
+            RelatedProduct.objects.filter(related_id__in=ids[i:i + BATCH]).values_list("product_id", flat=True)
+        )
+    affected.update(
+        Product.objects.filter(active=True, related_links__isnull=True).values_list("id", flat=True)
+    )
+    return affected & set(snapshot.info)
+
+
+def last_rebuild():
+    return RelatedProduct.objects.aggregate(last=Max("computed_at"))["last"]
+
+
+def rebuild(full=False, batch_size=BATCH, limit=None):
+    """
+    Recalcula a tabela de relacionados. Incremental por padrão (só os produtos
+    afetados desde a última execução). Retorna (produtos recalculados, linhas gravadas).
+    """
+    started = timezone.now()
+    limit = limit or max_related()
+    snapshot = CatalogSnapshot()
+    targets = sorted(stale_products(snapshot, None if full else last_rebuild()))
+    if full:
+        # produtos desativados não aparecem mais em lugar nenhum
+        RelatedProduct.objects.exclude(product_id__in=Product.objects.filter(active=True)).delete()
+
+    written = 0
+    for i in range(0, len(targets), batch_size):
+        batch = targets[i:i + batch_size]
+        bought = copurchases(batch)
+        rows = [
+            RelatedProduct(product_id=pid, related_id=other, score=score, rank=rank, computed_at=started)
+            for pid in batch
+            for rank, (score, other) in enumerate(rank_related(snapshot, pid, bought.get(pid, {}), limit), 1)
+        ]
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=batch).delete()
+            RelatedProduct.objects.bulk_create(rows, batch_size=batch_size)
+        written += len(rows)
+    return len(targets), written
@@ -1,9 +1,26 @@
+import asyncio
+import contextlib
 import os
+import threading
 import json
-import requests
+import weakref
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from shop.metrics import upstream_timer
+from shop.utils import lazy_import, optional_import
+
+# Importados no primeiro uso: processos que só servem o catálogo não pagam o custo
+requests = lazy_import("requests")
+# httpx é opcional: sem ele (ou fora de um loop de vida longa) o cliente assíncrono
+# delega ao síncrono em thread
+httpx = optional_import("httpx")
+
 MP_BASE = "https://api.mercadopago.com"
+TIMEOUT = 20
+SEARCH_PAGE_SIZE = 100  # limite por página aceito pela busca de pagamentos
 
 class PaymentError(Exception):
     pass
@@ -17,6 +34,89 @@ def _mock_enabled() -> bool:
     # Ativa mock explicitamente via settings, ou automaticamente se não houver token
     return bool(getattr(settings, "PAYMENTS_MOCK", False)) or not _get_mp_token()
 
+def _api_base() -> str:
+    # Permite apontar para um stub local (testes/benchmarks)
+    return (getattr(settings, "MERCADO_PAGO_API_BASE", "") or MP_BASE).rstrip("/")
+
+def _preference_payload(title, quantity, unit_price, external_reference, payer_email):
+    return {
+        "items": [{
+            "title": title,
+            "quantity": quantity,
+            "currency_id": "BRL",
+            "unit_price": round(unit_price, 2)
+        }],
+        "payer": {"email": payer_email} if payer_email else {},
+        "external_reference": external_reference,
+        "back_urls": {
+            "success": "http://localhost:8000/checkout/sucesso",
+            "failure": "http://localhost:8000/checkout/falha",
+            "pending": "http://localhost:8000/checkout/pendente",
+        },
+        "auto_return": "approved"
+    }
+
+def _preference_result(data):
+    return {
+        "id": data.get("id"),
+        "init_point": data.get("init_point"),
+        "sandbox_init_point": data.get("sandbox_init_point"),
+    }
+
+def _payment_result(data):
+    return {
+        "status": data.get("status"),
+        "external_reference": data.get("external_reference"),
+        "id": data.get("id"),
+    }
+
+def _search_params(begin_date, end_date, offset, limit, external_reference=None):
+    params = {
+        "sort": "date_created",
+        "criteria": "asc",
+        "range": "date_created",
+        "begin_date": begin_date.isoformat(timespec="milliseconds"),
+        # a API só aceita milissegundos: arredonda o fim para cima para não perder o último ms
+        "end_date": (end_date + timedelta(microseconds=999)).isoformat(timespec="milliseconds"),
+        "offset": offset,
+        "limit": limit,
+    }
+    if external_reference:
+        params["external_reference"] = external_reference
+    return params
+
+def _search_result(data):
+    paging = data.get("paging") or {}
+    return {
+        "results": [_payment_result(p) | {"date_created": p.get("date_created")} for p in data.get("results") or []],
+        "total": int(paging.get("total") or 0),
+    }
+
+def _error_body(r):
+    try:
+        return r.json()
+    except Exception:
+        return (r.text or "")[:400]
+
+_session_lock = threading.Lock()
+_mp_session = None
+
+def _max_connections():
+    return int(getattr(settings, "MERCADO_PAGO_MAX_CONNECTIONS", 100))
+
+def _session():
+    """requests.Session do processo: conexões keep-alive reaproveitadas entre requisições."""
+    global _mp_session
+    if _mp_session is None:
+        with _session_lock:
+            if _mp_session is None:
+                session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_maxsize=_max_connections())
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _mp_session = session
+    return _mp_session
+
 class MercadoPago:
     @staticmethod
     def create_preference(title: str, quantity: int, unit_price: float, external_reference: str, payer_email: str = ""):
@@ -35,42 +135,18 @@ class MercadoPago:
         if not token:
             raise PaymentError("MERCADO_PAGO_ACCESS_TOKEN ausente.")
 
-        url = f"{MP_BASE}/checkout/preferences"
+        url = f"{_api_base()}/checkout/preferences"
         headers = {"Authorization": f"Bearer {token}", "Content-Type": "application/json"}
-        payload = {
-            "items": [{
-                "title": title,
-                "quantity": quantity,
-                "currency_id": "BRL",
-                "unit_price": round(unit_price, 2)
-            }],
-            "payer": {"email": payer_email} if payer_email else {},
-            "external_reference": external_reference,
-            "back_urls": {
-                "success": "http://localhost:8000/checkout/sucesso",
-                "failure": "http://localhost:8000/checkout/falha",
-                "pending": "http://localhost:8000/checkout/pendente",
-            },
-            "auto_return": "approved"
-        }
+        payload = _preference_payload(title, quantity, unit_price, external_reference, payer_email)
         try:
-            r = requests.post(url, headers=headers, data=json.dumps(payload), timeout=20)
+            with upstream_timer("mercadopago", "create_preference"):
+                r = _session().post(url, headers=headers, data=json.dumps(payload), timeout=TIMEOUT)
             # Se retornar erro, levanta exceção com detalhe curto
             try:
                 r.raise_for_status()
             except requests.HTTPError as e:
-                body = ""
-                try:
-                    body = r.json()
-                except Exception:
-                    body = (r.text or "")[:400]
-                raise PaymentError(f"MercadoPago  {r.status_code}: {body}") from e
-            data = r.json()
-            return {
-                "id": data.get("id"),
-                "init_point": data.get("init_point"),
-                "sandbox_init_point": data.get("sandbox_init_point"),
-            }
+                raise PaymentError(f"MercadoPago  {r.status_code}: {_error_body(r)}") from e
+            return _preference_result(r.json())
         except requests.RequestException as e:
             raise PaymentError(f"Erro de rede ao acessar MercadoPago: {e}") from e
 
@@ -87,24 +163,139 @@ class MercadoPago:
         if not token:
             raise PaymentError("MERCADO_PAGO_ACCESS_TOKEN ausente.")
 
-        url = f"{MP_BASE}/v1/payments/{payment_id}"
+        url = f"{_api_base()}/v1/payments/{payment_id}"
         headers = {"Authorization": f"Bearer {token}"}
         try:
-            r = requests.get(url, headers=headers, timeout=20)
+            with upstream_timer("mercadopago", "get_payment"):
+                r = _session().get(url, headers=headers, timeout=TIMEOUT)
             try:
                 r.raise_for_status()
             except requests.HTTPError as e:
-                body = ""
-                try:
-                    body = r.json()
-                except Exception:
-                    body = (r.text or "")[:400]
-                raise PaymentError(f"MercadoPago  {r.status_code}: {body}") from e
-            data = r.json()
-            return {
-                "status": data.get("status"),
-                "external_reference": data.get("external_reference"),
-                "id": data.get("id"),
-            }
+                raise PaymentError(f"MercadoPago  {r.status_code}: {_error_body(r)}") from e
+            return _payment_result(r.json())
         except requests.RequestException as e:
             raise PaymentError(f"Erro de rede ao acessar MercadoPago: {e}") from e
+
+    @staticmethod
+    def search_payments(begin_date, end_date, offset=0, limit=SEARCH_PAGE_SIZE, external_reference=None):
+        """
+        Uma página de /v1/payments/search por data de criação:
+        {"results": [{status, external_reference, id, date_created}], "total": N}.
+        No modo mock não há pagamentos.
+        """
+        if _mock_enabled():
+            return {"results": [], "total": 0}
+
+        url = f"{_api_base()}/v1/payments/search"
+        headers = {"Authorization": f"Bearer {_get_mp_token()}"}
+        params = _search_params(begin_date, end_date, offset, limit, external_reference)
+        try:
+            with upstream_timer("mercadopago", "search_payments"):
+                r = _session().get(url, headers=headers, params=params, timeout=TIMEOUT)
+            try:
+                r.raise_for_status()
+            except requests.HTTPError as e:
+                raise PaymentError(f"MercadoPago  {r.status_code}: {_error_body(r)}") from e
+            return _search_result(r.json())
+        except requests.RequestException as e:
+            raise PaymentError(f"Erro de rede ao acessar MercadoPago: {e}") from e
+
+
+# Um AsyncClient (pool de conexões keep-alive) por event loop de vida longa: o
+# do servidor ASGI (ver lojinha/asgi.py) ou o de um job com `async_clients()`.
+# Views async sob WSGI rodam cada requisição num loop novo do async_to_sync;
+# ali um cliente por loop nunca seria reaproveitado nem fechado, então esses
+# loops usam o cliente síncrono (requests.Session do processo) numa thread.
+_async_clients = weakref.WeakKeyDictionary()
+_pooled_loops = weakref.WeakSet()
+
+def register_loop():
+    """Marca o loop atual como de vida longa: chamadas async passam a usar o pool httpx."""
+    _pooled_loops.add(asyncio.get_running_loop())
+
+def _use_httpx():
+    return httpx is not None and asyncio.get_running_loop() in _pooled_loops
+
+def _async_client():
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        limits = httpx.Limits(max_connections=_max_connections(), max_keepalive_connections=20)
+        client = _async_clients[loop] = httpx.AsyncClient(timeout=TIMEOUT, limits=limits)
+    return client
+
+async def close_async_clients():
+    """Fecha o cliente do loop atual (shutdown do servidor ASGI ou fim do job)."""
+    loop = asyncio.get_running_loop()
+    _pooled_loops.discard(loop)
+    client = _async_clients.pop(loop, None)
+    if client is not None:
+        await client.aclose()
+
+@contextlib.asynccontextmanager
+async def async_clients():
+    """Pool httpx para o loop atual enquanto durar o bloco (jobs com asyncio.run)."""
+    register_loop()
+    try:
+        yield
+    finally:
+        await close_async_clients()
+
+async def _arequest(method, endpoint, url, **kwargs):
+    try:
+        with upstream_timer("mercadopago", endpoint):
+            r = await _async_client().request(method, url, **kwargs)
+    except httpx.HTTPError as e:
+        raise PaymentError(f"Erro de rede ao acessar MercadoPago: {e}") from e
+    if r.is_error:
+        raise PaymentError(f"MercadoPago  {r.status_code}: {_error_body(r)}")
+    return r.json()
+
+class AsyncMercadoPago:
+    """
+    Mesma interface do `MercadoPago`, mas sem prender uma thread durante a
+    ida e volta ao provedor. O modo mock reaproveita a implementação síncrona
+    (não faz I/O), o que mantém os patches de teste valendo para os dois.
+    """
+
+    @staticmethod
+    async def create_preference(title: str, quantity: int, unit_price: float, external_reference: str, payer_email: str = ""):
+        if _mock_enabled():
+            return MercadoPago.create_preference(title, quantity, unit_price, external_reference, payer_email)
+        if not _use_httpx():
+            return await sync_to_async(MercadoPago.create_preference, thread_sensitive=False)(
+                title, quantity, unit_price, external_reference, payer_email
+            )
+        data = await _arequest(
+            "POST", "create_preference", f"{_api_base()}/checkout/preferences",
+            headers={"Authorization": f"Bearer {_get_mp_token()}"},
+            json=_preference_payload(title, quantity, unit_price, external_reference, payer_email),
+        )
+        return _preference_result(data)
+
+    @staticmethod
+    async def get_payment_info(payment_id: str):
+        if _mock_enabled():
+            return MercadoPago.get_payment_info(payment_id)
+        if not _use_httpx():
+            return await sync_to_async(MercadoPago.get_payment_info, thread_sensitive=False)(payment_id)
+        data = await _arequest(
+            "GET", "get_payment", f"{_api_base()}/v1/payments/{payment_id}",
+            headers={"Authorization": f"Bearer {_get_mp_token()}"},
+        )
+        return _payment_result(data)
+
+    @staticmethod
+    async def search_payments(begin_date, end_date, offset=0, limit=SEARCH_PAGE_SIZE, external_reference=None):
+        if _mock_enabled():
+            return MercadoPago.search_payments(begin_date, end_date, offset, limit, external_reference)
+        if not _use_httpx():
+            return await sync_to_async(MercadoPago.search_payments, thread_sensitive=False)(
+                begin_date, end_date, offset, limit, external_reference
+            )
+        data = await _arequest(
+            "GET", "search_payments", f"{_api_base()}/v1/payments/search",
+            headers={"Authorization": f"Bearer {_get_mp_token()}"},
+            params=_search_params(begin_date, end_date, offset, limit, external_reference),
+        )
+        return _search_result(data)
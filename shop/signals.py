@@ -0,0 +1,16 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .metrics import install_query_timer
+from .models import CatalogVersion, Category, Product
+
+connection_created.connect(install_query_timer, dispatch_uid="shop.metrics.install_query_timer")
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Product)
+@receiver(post_delete, sender=Category)
+def bump_catalog_version(sender, **kwargs):
+    CatalogVersion.bump()
@@ -0,0 +1,251 @@
+"""
+Snapshot estático da vitrine para nginx/CDN: páginas de produto e listagens
+comuns do catálogo (por categoria x ordenação, primeiras N páginas) em HTML e
+JSON, renderizadas pelas mesmas views/templates do site.
+
+Layout em SNAPSHOT_DIR (espelha as URLs, ver README):
+    p/<slug>/index.html, p/<slug>/index.json
+    catalog/<categoria|_todas>/<sort>/<página>.html e .json
+
+Incremental: o manifesto (.snapshot.json) guarda o instante da última geração,
+o hash de cada arquivo e a categoria de cada produto; a próxima execução só
+renderiza o que mudou desde então e só regrava arquivos cujo conteúdo mudou.
+Cada arquivo é escrito num temporário e trocado com os.replace (leitores
+nunca veem arquivo pela metade), com variante .gz para o gzip_static do nginx.
+"""
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import categories
+from .catalog import API_FIELDS, DEFAULT_SORT, PAGE_SIZE, SORT_MAP, filter_products, serialize_product
+from .models import Category, Product, RelatedProduct
+
+MANIFEST = ".snapshot.json"
+ALL = "_todas"  # listagem sem filtro de categoria
+PRODUCT_FIELDS = tuple(f for f in API_FIELDS if f != "views")  # views muda a cada acesso
+GZIP_MIN_SIZE = 256
+
+
+def snapshot_dir() -> Path:
+    return Path(getattr(settings, "SNAPSHOT_DIR", settings.BASE_DIR / "snapshot"))
+
+
+def listing_pages() -> int:
+    return int(getattr(settings, "SNAPSHOT_CATALOG_PAGES", 3))
+
+
+def product_files(slug):
+    return f"p/{slug}/index.html", f"p/{slug}/index.json"
+
+
+def listing_file(cat, sort, page, ext):
+    return f"catalog/{cat or ALL}/{sort}/{page}.{ext}"
+
+
+class Writer:
+    """Escrita atômica com hash: conteúdo igual ao do manifesto não é regravado."""
+
+    def __init__(self, root, hashes):
+        self.root = Path(root)
+        self.hashes = hashes
+        self.written = self.unchanged = 0
+
+    def write(self, rel, data):
+        if isinstance(data, str):
+            data = data.encode()
+        digest = hashlib.sha1(data).hexdigest()
+        if self.hashes.get(rel) == digest and (self.root / rel).exists():
+            self.unchanged += 1
+            return
+        path = self.root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _replace(path, data)
+        gz = path.with_name(path.name + ".gz")
+        if len(data) >= GZIP_MIN_SIZE:
+            _replace(gz, gzip.compress(data, compresslevel=9, mtime=0))
+        elif gz.exists():
+            gz.unlink()
+        self.hashes[rel] = digest
+        self.written += 1
+
+    def remove(self, rel):
+        for path in (self.root / rel, self.root / (rel + ".gz")):
+            if path.exists():
+                path.unlink()
+        self.hashes.pop(rel, None)
+
+
+def _replace(path, data):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def render_product(product):
+    from .views import product_context
+
+    html = render_to_string("shop/product_detail.html", product_context(product))
+    data = json.dumps(serialize_product(product, PRODUCT_FIELDS), cls=DjangoJSONEncoder)
+    return html, data
+
+
+def render_listing(factory, cat, sort, page):
+    from .views import api_catalog, catalog_view
+
+    params = {"sort": sort, "page": page}
+    if cat:
+        params["cat"] = cat
+    html = catalog_view(factory.get("/", params)).content
+    data = api_catalog(factory.get("/api/catalog", params)).content
+    return html, data
+
+
+def _load_manifest(root):
+    try:
+        return json.loads((root / MANIFEST).read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _listing_counts():
+    """{slug da categoria ou None: nº de produtos ativos na subárvore}."""
+    counts = {None: filter_products({}).count()}
+    for node in categories.category_tree():
+        counts[node["slug"]] = filter_products({"cat": node["slug"]}).count()
+    return counts
+
+
+def _ancestor_slugs(category_ids):
+    tree = {node["id"]: node for node in categories.category_tree()}
+    slugs = set()
+    for cid in category_ids:
+        node = tree.get(cid)
+        if node:
+            slugs.update(node["path"].split(Category.SEP)[:-1])
+    return slugs
+
+
+def build(full=False, root=None, pages=None):
+    """
+    Gera/atualiza o snapshot. Retorna contadores:
+    {"products", "listings", "written", "unchanged", "removed", "seconds"}.
+    """
+    started_at = time.perf_counter()
+    root = Path(root or snapshot_dir())
+    root.mkdir(parents=True, exist_ok=True)
+    pages = pages or listing_pages()
+    manifest = {} if full else _load_manifest(root)
+    since = parse_datetime(manifest["built_at"]) if manifest.get("built_at") else None
+    now = timezone.now()
+    writer = Writer(root, dict(manifest.get("files", {})))
+    old_products = {int(pid): tuple(v) for pid, v in manifest.get("products", {}).items()}
+
+    active = {
+        pid: (slug, category_id)
+        for pid, slug, category_id in Product.objects.filter(active=True).values_list("id", "slug", "category_id")
+    }
+    tree_slugs = {node["slug"] for node in categories.category_tree()}
+
+    if since is None:
+        product_ids = set(active)
+        listing_cats = {None} | tree_slugs
+    else:
+        changed = set(Product.objects.filter(updated_at__gt=since).values_list("id", flat=True))
+        changed |= {pid for pid, info in active.items() if old_products.get(pid) != info}
+        gone = set(old_products) - set(active)
+        changed_cats = set(Category.objects.filter(updated_at__gt=since).values_list("id", flat=True))
+        cats_deleted = bool(set(manifest.get("categories", [])) - tree_slugs)
+
+        product_ids = changed & set(active)
+        # relacionados e breadcrumbs: páginas que mostram um produto/categoria alterados
+        product_ids |= set(
+            RelatedProduct.objects.filter(Q(related_id__in=changed | gone) | Q(computed_at__gt=since))
+            .values_list("product_id", flat=True)
+        )
+        if changed_cats:
+            tree = categories.category_tree()
+            paths = tuple(node["path"] for node in tree if node["id"] in changed_cats)
+            subtree = [node["id"] for node in tree if paths and node["path"].startswith(paths)]
+            product_ids |= set(Product.objects.filter(category_id__in=subtree).values_list("id", flat=True))
+        product_ids &= set(active)
+
+        if changed_cats or cats_deleted:
+            listing_cats = {None} | tree_slugs  # o menu de categorias aparece em todas as listagens
+        elif changed or gone:
+            touched = {active[pid][1] for pid in changed if pid in active}
+            touched |= {old_products[pid][1] for pid in changed | gone if pid in old_products}
+            listing_cats = {None} | (_ancestor_slugs(touched - {None}) & tree_slugs)
+        else:
+            listing_cats = set()
+
+    removed = 0
+    for pid, (slug, _) in old_products.items():
+        if active.get(pid, (None,))[0] != slug:
+            for rel in product_files(slug):
+                writer.remove(rel)
+            removed += 1
+
+    for product in Product.objects.filter(id__in=product_ids).select_related("category"):
+        html, data = render_product(product)
+        for rel, content in zip(product_files(product.slug), (html, data)):
+            writer.write(rel, content)
+
+    factory = RequestFactory()
+    counts = _listing_counts() if listing_cats else {}
+    rendered = 0
+    for cat in listing_cats:
+        last = min(pages, max(1, -(-counts.get(cat, 0) // PAGE_SIZE)))
+        for sort in SORT_MAP:
+            for page in range(1, last + 1):
+                html, data = render_listing(factory, cat, sort, page)
+                writer.write(listing_file(cat, sort, page, "html"), html)
+                writer.write(listing_file(cat, sort, page, "json"), data)
+                rendered += 1
+
+    # listagens que deixaram de existir (categoria removida ou com menos páginas)
+    keep = {ALL} | tree_slugs
+    for rel in list(writer.hashes):
+        parts = rel.split("/")
+        if parts[0] != "catalog":
+            continue
+        cat, page = parts[1], int(parts[3].split(".")[0])
+        slug = None if cat == ALL else cat
+        if cat not in keep or (slug in counts and page > max(1, min(pages, -(-counts[slug] // PAGE_SIZE)))):
+            writer.remove(rel)
+            removed += 1
+
+    manifest = {
+        "built_at": now.isoformat(),
+        "default_sort": DEFAULT_SORT,
+        "files": writer.hashes,
+        "products": {str(pid): list(info) for pid, info in active.items()},
+        "categories": sorted(tree_slugs),
+    }
+    Writer(root, {}).write(MANIFEST, json.dumps(manifest, sort_keys=True))
+    return {
+        "products": len(product_ids),
+        "listings": rendered,
+        "written": writer.written,
+        "unchanged": writer.unchanged,
+        "removed": removed,
+        "seconds": time.perf_counter() - started_at,
+    }
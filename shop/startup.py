@@ -0,0 +1,63 @@
+"""
+Orçamento de boot dos workers: mede, num processo novo, quanto custam
+`django.setup()` + carregar as URLs e resolver uma rota, e quais módulos o
+`python -X importtime` aponta como mais caros. Usado pelo comando
+`manage.py profile_imports` e pelo teste de regressão de startup.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from django.conf import settings
+
+# Dependências que só alguns caminhos usam e não devem carregar no boot
+LAZY_MODULES = ("requests", "httpx", "PIL.Image", "brotli", "numpy")
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver, resolve
+get_resolver().url_patterns
+resolve(sys.argv[1])
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "modules": sorted(sys.modules)}))
+"""
+
+
+def _parse_importtime(stderr):
+    """Linhas 'import time: self | cumulative | nome' -> [(nome, self_us, cum_us)]."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        rows.append((name.strip(), int(self_us), int(cum_us)))
+    return rows
+
+
+def probe(path="/", importtime=False):
+    """
+    Roda o boot num interpretador novo (sem imports já em cache neste processo).
+    Retorna {seconds, modules, imports}; `imports` só com importtime=True.
+    """
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "lojinha.settings")}
+    cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", _PROBE, path]
+    proc = subprocess.run(cmd, capture_output=True, text=True, cwd=settings.BASE_DIR, env=env, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError(f"falha no boot:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = _parse_importtime(proc.stderr) if importtime else []
+    return result
+
+
+def eager_heavy_modules(modules):
+    """Quais das LAZY_MODULES foram importadas durante o boot."""
+    loaded = set(modules)
+    return [name for name in LAZY_MODULES if name in loaded]
+
+
+def budget_ms():
+    return float(getattr(settings, "STARTUP_BUDGET_MS", 1500))
@@ -1,9 +1,12 @@
 document.addEventListener('DOMContentLoaded', function() {
     const categoryFilter = document.getElementById('category-filter');
     const sortByFilter = document.getElementById('sort-by');
+    const grid = document.getElementById('product-grid');
+    const facetTotal = document.getElementById('facet-total');
 
-    function updateQueryStringAndReload() {
+    function buildParams() {
         const urlParams = new URLSearchParams(window.location.search);
+        urlParams.delete('page');
 
         const selectedCategory = categoryFilter.value;
         if (selectedCategory === 'todas') {
@@ -21,14 +24,120 @@ document.addEventListener('DOMContentLoaded', function() {
             if (sortBy === 'preco-desc') sortValue = '-price';
             urlParams.set('sort', sortValue);
         }
-        
-        window.location.href = window.location.pathname + '?' + urlParams.toString();
+        return urlParams;
+    }
+
+    function escapeHtml(value) {
+        const div = document.createElement('div');
+        div.textContent = value == null ? '' : String(value);
+        return div.innerHTML;
+    }
+
+    function renderCard(p) {
+        const cat = p.category || { slug: '', name: '' };
+        const price = (p.price_cents / 100).toFixed(2);
+        const img = p.image || { src: p.image_url || '', srcset: '' };
+        return (
+            '<a href="' + escapeHtml(p.url) + '" class="card-link">' +
+              '<div class="card" data-name="' + escapeHtml(p.title.toLowerCase()) + '"' +
+                  ' data-category="' + escapeHtml(cat.slug) + '" data-price="' + price + '">' +
+                '<div class="card-image-container">' +
+                  '<img src="' + escapeHtml(img.src) + '" srcset="' + escapeHtml(img.srcset) + '"' +
+                      ' sizes="(max-width: 600px) 100vw, 300px" loading="lazy" alt="' + escapeHtml(p.title) + '">' +
+                '</div>' +
+                '<div class="card-content">' +
+                  '<div class="card-header"><h3>' + escapeHtml(p.title) + '</h3></div>' +
+                  '<p class="muted">' + escapeHtml(cat.name) + '</p>' +
+                  '<div class="price">R$ ' + price + '</div>' +
+                '</div>' +
+              '</div>' +
+            '</a>'
+        );
+    }
+
+    // Cache local de respostas: o servidor responde 304 (sem corpo) quando o
+    // ETag ainda é válido, então reaproveitamos o JSON já recebido.
+    const responses = new Map();
+
+    async function fetchCatalog(query) {
+        const url = grid.dataset.api + '?' + query;
+        const cached = responses.get(query);
+        const headers = { 'Accept': 'application/json' };
+        if (cached) headers['If-None-Match'] = cached.etag;
+
+        const r = await fetch(url, { headers: headers, cache: 'no-cache' });
+        if (r.status === 304 && cached) return cached.data;
+        if (!r.ok) throw new Error('HTTP ' + r.status);
+
+        const data = await r.json();
+        const etag = r.headers.get('ETag');
+        if (etag) responses.set(query, { etag: etag, data: data });
+        return data;
+    }
+
+    async function updateGrid() {
+        const urlParams = buildParams();
+        const query = urlParams.toString();
+        if (!grid || !grid.dataset.api || !window.fetch) {
+            window.location.href = window.location.pathname + '?' + query;
+            return;
+        }
+        try {
+            const data = await fetchCatalog(query + (query ? '&' : '') + 'fields=title,price_cents,image,category,url');
+            grid.innerHTML = data.results.length
+                ? data.results.map(renderCard).join('')
+                : '<p>Nenhum produto encontrado.</p>';
+            if (facetTotal && data.facets) {
+                const n = data.facets.total;
+                facetTotal.textContent = n + ' produto' + (n === 1 ? '' : 's');
+            }
+            window.history.replaceState(null, '', window.location.pathname + (query ? '?' + query : ''));
+        } catch (err) {
+            window.location.href = window.location.pathname + '?' + query;
+        }
+    }
+
+    // Sugestões da busca: consulta /api/suggest com debounce e preenche o datalist;
+    // escolher uma sugestão leva direto ao produto (ou à categoria)
+    const searchInput = document.querySelector('input[data-suggest]');
+    const suggestionList = document.getElementById('search-suggestions');
+    let suggestTimer = null;
+    let suggestions = [];
+
+    async function loadSuggestions() {
+        const q = searchInput.value.trim();
+        if (q.length < 2 || !window.fetch) {
+            suggestionList.innerHTML = '';
+            return;
+        }
+        try {
+            const res = await fetch(searchInput.dataset.suggest + '?q=' + encodeURIComponent(q));
+            if (!res.ok) return;
+            suggestions = (await res.json()).results;
+            suggestionList.innerHTML = suggestions
+                .map(function(s) { return '<option value="' + escapeHtml(s.label) + '"></option>'; })
+                .join('');
+        } catch (err) {
+            suggestionList.innerHTML = '';
+        }
+    }
+
+    if (searchInput && suggestionList) {
+        searchInput.addEventListener('input', function(event) {
+            const picked = suggestions.find(function(s) { return s.label === searchInput.value; });
+            if (picked && !(event instanceof InputEvent && event.inputType)) {
+                window.location.href = picked.url;
+                return;
+            }
+            clearTimeout(suggestTimer);
+            suggestTimer = setTimeout(loadSuggestions, 150);
+        });
     }
 
     if (categoryFilter) {
-        categoryFilter.addEventListener('change', updateQueryStringAndReload);
+        categoryFilter.addEventListener('change', updateGrid);
     }
     if (sortByFilter) {
-        sortByFilter.addEventListener('change', updateQueryStringAndReload);
+        sortByFilter.addEventListener('change', updateGrid);
     }
-});
\ No newline at end of file
+});
@@ -0,0 +1,101 @@
+import gzip
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.http import FileResponse, Http404
+from django.utils._os import safe_join
+from django.views.decorators.http import require_http_methods
+
+from .utils import optional_import
+
+# brotli é opcional (sem ele geramos só .gz) e só é usado no collectstatic
+brotli = optional_import("brotli")
+
+# nome.<12 hex>.ext, gerado pelo ManifestStaticFilesStorage
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+REVALIDATE_CACHE = "public, max-age=0, must-revalidate"
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    Manifest storage (nomes com hash do conteúdo) que, no `collectstatic`,
+    grava também as variantes pré-comprimidas `.gz` e `.br` de cada arquivo
+    com hash, prontas para `serve_static` ou `gzip_static`/`brotli_static` do nginx.
+    """
+    compress_extensions = (".css", ".js", ".svg", ".json", ".txt", ".html", ".map")
+    compress_min_size = 256
+
+    def post_process(self, paths, dry_run=False, **options):
+        hashed = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                hashed.add(hashed_name)
+            yield name, hashed_name, processed
+
+        if dry_run:
+            return
+        for hashed_name in sorted(hashed):
+            if hashed_name.endswith(self.compress_extensions):
+                self._compress(hashed_name)
+
+    def _compress(self, name):
+        path = self.path(name)
+        with open(path, "rb") as fh:
+            data = fh.read()
+        if len(data) < self.compress_min_size:
+            return
+
+        variants = [(".gz", gzip.compress(data, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append((".br", brotli.compress(data, quality=11)))
+        for suffix, payload in variants:
+            if len(payload) >= len(data):
+                continue
+            tmp = f"{path}{suffix}.tmp"
+            with open(tmp, "wb") as fh:
+                fh.write(payload)
+            os.replace(tmp, path + suffix)
+
+
+def _accepted_encodings(request):
+    header = request.headers.get("Accept-Encoding", "")
+    return {part.split(";")[0].strip().lower() for part in header.split(",") if part.strip()}
+
+
+@require_http_methods(["GET", "HEAD"])
+def serve_static(request, path):
+    """
+    Serve arquivos do STATIC_ROOT quando não há nginx/CDN na frente:
+    escolhe a variante .br/.gz conforme Accept-Encoding e marca nomes com
+    hash como `immutable` (o conteúdo nunca muda para aquele nome).
+    """
+    root = getattr(settings, "STATIC_ROOT", None)
+    if not root:
+        raise Http404("STATIC_ROOT não configurado")
+    try:
+        fullpath = safe_join(root, path)
+    except Exception:
+        raise Http404("caminho inválido")
+    if not os.path.isfile(fullpath):
+        raise Http404("arquivo não encontrado")
+
+    content_type = mimetypes.guess_type(fullpath)[0] or "application/octet-stream"
+    accepted = _accepted_encodings(request)
+    encoding = None
+    for enc, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if enc in accepted and os.path.isfile(fullpath + suffix):
+            fullpath += suffix
+            encoding = enc
+            break
+
+    response = FileResponse(open(fullpath, "rb"), content_type=content_type)
+    if encoding:
+        response["Content-Encoding"] = encoding
+    response["Vary"] = "Accept-Encoding"
+    response["Cache-Control"] = IMMUTABLE_CACHE if HASHED_NAME_RE.search(path) else REVALIDATE_CACHE
+    return response
@@ -0,0 +1,23 @@
+from django import template
+from django.urls import reverse
+
+from shop import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumb_url(product, width=480):
+    """URL da miniatura local do produto (ou a original, se o proxy estiver indisponível)."""
+    url = getattr(product, "image_url", "")
+    if not url or not images.available():
+        return url
+    return reverse("shop:product_image", args=[product.pk, int(width), images.url_key(url)])
+
+
+@register.simple_tag
+def product_srcset(product):
+    """`srcset` com todas as larguras configuradas em PRODUCT_IMAGE_WIDTHS."""
+    if not getattr(product, "image_url", "") or not images.available():
+        return ""
+    return ", ".join(f"{thumb_url(product, w)} {w}w" for w in images.widths())
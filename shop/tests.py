@@ -166,3 +166,1567 @@ class CartFlowTest(TestCase):
         o = Order.objects.get(id=data["order_id"])
         self.assertEqual(o.total_cents, 2*1000 + 1*2500)
         self.assertEqual(o.items.count(), 2)
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from shop.catalog import parse_filters
+from shop.facets import catalog_facets, compute_facets
+from shop.models import Category, Product
+
+class CatalogFacetsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c1 = Category.objects.create(name="Eletrônicos", slug="eletronicos")
+        self.c2 = Category.objects.create(name="Livros", slug="livros")
+        Product.objects.create(title="Fone", slug="fone", price_cents=3000, category=self.c1, featured=True)
+        Product.objects.create(title="TV", slug="tv", price_cents=200000, category=self.c1)
+        Product.objects.create(title="Romance", slug="romance", price_cents=4500, category=self.c2)
+        Product.objects.create(title="Inativo", slug="inativo", price_cents=100, category=self.c2, active=False)
+
+    def test_counts_in_single_query(self):
+        with self.assertNumQueries(1):
+            facets = compute_facets(parse_filters({}))
+        self.assertEqual(facets["total"], 3)
+        self.assertEqual(facets["featured"], 1)
+        counts = {c["slug"]: c["count"] for c in facets["categories"]}
+        self.assertEqual(counts, {"eletronicos": 2, "livros": 1})
+        self.assertEqual(facets["price_buckets"][0]["count"], 2)   # até R$ 50
+        self.assertEqual(facets["price_buckets"][-1]["count"], 1)  # acima de R$ 500
+
+    def test_category_filter_keeps_sibling_counts(self):
+        facets = compute_facets(parse_filters({"cat": "livros"}))
+        counts = {c["slug"]: c["count"] for c in facets["categories"]}
+        self.assertEqual(counts["eletronicos"], 2)
+        self.assertEqual(facets["total"], 1)
+        self.assertEqual(facets["featured"], 0)
+
+    def test_cached_per_normalized_filters(self):
+        catalog_facets(parse_filters({"q": "Fone", "sort": "price"}))
+        with self.assertNumQueries(0):
+            facets = catalog_facets(parse_filters({"q": "fone", "sort": "-price"}))
+        self.assertEqual(facets["total"], 1)
+
+    def test_catalog_exposes_facets(self):
+        resp = self.client.get(reverse("shop:catalog"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.context["facets"]["total"], 3)
+        self.assertContains(resp, "Livros (1)")
+
+class CatalogApiTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cat = Category.objects.create(name="Livros", slug="livros")
+        Product.objects.create(title="Barato", slug="barato", price_cents=1000, category=self.cat)
+        Product.objects.create(title="Caro", slug="caro", price_cents=9000)
+
+    def test_same_filters_and_sort_as_html(self):
+        resp = self.client.get(reverse("shop:api_catalog"), {"sort": "-price"})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertEqual([p["slug"] for p in data["results"]], ["caro", "barato"])
+        self.assertEqual(data["count"], 2)
+
+        resp = self.client.get(reverse("shop:api_catalog"), {"cat": "livros"})
+        self.assertEqual([p["slug"] for p in resp.json()["results"]], ["barato"])
+
+    def test_sparse_fieldset(self):
+        resp = self.client.get(reverse("shop:api_catalog"), {"fields": "title,nope", "facets": "0"})
+        data = resp.json()
+        self.assertEqual(set(data["results"][0]), {"title"})
+        self.assertNotIn("facets", data)
+
+    def test_conditional_get_returns_304(self):
+        url = reverse("shop:api_catalog")
+        resp = self.client.get(url)
+        self.assertTrue(resp.has_header("ETag"))
+        self.assertTrue(resp.has_header("Last-Modified"))
+
+        resp2 = self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp2.status_code, 304)
+
+        # outro filtro => outro ETag
+        resp3 = self.client.get(url, {"sort": "price"}, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp3.status_code, 200)
+
+        # catálogo mudou => ETag antigo deixa de valer
+        Product.objects.create(title="Novo", slug="novo", price_cents=500)
+        resp4 = self.client.get(url, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(resp4.status_code, 200)
+
+from datetime import timedelta
+from unittest.mock import patch
+from django.test import TestCase
+from django.urls import reverse
+from shop.models import CatalogVersion, Category, Order, OrderItem, Product
+
+class CatalogVersionTest(TestCase):
+    def setUp(self):
+        self.p = Product.objects.create(title="X", slug="x", price_cents=1000, stock=5)
+
+    def version(self):
+        return CatalogVersion.current()[0]
+
+    def test_save_bumps_version_and_touches_updated_at(self):
+        v0 = self.version()
+        Product.objects.filter(pk=self.p.pk).update(views=10)  # contador não conta como escrita
+        self.assertEqual(self.version(), v0)
+
+        old = self.p.updated_at - timedelta(days=1)
+        Product.objects.filter(pk=self.p.pk).update(updated_at=old)
+        v1 = self.version()
+        self.assertGreater(v1, v0)
+
+        self.p.refresh_from_db()
+        self.p.stock = 4
+        self.p.save(update_fields=["stock"])
+        self.p.refresh_from_db()
+        self.assertGreater(self.p.updated_at, old)
+        self.assertGreater(self.version(), v1)
+
+    def test_bulk_update_and_delete_bump_version(self):
+        v0 = self.version()
+        Product.objects.all().update(active=False)
+        v1 = self.version()
+        self.assertGreater(v1, v0)
+
+        Category.objects.bulk_create([Category(name="A", slug="a")])
+        v2 = self.version()
+        self.assertGreater(v2, v1)
+
+        Category.objects.all().delete()
+        self.assertGreater(self.version(), v2)
+
+    def test_current_is_single_query(self):
+        with self.assertNumQueries(1):
+            version, updated_at = CatalogVersion.current()
+        self.assertIsNotNone(updated_at)
+
+    @patch("shop.services.payments.MercadoPago.get_payment_info")
+    def test_webhook_stock_change_bumps_version(self, mock_info):
+        order = Order.objects.create(total_cents=2000)
+        OrderItem.objects.create(order=order, product=self.p, qty=2, unit_price_cents=1000)
+        mock_info.return_value = {"status": "approved", "external_reference": str(order.id), "id": "1"}
+        v0 = self.version()
+        self.client.post(reverse("shop:mp_webhook"), data='{"data":{"id":"1"}}', content_type="application/json")
+        self.p.refresh_from_db()
+        self.assertEqual(self.p.stock, 3)
+        self.assertGreater(self.version(), v0)
+
+import shutil
+import tempfile
+from pathlib import Path
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from shop.staticfiles import IMMUTABLE_CACHE
+
+class StaticPipelineTest(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+
+    def test_collectstatic_hashes_and_precompresses(self):
+        storages = {
+            "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+            "staticfiles": {"BACKEND": "shop.staticfiles.CompressedManifestStaticFilesStorage"},
+        }
+        with override_settings(STATIC_ROOT=self.root, STORAGES=storages):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            from django.templatetags.static import static
+            url = static("js/catalog.js")
+
+            self.assertRegex(url, r"^/static/js/catalog\.[0-9a-f]{12}\.js$")
+            hashed = Path(self.root) / url[len("/static/"):]
+            self.assertTrue(hashed.exists())
+            self.assertTrue(Path(f"{hashed}.gz").exists())
+
+            resp = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, deflate")
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp["Content-Encoding"], "gzip")
+            self.assertEqual(resp["Cache-Control"], IMMUTABLE_CACHE)
+            self.assertIn("Accept-Encoding", resp["Vary"])
+            resp.close()
+
+            resp = self.client.get("/static/js/catalog.js")
+            self.assertNotIn("immutable", resp["Cache-Control"])
+            self.assertFalse(resp.has_header("Content-Encoding"))
+            resp.close()
+
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from shop import images
+from shop.models import Product
+
+def _png_bytes(width=1200, height=800):
+    from PIL import Image
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(buf, "PNG")
+    return buf.getvalue()
+
+class _StubImageServer:
+    """Servidor HTTP local que serve uma imagem e conta as requisições."""
+    def __init__(self, payload, status=200):
+        self.hits = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.hits += 1
+                self.send_response(status)
+                self.send_header("Content-Type", "image/png")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}/foto.png"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+@unittest.skipUnless(images.available(), "Pillow não instalado")
+class ProductImageProxyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.server = _StubImageServer(_png_bytes())
+        self.addCleanup(self.server.close)
+        self.p = Product.objects.create(title="Foto", slug="foto", price_cents=1000, image_url=self.server.url)
+
+    def test_resizes_once_and_serves_with_long_cache(self):
+        with override_settings(PRODUCT_IMAGE_CACHE_DIR=Path(self.tmp)):
+            key = images.url_key(self.p.image_url)
+            url = reverse("shop:product_image", args=[self.p.pk, 240, key])
+            resp = self.client.get(url)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(resp["Content-Type"], "image/webp")
+            self.assertIn("immutable", resp["Cache-Control"])
+            from PIL import Image
+            self.assertEqual(Image.open(io.BytesIO(b"".join(resp.streaming_content))).width, 240)
+
+            # outras larguras reaproveitam o original já baixado
+            self.client.get(reverse("shop:product_image", args=[self.p.pk, 480, key])).close()
+            self.client.get(url).close()
+            self.assertEqual(self.server.hits, 1)
+
+    def test_unknown_width_and_stale_key(self):
+        with override_settings(PRODUCT_IMAGE_CACHE_DIR=Path(self.tmp)):
+            resp = self.client.get(reverse("shop:product_image", args=[self.p.pk, 123, "x"]))
+            self.assertEqual(resp.status_code, 404)
+            resp = self.client.get(reverse("shop:product_image", args=[self.p.pk, 240, "antiga"]))
+            self.assertEqual(resp.status_code, 302)
+
+    def test_size_cap_evicts_least_recently_used(self):
+        with override_settings(PRODUCT_IMAGE_CACHE_DIR=Path(self.tmp), PRODUCT_IMAGE_CACHE_MAX_BYTES=1):
+            old = Path(self.tmp) / "velho-240.webp"
+            old.write_bytes(b"x" * 100)
+            os.utime(old, (1, 1))
+            images.enforce_size_cap()
+            self.assertFalse(old.exists())
+
+    def test_concurrent_writes_of_the_same_file(self):
+        target = Path(self.tmp) / "mesma-240.webp"
+        errors = []
+
+        def write(n):
+            try:
+                for _ in range(20):
+                    images._write_atomic(target, bytes([n]) * 1000)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(len(set(target.read_bytes())), 1)  # um escritor inteiro, nunca mistura
+        self.assertEqual(os.listdir(self.tmp), [target.name])
+
+    def test_failed_source_is_not_fetched_on_every_request(self):
+        broken = _StubImageServer(b"", status=404)
+        self.addCleanup(broken.close)
+        self.p.image_url = broken.url
+        self.p.save()
+        url = reverse("shop:product_image", args=[self.p.pk, 240, images.url_key(broken.url)])
+        with override_settings(PRODUCT_IMAGE_CACHE_DIR=Path(self.tmp)):
+            for _ in range(3):
+                resp = self.client.get(url)
+                self.assertEqual(resp.status_code, 302)
+                self.assertEqual(resp["Location"], broken.url)
+            self.assertEqual(broken.hits, 1)
+
+    def test_srcset_in_catalog(self):
+        resp = self.client.get(reverse("shop:catalog"))
+        self.assertContains(resp, "240w")
+
+from unittest.mock import MagicMock, patch
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from shop import metrics
+from shop.services.payments import MercadoPago
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+
+    def test_middleware_records_latency_queries_and_templates(self):
+        self.client.get(reverse("shop:catalog"))
+        self.assertEqual(metrics.request_seconds().count(view="shop:catalog", method="GET"), 1)
+        self.assertEqual(metrics.db_queries().count(view="shop:catalog"), 1)
+        self.assertEqual(metrics.template_seconds().count(template="shop/catalog.html"), 1)
+
+        body = self.client.get(reverse("metrics")).content.decode()
+        self.assertIn("# TYPE lojinha_http_request_duration_seconds histogram", body)
+        self.assertIn('lojinha_db_queries_per_request_count{view="shop:catalog"} 1', body)
+        self.assertIn('lojinha_http_requests_total{method="GET",status="200",view="shop:catalog"} 1', body)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_sampling_skips_histograms(self):
+        self.client.get(reverse("shop:catalog"))
+        self.assertEqual(metrics.request_seconds().count(view="shop:catalog", method="GET"), 0)
+        self.assertEqual(metrics.requests_total().value(view="shop:catalog", method="GET", status=200), 1)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_token(self):
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 403)
+        resp = self.client.get(reverse("metrics"), HTTP_AUTHORIZATION="Bearer s3cret")
+        self.assertEqual(resp.status_code, 200)
+
+    @override_settings(PAYMENTS_MOCK=False, MERCADO_PAGO_ACCESS_TOKEN="TEST-1")
+    @patch("shop.services.payments.requests.Session.get")
+    def test_mercadopago_latency(self, mock_get):
+        mock_get.return_value = MagicMock(status_code=200, json=lambda: {"status": "approved", "id": 1})
+        MercadoPago.get_payment_info("1")
+        self.assertEqual(
+            metrics.upstream_seconds().count(service="mercadopago", endpoint="get_payment", outcome="ok"), 1
+        )
+
+import io
+import json
+import shutil
+import tempfile
+from pathlib import Path
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from shop.bench import compare, percentile, seed_catalog
+from shop.models import Category, Order, Product
+
+class BenchSuiteTest(TestCase):
+    def test_percentile_and_compare(self):
+        self.assertEqual(percentile([1, 2, 3, 4, 5], 50), 3)
+        self.assertAlmostEqual(percentile(list(range(101)), 95), 95)
+        base = {"catalog": {"p95_ms": 10.0, "queries": 4}}
+        self.assertEqual(compare({"catalog": {"p95_ms": 11.0, "queries": 4}}, base), [])
+        self.assertEqual(len(compare({"catalog": {"p95_ms": 30.0, "queries": 5}}, base)), 2)
+
+    def test_seed_is_deterministic_and_sized(self):
+        seed_catalog(products=30, categories=3, orders=5, seed=1)
+        self.assertEqual(Product.objects.count(), 30)
+        self.assertEqual(Category.objects.count(), 3)
+        self.assertEqual(Order.objects.count(), 5)
+
+    def test_command_reports_and_detects_regressions(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        baseline = Path(tmp) / "baseline.json"
+        opts = dict(products=40, categories=3, orders=5, iterations=2, no_isolate=True,
+                    baseline=str(baseline), stdout=io.StringIO())
+        call_command("bench", save_baseline=True, **opts)
+        data = json.loads(baseline.read_text())["scenarios"]
+        for scenario in ("catalog[all,-created]", "product_detail", "cart_add", "checkout_from_cart", "mp_webhook"):
+            self.assertIn(scenario, data)
+            self.assertIn("p99_ms", data[scenario])
+
+        data["product_detail"]["queries"] = 0
+        baseline.write_text(json.dumps({"scenarios": data}))
+        with self.assertRaises(CommandError):
+            call_command("bench", **opts)
+
+import asyncio
+import time
+from asgiref.sync import async_to_sync
+from django.test import TestCase, override_settings
+from shop.bench import StubMercadoPago
+from shop.services import payments
+from shop.services.payments import AsyncMercadoPago, async_clients
+
+class AsyncMercadoPagoTest(TestCase):
+    def setUp(self):
+        self.stub = StubMercadoPago(latency_ms=100, payments={"77": {"status": "rejected", "external_reference": "5"}})
+        self.addCleanup(self.stub.close)
+
+    def _settings(self):
+        return override_settings(
+            PAYMENTS_MOCK=False, MERCADO_PAGO_ACCESS_TOKEN="TEST-1", MERCADO_PAGO_API_BASE=self.stub.url
+        )
+
+    def test_concurrent_preferences_share_the_wait(self):
+        async def run():
+            async with async_clients():
+                return await asyncio.gather(*(
+                    AsyncMercadoPago.create_preference("T", 1, 10.0, str(i)) for i in range(20)
+                ))
+
+        with self._settings():
+            start = time.perf_counter()
+            prefs = asyncio.run(run())
+            elapsed = time.perf_counter() - start
+        self.assertEqual(len({p["id"] for p in prefs}), 20)
+        self.assertLess(elapsed, 1.5)  # 20 x 100ms em série levaria 2s
+
+    def test_payment_info(self):
+        async def run():
+            async with async_clients():
+                return await AsyncMercadoPago.get_payment_info("77")
+
+        with self._settings():
+            info = asyncio.run(run())
+        self.assertEqual(info["status"], "rejected")
+        self.assertEqual(info["external_reference"], "5")
+
+    def test_short_lived_loops_use_the_shared_sync_session(self):
+        # sob WSGI cada view async roda num loop novo do async_to_sync: nada de AsyncClient órfão
+        with self._settings():
+            for _ in range(2):
+                self.assertEqual(async_to_sync(AsyncMercadoPago.get_payment_info)("77")["status"], "rejected")
+        self.assertEqual(len(payments._async_clients), 0)
+        self.assertIs(payments._session(), payments._session())
+
+    def test_asgi_lifespan_closes_the_pool(self):
+        from lojinha.asgi import application
+
+        async def run():
+            messages = iter([{"type": "lifespan.startup"}, {"type": "lifespan.shutdown"}])
+            sent, pooled = [], []
+
+            async def receive():
+                return next(messages)
+
+            async def send(message):
+                sent.append(message["type"])
+                if message["type"] == "lifespan.startup.complete":
+                    await AsyncMercadoPago.get_payment_info("77")
+                    pooled.append(len(payments._async_clients))
+
+            await application({"type": "lifespan"}, receive, send)
+            return sent, pooled, len(payments._async_clients)
+
+        with self._settings():
+            sent, pooled, left = asyncio.run(run())
+        self.assertEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertEqual((pooled, left), ([1], 0))
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client, TestCase, override_settings
+from django.urls import reverse
+from shop.bench import StubMercadoPago
+from shop.models import IdempotencyKey, Order, Product
+
+class IdempotentCheckoutTest(TestCase):
+    def setUp(self):
+        self.p = Product.objects.create(title="P", slug="p", price_cents=1000, stock=10)
+        self.body = json.dumps({"product_id": self.p.id, "qty": 1, "email": "a@b.com"})
+
+    def post(self, key, body=None):
+        return self.client.post(reverse("shop:create_checkout"), body or self.body,
+                                content_type="application/json", HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_duplicate_replays_first_response(self):
+        r1 = self.post("k1")
+        r2 = self.post("k1")
+        self.assertEqual(r1.status_code, 200)
+        self.assertEqual(r1.json()["order_id"], r2.json()["order_id"])
+        self.assertEqual(r2["Idempotent-Replayed"], "true")
+        self.assertEqual(Order.objects.count(), 1)
+
+        self.post("k2")
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_is_scoped_per_client(self):
+        other = Client()
+        self.client.session.save()  # cada cliente com a sua sessão
+        other.session.save()
+        r1 = self.post("k1")
+        r2 = other.post(reverse("shop:create_checkout"), self.body,
+                        content_type="application/json", HTTP_IDEMPOTENCY_KEY="k1")
+        self.assertEqual(r2.status_code, 200)
+        self.assertNotIn("Idempotent-Replayed", r2)
+        self.assertNotEqual(r1.json()["public_url"], r2.json()["public_url"])
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_key_reused_with_other_payload(self):
+        self.post("k1")
+        r = self.post("k1", json.dumps({"product_id": self.p.id, "qty": 2}))
+        self.assertEqual(r.status_code, 422)
+
+    def test_upstream_failure_releases_key(self):
+        with patch("shop.views.AsyncMercadoPago.create_preference", side_effect=RuntimeError("fora do ar")):
+            self.assertEqual(self.post("k1").status_code, 502)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(self.post("k1").status_code, 200)
+
+    def test_cart_retry_after_success_replays(self):
+        self.client.post(reverse("shop:api_cart_add"), json.dumps({"product_id": self.p.id, "qty": 2}),
+                         content_type="application/json")
+        url = reverse("shop:checkout_from_cart")
+        r1 = self.client.post(url, '{"email":"a@b.com"}', content_type="application/json", HTTP_IDEMPOTENCY_KEY="c1")
+        r2 = self.client.post(url, '{"email":"a@b.com"}', content_type="application/json", HTTP_IDEMPOTENCY_KEY="c1")
+        self.assertEqual(r1.json()["order_id"], r2.json()["order_id"])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_concurrent_duplicates_create_one_preference(self):
+        with StubMercadoPago(latency_ms=200) as stub, override_settings(
+            PAYMENTS_MOCK=False, MERCADO_PAGO_ACCESS_TOKEN="TEST-1", MERCADO_PAGO_API_BASE=stub.url
+        ):
+            client = AsyncClient()
+
+            async def burst():
+                return await asyncio.gather(*(
+                    client.post(reverse("shop:create_checkout"), self.body, content_type="application/json",
+                                headers={"Idempotency-Key": "same"})
+                    for _ in range(5)
+                ))
+
+            responses = async_to_sync(burst)()
+        self.assertEqual({r.status_code for r in responses}, {200})
+        self.assertEqual(len({r.json()["order_id"] for r in responses}), 1)
+        self.assertEqual(stub.hits, 1)
+        self.assertEqual(Order.objects.count(), 1)
+
+from datetime import timedelta
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from shop.models import Order
+
+class ExpirePendingOrdersTest(TestCase):
+    def test_cancels_stale_pending_in_batches_and_purges_otp(self):
+        old = timezone.now() - timedelta(days=3)
+        stale = [Order.objects.create() for _ in range(5)]
+        Order.objects.filter(id__in=[o.id for o in stale]).update(created_at=old)
+        fresh = Order.objects.create()
+        paid = Order.objects.create(status="paid")
+        Order.objects.filter(pk=paid.pk).update(created_at=old)
+        otp = Order.objects.create(status="paid", otp_code="123456", otp_expires_at=timezone.now() - timedelta(minutes=1))
+
+        out = io.StringIO()
+        call_command("expire_pending_orders", batch_size=2, stdout=out)
+
+        self.assertEqual(Order.objects.filter(id__in=[o.id for o in stale], status="canceled").count(), 5)
+        fresh.refresh_from_db()
+        paid.refresh_from_db()
+        otp.refresh_from_db()
+        self.assertEqual(fresh.status, "pending")
+        self.assertEqual(paid.status, "paid")
+        self.assertEqual(otp.otp_code, "")
+        self.assertIn("pedidos cancelados: 5", out.getvalue())
+
+    def test_dry_run_changes_nothing(self):
+        o = Order.objects.create()
+        Order.objects.filter(pk=o.pk).update(created_at=timezone.now() - timedelta(days=3))
+        call_command("expire_pending_orders", dry_run=True, stdout=io.StringIO())
+        o.refresh_from_db()
+        self.assertEqual(o.status, "pending")
+
+from datetime import timedelta
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+from shop import cart
+
+class CartSessionWritesTest(TestCase):
+    def test_unchanged_cart_does_not_modify_session(self):
+        session = SessionStore()
+        cart.add(session, 7, 2)
+        self.assertTrue(session.modified)
+        session.save()
+
+        session = SessionStore(session_key=session.session_key)
+        cart.set_qty(session, 7, 2)
+        cart.set_qty(session, 99, 0)  # remover item inexistente
+        self.assertFalse(session.modified)
+        cart.set_qty(session, 7, 3)
+        self.assertTrue(session.modified)
+        self.assertEqual(cart.snapshot(session), {"7": 3})
+
+    def test_empty_clear_is_noop(self):
+        session = SessionStore()
+        cart.clear(session)
+        self.assertFalse(session.modified)
+
+class PurgeSessionsTest(TestCase):
+    def test_deletes_only_expired_in_batches(self):
+        past = timezone.now() - timedelta(days=1)
+        for i in range(5):
+            Session.objects.create(session_key=f"old{i}", session_data="x", expire_date=past)
+        Session.objects.create(session_key="live", session_data="x", expire_date=timezone.now() + timedelta(days=1))
+        out = io.StringIO()
+        call_command("purge_sessions", batch_size=2, stdout=out)
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["live"])
+        self.assertIn("5 (3 lotes)", out.getvalue())
+
+from django.core.cache import cache
+from django.test import TestCase
+from shop import caching
+from shop.models import Product
+
+class CachingToolkitTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        caching.reset_stats()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return Product.objects.filter(active=True)
+
+    def test_memoize_caches_queryset_results_and_counts_stats(self):
+        Product.objects.create(title="A", slug="a", price_cents=100)
+        cached = caching.memoize("ativos", tags=("catalog",))(self.compute)
+        first = cached()
+        self.assertIsInstance(first, list)
+        with self.assertNumQueries(0):
+            self.assertEqual([p.slug for p in cached()], ["a"])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(caching.stats()["ativos"]["hit"], 1)
+        self.assertEqual(caching.stats()["ativos"]["miss"], 1)
+
+    def test_tag_invalidation_on_catalog_write(self):
+        cached = caching.memoize("ativos", tags=("catalog",))(self.compute)
+        self.assertEqual(cached(), [])
+        Product.objects.create(title="B", slug="b", price_cents=100)  # bump => invalida "catalog"
+        self.assertEqual([p.slug for p in cached()], ["b"])
+        self.assertEqual(self.calls, 2)
+
+    def test_stale_value_served_while_other_worker_recomputes(self):
+        caching.get_or_compute("ns", "k", lambda: "velho", timeout=60)
+        entry_key = caching._entry_key("ns", "k", ())
+        value, delta, _ = cache.get(entry_key)
+        cache.set(entry_key, (value, delta, 0), 60)  # já "expirou" logicamente => recálculo antecipado
+        cache.add(f"lock:{entry_key}", 1, 30)          # outro worker segura o lock
+        self.assertEqual(caching.get_or_compute("ns", "k", lambda: "novo", timeout=60), "velho")
+        self.assertEqual(caching.stats()["ns"]["stale"], 1)
+
+        cache.delete(f"lock:{entry_key}")
+        self.assertEqual(caching.get_or_compute("ns", "k", lambda: "novo", timeout=60), "novo")
+
+
+# ---- Produtos relacionados pré-calculados ----
+import io
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from shop import related
+from shop.models import Category, Order, OrderItem, Product, RelatedProduct
+
+class RelatedProductsTest(TestCase):
+    def setUp(self):
+        self.cat = Category.objects.create(name="Canecas", slug="canecas")
+        other = Category.objects.create(name="Livros", slug="livros")
+        self.base = Product.objects.create(title="Caneca A", slug="caneca-a", price_cents=3000, category=self.cat)
+        self.close = Product.objects.create(title="Caneca B", slug="caneca-b", price_cents=3100, category=self.cat)
+        self.far = Product.objects.create(title="Caneca C", slug="caneca-c", price_cents=30000, category=self.cat)
+        self.book = Product.objects.create(title="Livro", slug="livro", price_cents=9000, category=other)
+
+    def _related_ids(self, product):
+        return list(RelatedProduct.objects.filter(product=product).order_by("rank").values_list("related_id", flat=True))
+
+    def test_rebuild_ranks_by_category_price_and_copurchase(self):
+        related.rebuild(full=True)
+        self.assertEqual(self._related_ids(self.base), [self.close.pk, self.far.pk])
+
+        # compras conjuntas puxam um produto de outra categoria para o topo
+        for _ in range(3):
+            order = Order.objects.create(status="paid")
+            OrderItem.objects.create(order=order, product=self.base, qty=1, unit_price_cents=3000)
+            OrderItem.objects.create(order=order, product=self.book, qty=1, unit_price_cents=9000)
+        related.rebuild(full=True)
+        self.assertEqual(self._related_ids(self.base)[0], self.book.pk)
+
+    def test_incremental_rebuild_only_touches_affected_products(self):
+        Product.objects.create(title="Livro 2", slug="livro-2", price_cents=9500, category=self.book.category)
+        related.rebuild(full=True)
+        book_rows = list(RelatedProduct.objects.filter(product=self.book).values_list("pk", flat=True))
+
+        Product.objects.filter(pk=self.far.pk).update(price_cents=3050)
+        products, _ = related.rebuild()
+        self.assertEqual(products, 3)  # a caneca alterada e as vizinhas da categoria
+        self.assertEqual(self._related_ids(self.base)[:2], [self.far.pk, self.close.pk])
+        self.assertEqual(list(RelatedProduct.objects.filter(product=self.book).values_list("pk", flat=True)), book_rows)
+
+    def test_detail_page_reads_related_with_one_query(self):
+        out = io.StringIO()
+        call_command("rebuild_related", "--full", stdout=out)
+        self.assertIn("produtos recalculados: 4", out.getvalue())
+        Product.objects.filter(pk=self.far.pk).update(active=False)
+        with self.assertNumQueries(1):
+            items = related.related_for(self.base)
+        self.assertEqual(items, [self.close])
+
+        resp = self.client.get(reverse("shop:product_detail", args=[self.base.slug]))
+        self.assertContains(resp, "Você também pode gostar")
+        self.assertContains(resp, self.close.get_absolute_url())
+
+
+# ---- Reservas de estoque ----
+import io
+from datetime import timedelta
+from unittest.mock import patch
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.utils import timezone
+from shop import inventory, metrics
+from shop.bench import stress_reservations
+from shop.models import Order, OrderItem, Product, StockReservation
+
+class StockReservationTest(TestCase):
+    def setUp(self):
+        self.p = Product.objects.create(title="Último", slug="ultimo", price_cents=1000, stock=2)
+
+    def checkout(self, qty=1):
+        body = json.dumps({"product_id": self.p.id, "qty": qty, "email": "a@b.com"})
+        return self.client.post(reverse("shop:create_checkout"), body, content_type="application/json")
+
+    def test_checkout_holds_units_until_stock_runs_out(self):
+        self.assertEqual(self.checkout().status_code, 200)
+        self.assertEqual(self.checkout().status_code, 200)
+        self.assertEqual(self.checkout().status_code, 400)
+        self.p.refresh_from_db()
+        self.assertEqual((self.p.stock, self.p.reserved), (2, 2))
+        self.assertEqual(Order.objects.count(), 2)  # o checkout recusado não deixa pedido para trás
+
+    def test_payment_converts_and_cancel_releases(self):
+        paid = Order.objects.get(pk=self.checkout().json()["order_id"])
+        other = Order.objects.get(pk=self.checkout().json()["order_id"])
+        for order, status in ((paid, "approved"), (other, "rejected")):
+            with patch("shop.services.payments.MercadoPago.get_payment_info",
+                       return_value={"status": status, "external_reference": str(order.pk)}):
+                self.client.post(reverse("shop:mp_webhook"), '{"data":{"id":"1"}}', content_type="application/json")
+        self.p.refresh_from_db()
+        self.assertEqual((self.p.stock, self.p.reserved), (1, 0))
+        self.assertEqual(
+            dict(StockReservation.objects.values_list("order_id", "state")),
+            {paid.pk: "converted", other.pk: "released"},
+        )
+
+    def test_upstream_failure_releases_hold(self):
+        with patch("shop.views.AsyncMercadoPago.create_preference", side_effect=RuntimeError("fora do ar")):
+            self.assertEqual(self.checkout(qty=2).status_code, 502)
+        self.p.refresh_from_db()
+        self.assertEqual(self.p.reserved, 0)
+        self.assertEqual(Order.objects.get().status, "canceled")
+
+    def test_expired_holds_are_released_by_cleanup(self):
+        order = Order.objects.create()
+        inventory.reserve(order, [(self.p.pk, 2)], ttl=timedelta(minutes=-1))
+        out = io.StringIO()
+        call_command("expire_pending_orders", stdout=out)
+        self.assertIn("reservas liberadas: 1", out.getvalue())
+        self.p.refresh_from_db()
+        self.assertEqual(self.p.reserved, 0)
+        # liberar de novo não desconta duas vezes
+        self.assertEqual(inventory.release_orders([order.pk]), 0)
+
+    def test_paid_after_expiry_never_takes_units_held_by_others(self):
+        late = Order.objects.create()
+        OrderItem.objects.create(order=late, product=self.p, qty=2, unit_price_cents=1000)
+        inventory.reserve(late, [(self.p.pk, 2)], ttl=timedelta(minutes=-1))
+        inventory.release_expired()
+        inventory.reserve(Order.objects.create(), [(self.p.pk, 1)])  # outro checkout pega 1 das 2
+        fresh = Order.objects.create()
+        OrderItem.objects.create(order=fresh, product=self.p, qty=1, unit_price_cents=1000)
+        before = metrics.registry.counter("stock_shortfall_units_total").value()
+
+        with self.assertLogs("shop.inventory", "WARNING"):
+            inventory.convert_orders([late.pk, fresh.pk])
+        self.p.refresh_from_db()
+        # 1 unidade livre para 3 pedidas: faltam 2, atribuídas a partir do pedido mais novo
+        self.assertEqual((self.p.stock, self.p.reserved), (1, 1))
+        self.assertEqual(
+            dict(Order.objects.filter(pk__in=[late.pk, fresh.pk]).values_list("pk", "stock_shortfall")),
+            {late.pk: 1, fresh.pk: 1},
+        )
+        self.assertEqual(metrics.registry.counter("stock_shortfall_units_total").value(), before + 2)
+
+
+class ReservationStressTest(TransactionTestCase):
+    def test_concurrent_buyers_never_oversell(self):
+        product = Product.objects.create(title="Flash", slug="flash", price_cents=1000, stock=25)
+        result = stress_reservations(product, threads=8, attempts=10)
+        product.refresh_from_db()
+        self.assertEqual(result["reserved"], 25)
+        self.assertEqual(result["rejected"], 8 * 10 - 25)
+        self.assertEqual(product.reserved, 25)
+        self.assertEqual(StockReservation.objects.filter(state="held").count(), 25)
+        self.assertGreater(result["per_second"], 0)
+
+
+# ---- Tokens e códigos de pedido ----
+from unittest.mock import patch
+from django.db import IntegrityError
+from django.test import TestCase
+from django.urls import reverse
+from shop.models import Order
+from shop.utils import SHORT_CODE_ALPHABET, gen_otp, gen_short_code, normalize_short_code, otp_expiry
+
+class OrderTokenTest(TestCase):
+    def test_codes_use_unambiguous_alphabet(self):
+        codes = {gen_short_code() for _ in range(500)}
+        self.assertEqual(len(codes), 500)
+        self.assertTrue(all(set(c) <= set(SHORT_CODE_ALPHABET) for c in codes))
+        self.assertTrue(all(len(gen_otp()) == 6 and gen_otp().isdigit() for _ in range(50)))
+        self.assertEqual(normalize_short_code(" ab12-cd34 "), "AB12CD34")
+
+    def test_collision_is_retried_with_new_code(self):
+        Order.objects.create(short_code="AAAA0000")
+        codes = iter(["BBBB1111"])
+        with patch("shop.models.gen_short_code", side_effect=lambda: next(codes)):
+            order = Order.objects.create(short_code="AAAA0000")
+        self.assertEqual(order.short_code, "BBBB1111")
+        self.assertEqual(Order.objects.count(), 2)
+
+    def test_gives_up_after_repeated_collisions(self):
+        Order.objects.create(short_code="AAAA0000")
+        with patch("shop.models.gen_short_code", return_value="AAAA0000"), self.assertRaises(IntegrityError):
+            Order.objects.create(short_code="AAAA0000")
+
+    def test_lookup_accepts_lowercase_code(self):
+        order = Order.objects.create(customer_email="a@b.com")
+        resp = self.client.post(
+            reverse("shop:orders_lookup"),
+            json.dumps({"email": "a@b.com", "short_code": order.short_code.lower()}),
+            content_type="application/json",
+        )
+        self.assertEqual(resp.status_code, 200)
+
+    def test_non_ascii_otp_is_rejected_without_error(self):
+        order = Order.objects.create(customer_email="a@b.com", otp_code="123456", otp_expires_at=otp_expiry(10))
+        for otp in ("é23456", "１２３４５６", "12 34"):
+            resp = self.client.post(
+                reverse("shop:verify_otp"),
+                json.dumps({"email": "a@b.com", "short_code": order.short_code, "otp": otp}),
+                content_type="application/json",
+            )
+            self.assertEqual(resp.status_code, 400, otp)
+
+
+# ---- Status do pedido ao vivo (SSE) ----
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase
+from django.urls import reverse
+from shop import order_events
+from shop.models import Order, OrderItem, Product
+
+class OrderStatusStreamTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.p = Product.objects.create(title="Caneca", slug="caneca", price_cents=1500, stock=5)
+        self.order = Order.objects.create(customer_email="a@b.com", total_cents=3000)
+        OrderItem.objects.create(order=self.order, product=self.p, qty=2, unit_price_cents=1500)
+
+    def read_stream(self, publish_after=None):
+        url = reverse("shop:order_status_stream", args=[self.order.public_token])
+
+        async def run():
+            resp = await AsyncClient().get(url)
+            self.assertEqual(resp["Content-Type"], "text/event-stream")
+            if publish_after:
+                threading.Timer(0.1, order_events.publish, args=(self.order.public_token, publish_after)).start()
+            chunks = []
+            async for chunk in resp.streaming_content:
+                chunks.append(chunk.decode())
+            return "".join(chunks)
+
+        return async_to_sync(asyncio.wait_for)(run(), 5)
+
+    def test_final_status_is_sent_and_stream_closes(self):
+        Order.objects.filter(pk=self.order.pk).update(status="paid")
+        with self.settings(ORDER_STREAM_RETRY_MS=2500):
+            body = self.read_stream()
+        self.assertTrue(body.startswith("retry: 2500\n\n"))
+        self.assertIn('"status": "paid"', body)
+
+    def test_published_change_reaches_open_stream(self):
+        body = self.read_stream(publish_after="paid")
+        self.assertLess(body.index('"status": "pending"'), body.index('"status": "paid"'))
+
+    def test_wsgi_gets_short_response_with_retry(self):
+        # sob WSGI o gerador async seria lido inteiro: a resposta fecha na hora e o navegador reconecta
+        url = reverse("shop:order_status_stream", args=[self.order.public_token])
+        with self.settings(ORDER_STREAM_MAX_SECONDS=30, ORDER_STREAM_RETRY_MS=2000):
+            start = time.monotonic()
+            resp = self.client.get(url)
+            elapsed = time.monotonic() - start
+        self.assertLess(elapsed, 1)
+        self.assertFalse(resp.streaming)
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        body = resp.content.decode()
+        self.assertTrue(body.startswith("retry: 2000\n\n"))
+        self.assertIn('"status": "pending"', body)
+
+        order_events.publish(self.order.public_token, "paid")
+        Order.objects.filter(pk=self.order.pk).update(status="paid")
+        self.assertIn('"status": "paid"', self.client.get(url).content.decode())
+
+    @patch("shop.services.payments.MercadoPago.get_payment_info")
+    def test_webhook_publishes_after_commit(self, mock_info):
+        mock_info.return_value = {"status": "approved", "external_reference": str(self.order.pk)}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse("shop:mp_webhook"), '{"data":{"id":"1"}}', content_type="application/json")
+        self.assertEqual(cache.get(f"order-status:{self.order.public_token}"), "paid")
+
+    def test_item_summary_is_cached(self):
+        url = reverse("shop:order_status", args=[self.order.public_token])
+        self.assertContains(self.client.get(url), "Caneca")
+        with self.assertNumQueries(1):
+            resp = self.client.get(url)
+        self.assertContains(resp, "Caneca")
+        self.assertEqual(resp.context["items_count"], 2)
+
+
+# ---- Admin em tabelas grandes ----
+from django.contrib.admin.sites import site
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from shop.admin import LargeTableAdmin
+from shop.models import Category, Order, OrderItem, Product
+
+class AdminChangelistQueriesTest(TestCase):
+    MAX_QUERIES = 8  # sessão, usuário, COUNT, linhas, date_hierarchy, filtros...
+
+    def setUp(self):
+        admin = get_user_model().objects.create_superuser("admin", "admin@loja.test", "x")
+        self.client.force_login(admin)
+        self.cat = Category.objects.create(name="C", slug="c")
+
+    def add_rows(self, n):
+        start = Product.objects.count()
+        for i in range(start, start + n):
+            p = Product.objects.create(title=f"P{i}", slug=f"p{i}", price_cents=100, category=self.cat)
+            order = Order.objects.create(customer_email=f"c{i}@loja.test")
+            OrderItem.objects.create(order=order, product=p, unit_price_cents=100)
+
+    def queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        urls = [f"/admin/shop/{m}/" for m in ("order", "orderitem", "product")]
+        urls.append("/admin/shop/order/?q=c1%40")
+        self.add_rows(3)
+        small = [self.queries(u) for u in urls]
+        self.add_rows(30)
+        large = [self.queries(u) for u in urls]
+        self.assertEqual(small, large)
+        self.assertTrue(all(n <= self.MAX_QUERIES for n in large), large)
+
+    def test_order_page_inline_loads_products_with_items(self):
+        self.add_rows(1)
+        order = Order.objects.get()
+        for i in range(5):
+            p = Product.objects.create(title=f"X{i}", slug=f"x{i}", price_cents=100)
+            OrderItem.objects.create(order=order, product=p, unit_price_cents=100)
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(f"/admin/shop/order/{order.pk}/change/")
+        product_reads = [q for q in ctx.captured_queries if q["sql"].startswith('SELECT "shop_product"')]
+        self.assertEqual(product_reads, [])
+
+    def search(self, model, term):
+        queryset, _ = site._registry[model].get_search_results(None, model.objects.all(), term)
+        return queryset
+
+    def test_search_uses_indexes(self):
+        # ^/= do admin viram LIKE com UPPER()/iexact e varrem a tabela; o plano tem que buscar no índice
+        self.add_rows(3)
+        cases = [
+            (Product, "P1", "product_title_lower_idx"),
+            (Order, "c1@", "order_email_created_idx"),
+            (Order, "abc-123", "short_code"),
+            (OrderItem, "ABC123", "short_code"),
+        ]
+        for model, term, index in cases:
+            plan = self.search(model, term).explain()
+            self.assertNotRegex(plan, rf"SCAN {model._meta.db_table}\b", (model, term, plan))
+            self.assertIn(index, plan, (model, term, plan))
+
+    def test_search_matches_prefix_case_insensitively(self):
+        self.add_rows(12)
+        Product.objects.filter(slug="p3").update(title="Caneca Azul")
+        order = Order.objects.get(customer_email="c1@loja.test")
+        found = lambda model, term: set(self.search(model, term))
+        self.assertEqual({p.slug for p in found(Product, "cAN")}, {"p3"})
+        self.assertEqual({p.slug for p in found(Product, "p1")}, {"p1", "p10", "p11"})
+        self.assertEqual(found(Order, " C1@Loja"), {order})
+        self.assertEqual(found(Order, order.short_code.lower()), {order})
+        self.assertEqual(len(found(OrderItem, order.short_code)), 1)
+
+    def test_admin_without_search_q_uses_default_search(self):
+        class NameAdmin(LargeTableAdmin):
+            search_fields = ("name",)
+
+        Category.objects.create(name="Cafés", slug="cafes")
+        queryset, _ = NameAdmin(Category, site).get_search_results(None, Category.objects.all(), "afé")
+        self.assertEqual([c.slug for c in queryset], ["cafes"])
+        self.assertEqual(self.search(Order, " ").count(), Order.objects.count())
+
+
+# ---- Orçamento de boot ----
+from django.test import SimpleTestCase
+from shop import startup
+from shop.utils import lazy_import, optional_import
+
+class StartupBudgetTest(SimpleTestCase):
+    def test_setup_and_url_resolution_within_budget(self):
+        result = startup.probe("/")
+        self.assertEqual(startup.eager_heavy_modules(result["modules"]), [])
+        self.assertLess(result["seconds"] * 1000, startup.budget_ms())
+
+    def test_lazy_and_optional_imports(self):
+        self.assertIsNone(optional_import("pacote_que_nao_existe"))
+        self.assertIsNone(optional_import("pacote_que_nao_existe.sub"))
+        self.assertEqual(lazy_import("json").dumps([1]), "[1]")
+
+
+# ---- Sugestões da busca (typeahead) ----
+import random
+import time
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from shop import typeahead
+from shop.bench import percentile
+from shop.models import Category, Product
+
+@override_settings(SUGGEST_REFRESH_SECONDS=0)
+class TypeaheadTest(TestCase):
+    def setUp(self):
+        typeahead.reset()
+        self.cat = Category.objects.create(name="Cafés Especiais", slug="cafes")
+        self.mug = Product.objects.create(title="Caneca Térmica Azul", slug="caneca", price_cents=100,
+                                          category=self.cat, views=10)
+        Product.objects.create(title="Camiseta Preta", slug="camiseta", price_cents=100, views=50)
+
+    def tearDown(self):
+        typeahead.reset()
+
+    def labels(self, q):
+        return [r["label"] for r in typeahead.suggest(q)]
+
+    def test_accent_folding_and_word_prefix(self):
+        self.assertEqual(self.labels("TERM"), ["Caneca Térmica Azul"])
+        self.assertEqual(self.labels("cafe"), ["Cafés Especiais"])
+        self.assertEqual(self.labels("ca"), ["Cafés Especiais", "Camiseta Preta", "Caneca Térmica Azul"])
+        self.assertEqual(self.labels("termica az"), ["Caneca Térmica Azul"])
+        self.assertEqual(self.labels("zzz"), [])
+
+    def test_index_follows_catalog_changes(self):
+        self.assertEqual(self.labels("azul"), ["Caneca Térmica Azul"])
+        self.mug.title = "Caneca Verde"
+        self.mug.save()
+        Product.objects.create(title="Garrafa Azul", slug="garrafa", price_cents=100)
+        self.assertEqual(self.labels("azul"), ["Garrafa Azul"])
+        self.assertEqual(self.labels("verde"), ["Caneca Verde"])
+        self.mug.delete()
+        self.assertEqual(self.labels("caneca"), [])
+
+    def test_no_queries_between_refreshes(self):
+        with override_settings(SUGGEST_REFRESH_SECONDS=60):
+            typeahead.suggest("ca")
+            with self.assertNumQueries(0):
+                typeahead.suggest("cam")
+
+    def test_endpoint(self):
+        res = self.client.get(reverse("shop:api_suggest"), {"q": "Canéca"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.json()["results"], [{
+            "type": "product", "id": self.mug.pk, "label": "Caneca Térmica Azul",
+            "url": reverse("shop:product_detail", args=["caneca"]),
+        }])
+        self.assertEqual(self.client.get(reverse("shop:api_suggest"), {"q": "c"}).json()["results"], [])
+        self.assertEqual(self.client.get(reverse("shop:api_suggest"), {"q": "ca", "limit": "x"}).status_code, 400)
+
+    def test_popular_item_beyond_scan_window(self):
+        # 300 canecas ocupam as primeiras chaves de "ca"/"cane"; o mais visto vem depois em ordem alfabética
+        rows = [(i, f"Caneca {i:04d}", f"c{i}", 1) for i in range(typeahead.SCAN_LIMIT + 100)]
+        rows += [(9001, "Cazuza Vinil", "vinil", 900), (9002, "Caneca Zebra", "zebra", 800)]
+        index = typeahead.TypeaheadIndex.from_rows(rows, max_entries=10_000)
+        labels = lambda q, limit=8: [r["label"] for r in index.search(q, limit)]
+        self.assertEqual(labels("ca", 2), ["Cazuza Vinil", "Caneca Zebra"])
+        self.assertEqual(labels("cane", 1), ["Caneca Zebra"])
+        self.assertEqual(labels("caneca z"), ["Caneca Zebra"])
+        self.assertEqual(labels("ca", 30)[:2], ["Cazuza Vinil", "Caneca Zebra"])
+
+    def test_lookup_latency_on_100k_titles(self):
+        rng = random.Random(1)
+        words = ["caneca", "camiseta", "livro", "fone", "mochila", "garrafa", "azul", "preta", "térmica", "couro"]
+        rows = [(i, f"{rng.choice(words)} {rng.choice(words)} {i}", f"p{i}", rng.randint(0, 999)) for i in range(100_000)]
+        index = typeahead.TypeaheadIndex.from_rows(rows, max_entries=1_000_000)
+        samples = []
+        for q in [w[:n] for w in words for n in range(2, 6)] * 20:
+            t0 = time.perf_counter()
+            self.assertTrue(index.search(q))
+            samples.append((time.perf_counter() - t0) * 1000)
+        self.assertLess(percentile(samples, 95), 1.0)
+
+
+# ---- Assinatura dos webhooks do Mercado Pago ----
+import time
+from unittest.mock import patch
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.core.cache import cache
+from shop import metrics, webhooks
+from shop.models import Order
+
+@override_settings(MERCADO_PAGO_WEBHOOK_SECRET="segredo")
+class WebhookSignatureTest(TestCase):
+    def setUp(self):
+        webhooks.seen.clear()
+        cache.clear()
+        self.order = Order.objects.create(customer_email="c@loja.test")
+        patcher = patch("shop.services.payments.MercadoPago.get_payment_info",
+                        return_value={"status": "approved", "external_reference": str(self.order.pk)})
+        self.info = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post(self, data_id="123", ts=None, request_id="req-1", secret="segredo", signature=None):
+        ts = str(int(ts if ts is not None else time.time()))
+        if signature is None:
+            signature = f"ts={ts},v1={webhooks.sign(secret, data_id, request_id, ts)}"
+        headers = {"HTTP_X_SIGNATURE": signature, "HTTP_X_REQUEST_ID": request_id} if signature else {}
+        return self.client.post(f"{reverse('shop:mp_webhook')}?data.id={data_id}&type=payment",
+                                f'{{"data":{{"id":"{data_id}"}}}}', content_type="application/json", **headers)
+
+    def counted(self, result):
+        return metrics.registry.counter("mp_webhook_events_total").value(result=result)
+
+    def test_valid_signature_is_processed(self):
+        before = self.counted("processed")
+        self.assertEqual(self.post().status_code, 200)
+        self.info.assert_called_once_with("123")
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "paid")
+        self.assertEqual(self.counted("processed"), before + 1)
+
+    def test_rejected_before_any_upstream_call(self):
+        now = int(time.time())
+        cases = [
+            ("malformed", {"signature": ""}),
+            ("malformed", {"signature": f"ts={now},v1=é"}),
+            ("malformed", {"signature": f"ts={now},v1={'é' * 64}"}),
+            ("signature", {"secret": "outro"}),
+            ("stale", {"ts": time.time() - 3600}),
+        ]
+        for reason, kwargs in cases:
+            with self.subTest(reason):
+                before = self.counted(reason)
+                self.assertEqual(self.post(**kwargs).status_code, 401)
+                self.assertEqual(self.counted(reason), before + 1)
+        self.info.assert_not_called()
+
+    def test_replay_is_acknowledged_but_not_processed(self):
+        ts = time.time()
+        self.assertEqual(self.post(ts=ts).status_code, 200)
+        webhooks.seen.clear()  # outro worker: só o cache compartilhado conhece a assinatura
+        self.assertEqual(self.post(ts=ts).status_code, 200)
+        self.assertEqual(self.info.call_count, 1)
+
+    def test_seen_set_is_bounded(self):
+        seen = webhooks.SeenSignatures(maxsize=2)
+        self.assertTrue(seen.add("a", 60, now=0))
+        self.assertFalse(seen.add("a", 60, now=1))
+        seen.add("b", 60, now=1)
+        seen.add("c", 60, now=1)
+        self.assertTrue(seen.add("a", 60, now=2))  # despejada pelo limite
+        self.assertTrue(seen.add("c", 60, now=100))  # expirada
+
+
+# ---- Histórico de pedidos após o OTP ----
+import json
+from datetime import timedelta
+from django.core import signing
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from shop import order_history
+from shop.models import Order
+from shop.utils import otp_expiry
+
+@override_settings(ORDER_HISTORY_PAGE_SIZE=2)
+class OrderHistoryTest(TestCase):
+    def setUp(self):
+        now = timezone.now()
+        self.orders = []
+        for i in range(5):
+            o = Order.objects.create(customer_email="Cliente@Loja.Test ", total_cents=1000 * i, items_count=i)
+            Order.objects.filter(pk=o.pk).update(created_at=now - timedelta(days=i // 2))  # empates de data
+            self.orders.append(o)
+        Order.objects.create(customer_email="outro@loja.test")
+
+    def verify(self, **extra):
+        latest = Order.objects.filter(customer_email="cliente@loja.test").order_by("-created_at", "-id").first()
+        Order.objects.filter(pk=latest.pk).update(otp_code="123456", otp_expires_at=otp_expiry(10))
+        payload = {"email": "CLIENTE@loja.test", "otp": "123456", **extra}
+        return self.client.post(reverse("shop:verify_otp"), json.dumps(payload), content_type="application/json")
+
+    def history(self, token, cursor=None):
+        params = {"cursor": cursor} if cursor else {}
+        return self.client.get(reverse("shop:orders_history"), params, HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_email_is_stored_lowercase(self):
+        self.assertEqual(Order.objects.filter(customer_email="cliente@loja.test").count(), 5)
+
+    def test_verified_customer_pages_through_all_orders(self):
+        res = self.verify()
+        self.assertEqual(res.status_code, 200)
+        token = res.json()["history_token"]
+        seen, cursor, pages = [], None, 0
+        while True:
+            with self.assertNumQueries(1):
+                data = self.history(token, cursor).json()
+            seen += data["results"]
+            pages += 1
+            cursor = data["next_cursor"]
+            if not cursor:
+                break
+        self.assertEqual(pages, 3)
+        expected = sorted(self.orders, key=lambda o: (Order.objects.get(pk=o.pk).created_at, o.pk), reverse=True)
+        self.assertEqual([r["short_code"] for r in seen], [o.short_code for o in expected])
+        self.assertEqual({r["items_count"] for r in seen}, {0, 1, 2, 3, 4})
+
+    def test_bad_or_expired_token_is_rejected(self):
+        self.assertEqual(self.history("lixo").status_code, 403)
+        forged = signing.dumps({"email": "cliente@loja.test"}, salt="outra-coisa")
+        self.assertEqual(self.history(forged).status_code, 403)
+        token = order_history.issue_token("cliente@loja.test")
+        with override_settings(ORDER_HISTORY_TOKEN_TTL=-1):
+            self.assertEqual(self.history(token).status_code, 403)
+        self.assertEqual(self.history(token, cursor="%%%").status_code, 400)
+
+    def test_wrong_otp_gets_no_token(self):
+        Order.objects.update(otp_code="123456", otp_expires_at=otp_expiry(10))
+        res = self.client.post(reverse("shop:verify_otp"),
+                               json.dumps({"email": "cliente@loja.test", "otp": "000000"}),
+                               content_type="application/json")
+        self.assertEqual(res.status_code, 403)
+
+
+# ---- Categorias aninhadas ----
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from shop import categories
+from shop.catalog import filter_products
+from shop.models import Category, Product
+
+class CategoryTreeTest(TestCase):
+    def setUp(self):
+        self.eletro = Category.objects.create(name="Eletrônicos", slug="eletronicos")
+        self.cel = Category.objects.create(name="Celulares", slug="celulares", parent=self.eletro)
+        self.capas = Category.objects.create(name="Capas", slug="capas", parent=self.cel)
+        self.livros = Category.objects.create(name="Livros", slug="livros")
+        for i, cat in enumerate((self.eletro, self.cel, self.capas, self.livros)):
+            Product.objects.create(title=f"P{i}", slug=f"p{i}", price_cents=100, category=cat)
+
+    def slugs(self, cat):
+        return sorted(filter_products({"cat": cat}).values_list("slug", flat=True))
+
+    def test_paths_and_subtree_filter(self):
+        self.assertEqual(self.capas.path, "eletronicos/celulares/capas/")
+        self.assertEqual(self.slugs("eletronicos"), ["p0", "p1", "p2"])
+        self.assertEqual(self.slugs("celulares"), ["p1", "p2"])
+        self.assertEqual(self.slugs("inexistente"), [])
+        categories.category_tree()  # árvore em cache
+        with CaptureQueriesContext(connection) as ctx:
+            list(filter_products({"cat": "eletronicos"}))
+        self.assertEqual(len(ctx.captured_queries), 1)
+        # subárvore resolvida na árvore em cache: IN nos ids, sem JOIN/LIKE em shop_category
+        sql = ctx.captured_queries[0]["sql"]
+        self.assertNotIn("LIKE", sql)
+        self.assertNotIn("shop_category", sql)
+        plan = filter_products({"cat": "eletronicos"}).explain()
+        self.assertRegex(plan, r"SEARCH shop_product USING INDEX \w*category")
+        self.assertNotIn("SCAN shop_category", plan)
+
+    def test_move_and_rename_rewrite_subtree(self):
+        self.cel.parent = self.livros
+        self.cel.slug = "smartphones"
+        self.cel.save()
+        self.capas.refresh_from_db()
+        self.assertEqual(self.capas.path, "livros/smartphones/capas/")
+        self.assertEqual(self.slugs("livros"), ["p1", "p2", "p3"])
+        self.assertEqual(self.slugs("eletronicos"), ["p0"])
+
+    def test_cannot_move_into_own_subtree(self):
+        self.eletro.parent = self.capas
+        with self.assertRaises(ValidationError):
+            self.eletro.full_clean()
+        with self.assertRaises(ValueError):
+            self.eletro.save()
+
+    def test_tree_order_and_breadcrumbs(self):
+        tree = categories.category_tree()
+        self.assertEqual([(n["slug"], n["depth"]) for n in tree],
+                         [("eletronicos", 0), ("celulares", 1), ("capas", 2), ("livros", 0)])
+        self.assertEqual([n["name"] for n in categories.breadcrumbs("capas")], ["Eletrônicos", "Celulares", "Capas"])
+        counts = {n["slug"]: n["facet_count"] for n in categories.with_counts({"eletronicos/": 1, "eletronicos/celulares/": 2})}
+        self.assertEqual(counts, {"eletronicos": 3, "celulares": 2, "capas": 0, "livros": 0})
+
+    def test_catalog_page_uses_subtree(self):
+        res = self.client.get(reverse("shop:catalog"), {"cat": "celulares"})
+        self.assertEqual([p.slug for p in res.context["products"]], ["p2", "p1"])
+        self.assertEqual([c["slug"] for c in res.context["breadcrumbs"]], ["eletronicos", "celulares"])
+        self.assertEqual(res.context["facets"]["total"], 2)
+        menu = {c["slug"]: c["facet_count"] for c in res.context["categories"]}
+        self.assertEqual(menu["eletronicos"], 3)
+
+
+# ---- Conciliação de pagamentos ----
+from datetime import timedelta
+from io import StringIO
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from shop import inventory, reconcile
+from shop.bench import StubMercadoPago
+from shop.models import Order, OrderItem, Product, StockReservation
+
+class ReconcilePaymentsTest(TestCase):
+    def setUp(self):
+        self.p = Product.objects.create(title="P", slug="p", price_cents=100, stock=50)
+        self.orders = []
+        for _ in range(12):
+            order = Order.objects.create(customer_email="c@loja.test")
+            OrderItem.objects.create(order=order, product=self.p, qty=2, unit_price_cents=100)
+            inventory.reserve(order, [(self.p.pk, 2)])
+            self.orders.append(order)
+        # pedidos 0-5 pagos (o 5 depois de uma recusa), 6-8 recusados, 9 em análise, 10-11 sem pagamento
+        paid_at = timezone.now().isoformat()
+        payments = {}
+        for i, order in enumerate(self.orders[:10]):
+            status = "approved" if i < 5 else "rejected" if i < 9 else "in_process"
+            payments[f"pay-{i}"] = {"status": status, "external_reference": str(order.pk), "date_created": paid_at}
+        payments["pay-5b"] = {**payments["pay-5"], "status": "approved"}
+        payments["outra-loja"] = {"status": "approved", "external_reference": "999999", "date_created": paid_at}
+        self.stub = StubMercadoPago(payments=payments)
+        self.addCleanup(self.stub.close)
+
+    def run_reconcile(self, **kwargs):
+        with override_settings(PAYMENTS_MOCK=False, MERCADO_PAGO_ACCESS_TOKEN="TEST-1",
+                               MERCADO_PAGO_API_BASE=self.stub.url):
+            return reconcile.reconcile(timezone.now() - timedelta(hours=1), timezone.now() + timedelta(minutes=5),
+                                       page_size=4, batch_size=3, **kwargs)
+
+    def test_pending_orders_follow_provider_status(self):
+        stats = self.run_reconcile()
+        self.assertEqual((stats["pending"], stats["paid"], stats["canceled"], stats["unresolved"]), (12, 6, 3, 3))
+        self.assertEqual((stats["pages"], stats["payments"]), (3, 12))  # 12 pagamentos / 4 por página
+        self.assertEqual(self.stub.searches, 3)
+        status = dict(Order.objects.values_list("id", "status"))
+        self.assertEqual([status[o.pk] for o in self.orders], ["paid"] * 6 + ["canceled"] * 3 + ["pending"] * 3)
+        self.p.refresh_from_db()
+        self.assertEqual((self.p.stock, self.p.reserved), (50 - 12, 6))
+        self.assertEqual(StockReservation.objects.filter(state="converted").count(), 6)
+
+    def test_second_run_and_dry_run_change_nothing(self):
+        self.assertEqual(self.run_reconcile(dry_run=True)["paid"], 6)
+        self.assertEqual(Order.objects.filter(status="pending").count(), 12)
+        self.run_reconcile()
+        stats = self.run_reconcile()
+        self.assertEqual((stats["paid"], stats["canceled"]), (0, 0))
+        self.p.refresh_from_db()
+        self.assertEqual(self.p.stock, 50 - 12)
+
+    def test_transition_skips_orders_already_settled_by_webhook(self):
+        Order.objects.filter(pk=self.orders[0].pk).update(status="paid")
+        self.assertEqual(reconcile.transition([o.pk for o in self.orders[:3]], "paid"), 2)
+        self.p.refresh_from_db()
+        self.assertEqual(self.p.stock, 50 - 4)
+
+    def test_command_reports_throughput(self):
+        out = StringIO()
+        with override_settings(PAYMENTS_MOCK=False, MERCADO_PAGO_ACCESS_TOKEN="TEST-1",
+                               MERCADO_PAGO_API_BASE=self.stub.url):
+            call_command("reconcile_payments", "--min-age-minutes=-5", stdout=out)
+        self.assertIn("pagos: 6 | cancelados: 3 | sem pagamento: 3", out.getvalue())
+        self.assertIn("pedidos/s", out.getvalue())
+
+
+# ---- Snapshot estático do catálogo ----
+import json
+import shutil
+import tempfile
+from io import StringIO
+from pathlib import Path
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from shop import snapshot
+from shop.models import Category, Product
+
+class SnapshotTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.root, True)
+        self.eletro = Category.objects.create(name="Eletrônicos", slug="eletronicos")
+        self.cel = Category.objects.create(name="Celulares", slug="celulares", parent=self.eletro)
+        self.livros = Category.objects.create(name="Livros", slug="livros")
+        self.phone = Product.objects.create(title="Fone", slug="fone", price_cents=100, stock=5, category=self.cel)
+        self.book = Product.objects.create(title="Livro", slug="livro", price_cents=200, stock=5, category=self.livros)
+
+    def build(self, **kwargs):
+        return snapshot.build(root=self.root, pages=2, **kwargs)
+
+    def read(self, rel):
+        return (self.root / rel).read_text()
+
+    def test_full_build_writes_products_and_listings(self):
+        stats = self.build()
+        self.assertEqual(stats["products"], 2)
+        self.assertIn("Fone", self.read("p/fone/index.html"))
+        self.assertEqual(json.loads(self.read("p/fone/index.json"))["slug"], "fone")
+        self.assertNotIn("views", json.loads(self.read("p/fone/index.json")))
+        self.assertIn("Fone", self.read("catalog/eletronicos/price/1.html"))
+        self.assertNotIn("/p/livro/", self.read("catalog/eletronicos/price/1.html"))
+        self.assertEqual(json.loads(self.read("catalog/_todas/-created/1.json"))["count"], 2)
+        self.assertFalse((self.root / "catalog/_todas/price/2.html").exists())  # só páginas que existem
+        self.assertEqual(list(self.root.rglob("*.tmp")), [])
+
+    def test_rerun_writes_nothing(self):
+        self.build()
+        stats = self.build()
+        self.assertEqual((stats["products"], stats["listings"], stats["written"]), (0, 0, 0))
+
+    def test_incremental_rewrites_only_affected_pages(self):
+        self.build()
+        before = (self.root / "catalog/livros/price/1.html").stat().st_mtime_ns
+        self.phone.title = "Fone Bluetooth"
+        self.phone.save()
+        stats = self.build()
+        self.assertEqual(stats["products"], 1)
+        self.assertIn("Fone Bluetooth", self.read("p/fone/index.html"))
+        self.assertIn("Fone Bluetooth", self.read("catalog/eletronicos/-created/1.html"))
+        self.assertIn("Fone Bluetooth", self.read("catalog/_todas/price/1.json"))
+        self.assertEqual((self.root / "catalog/livros/price/1.html").stat().st_mtime_ns, before)
+
+    def test_deactivated_product_is_removed(self):
+        self.build()
+        self.book.active = False
+        self.book.save()
+        self.assertGreaterEqual(self.build()["removed"], 1)
+        self.assertFalse((self.root / "p/livro/index.html").exists())
+        self.assertFalse((self.root / "p/livro/index.json").exists())
+        self.assertEqual(json.loads(self.read("catalog/_todas/-created/1.json"))["count"], 1)
+
+    def test_command_and_csrf_endpoint(self):
+        out = StringIO()
+        call_command("build_snapshot", "--dir", str(self.root), stdout=out)
+        self.assertIn("produtos: 2", out.getvalue())
+        response = self.client.get("/api/csrf")
+        self.assertEqual(response.status_code, 204)
+        self.assertIn("csrftoken", response.cookies)
+
+
+# ---- Índice colunar do catálogo ----
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from shop import catalog_index
+from shop.catalog import SORT_MAP, parse_filters, sorted_products
+from shop.models import Category, Product
+
+@override_settings(CATALOG_INDEX_ENABLED=True, CATALOG_INDEX_REFRESH_SECONDS=0)
+class CatalogIndexTest(TestCase):
+    def setUp(self):
+        catalog_index.reset()
+        self.addCleanup(catalog_index.reset)
+        self.eletro = Category.objects.create(name="Eletrônicos", slug="eletronicos")
+        self.cel = Category.objects.create(name="Celulares", slug="celulares", parent=self.eletro)
+        self.livros = Category.objects.create(name="Livros", slug="livros")
+        cats = [self.eletro, self.cel, self.livros, None]
+        base = timezone.now()
+        for i in range(30):
+            p = Product.objects.create(
+                title=f"P{i}", slug=f"p{i}", price_cents=(i * 7919) % 10000 + 100, views=(i * 31) % 97,
+                category=cats[i % 4], featured=i % 3 == 0, active=i != 29,
+            )
+            Product.objects.filter(pk=p.pk).update(created_at=base - timedelta(hours=i))
+
+    def ids(self, params, backend=None):
+        filters = parse_filters(params)
+        index = catalog_index.get_index() if backend is None else catalog_index.ColumnIndex(
+            catalog_index.get_index().rows(), use_numpy=backend
+        )
+        return [int(pk) for pk in index.search(filters)]
+
+    def sql_ids(self, params):
+        return list(sorted_products(parse_filters(params)).values_list("id", flat=True))
+
+    def test_matches_sql_for_every_filter_and_sort(self):
+        scenarios = [{}, {"cat": "eletronicos"}, {"cat": "livros"}, {"featured": "1"},
+                     {"min_price": "20", "max_price": "70"}, {"cat": "eletronicos", "min_price": "30"}]
+        for params in scenarios:
+            for sort in SORT_MAP:
+                query = {**params, "sort": sort}
+                expected = self.sql_ids(query)
+                with self.subTest(query=query):
+                    self.assertEqual(self.ids(query), expected)
+                    self.assertEqual(self.ids(query, backend=False), expected)  # fallback com `array`
+        self.assertEqual(self.ids({"cat": "inexistente"}), [])
+
+    def test_views_hydrate_only_the_page(self):
+        response = self.client.get("/api/catalog", {"sort": "price", "page": 2, "facets": "0"})
+        data = response.json()
+        self.assertEqual(data["count"], 29)
+        self.assertEqual([r["id"] for r in data["results"]], self.sql_ids({"sort": "price"})[12:24])
+        with override_settings(CATALOG_INDEX_REFRESH_SECONDS=60), self.assertNumQueries(1):
+            page = catalog_index.search(parse_filters({"sort": "-price"}), Product.objects.all())[:12]
+        self.assertEqual(len(page), 12)
+        self.assertIsNone(catalog_index.search(parse_filters({"q": "P1"}), Product.objects.all()))
+        self.assertContains(self.client.get("/", {"cat": "livros"}), "/p/p2/")
+
+    def test_refresh_applies_changes_and_deletions(self):
+        self.assertEqual(len(catalog_index.get_index()), 29)
+        cheapest = Product.objects.get(slug="p5")
+        cheapest.price_cents = 1
+        cheapest.save()
+        Product.objects.filter(slug="p29").update(active=True)
+        Product.objects.filter(slug="p0").update(active=False)
+        self.assertEqual(self.ids({"sort": "price"})[0], cheapest.pk)
+        self.assertEqual(len(catalog_index.get_index()), 29)
+        Product.objects.filter(slug="p1").delete()
+        self.assertEqual(self.ids({"sort": "price"}), self.sql_ids({"sort": "price"}))
+
+    @override_settings(CATALOG_INDEX_ENABLED=False)
+    def test_disabled_uses_sql(self):
+        self.assertIsNone(catalog_index.search(parse_filters({}), Product.objects.all()))
@@ -0,0 +1,192 @@
+"""
+Sugestões de busca (search-as-you-type) a partir de um índice de prefixos em
+memória, um por processo. Cada palavra de `Product.title` e `Category.name`
+(sem acentos, minúsculas) vira uma chave num array ordenado; a busca é um
+bisect + varredura curta, sem tocar no banco.
+
+A varredura só enxerga as SCAN_LIMIT primeiras chaves em ordem alfabética, o
+que não basta para prefixos curtos ("ca" casa com milhares de chaves). Por
+isso o índice guarda, para cada prefixo de até TOP_PREFIX_LEN letras, os TOP_N
+itens mais bem ranqueados: consultas curtas saem direto dessa tabela e as
+longas juntam os populares do prefixo curto ao que a varredura encontrou.
+
+O índice é montado no primeiro uso e, a cada SUGGEST_REFRESH_SECONDS, compara
+a versão do catálogo e aplica só os produtos alterados (shop/live_index.py).
+"""
+import bisect
+import functools
+import re
+import unicodedata
+
+from django.conf import settings
+from django.urls import reverse
+
+from .live_index import LiveIndex
+from .models import Category, Product
+
+SCAN_LIMIT = 200        # chaves examinadas por consulta antes de ranquear
+TOP_PREFIX_LEN = 3      # prefixos com ranking pré-calculado (1 a 3 letras)
+TOP_N = 20              # itens guardados por prefixo curto (= limite máximo do /api/suggest)
+MAX_WORDS = 6           # palavras indexadas por título
+PRODUCT_FIELDS = ("id", "title", "slug", "views")
+
+_SPLIT_RE = re.compile(r"[^0-9a-z]+")
+
+
+def normalize(text: str) -> str:
+    """'Caneca Café-Expresso' -> 'caneca cafe expresso'."""
+    decomposed = unicodedata.normalize("NFKD", text or "")
+    folded = "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+    return " ".join(_SPLIT_RE.split(folded)).strip()
+
+
+def _word_keys(text):
+    """Chaves de cada palavra até o fim do texto: 'caneca azul' -> ['caneca azul', 'azul']."""
+    words = normalize(text).split()[:MAX_WORDS]
+    return [" ".join(words[i:]) for i in range(len(words))]
+
+
+class TypeaheadIndex:
+    """
+    Array ordenado de chaves + referência para o item sugerido. Imutável depois
+    de montado: atualizações geram um índice novo e trocam a referência.
+    """
+
+    def __init__(self, items, max_entries):
+        # items: {(tipo, id): (rótulo, slug, score)}
+        self.items = items
+        self.max_entries = max_entries
+        entries = []
+        self.top = {}        # prefixo curto -> refs já em ordem de ranking
+        self.top_keys = {}   # chaves dos itens que aparecem em self.top
+        # categorias primeiro, depois os mais vistos: no limite de memória ficam os mais populares
+        # e cada lista de self.top sai ordenada sem sort
+        for ref, (label, _slug, _score) in sorted(items.items(), key=_rank):
+            if len(entries) >= max_entries:
+                break
+            keys = _word_keys(label)
+            entries.extend((key, ref) for key in keys)
+            for prefix in {key[:n] for key in keys for n in range(1, TOP_PREFIX_LEN + 1)}:
+                bucket = self.top.get(prefix)
+                if bucket is None:
+                    self.top[prefix] = [ref]
+                elif len(bucket) < TOP_N:
+                    bucket.append(ref)
+                else:
+                    continue
+                self.top_keys[ref] = keys
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.refs = [ref for _, ref in entries]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def search(self, query, limit=8):
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        popular = self.top.get(prefix[:TOP_PREFIX_LEN], ())
+        if len(prefix) <= TOP_PREFIX_LEN and limit <= TOP_N:
+            ranked = [(ref, self.items[ref]) for ref in popular[:limit]]
+        else:
+            ranked = sorted(self._candidates(prefix, popular).items(), key=_rank)[:limit]
+        return [
+            {"type": kind, "id": ident, "label": label, "url": _url(kind, slug)}
+            for (kind, ident), (label, slug, _score) in ranked
+        ]
+
+    def _candidates(self, prefix, popular):
+        """Itens das SCAN_LIMIT primeiras chaves com o prefixo + os populares do prefixo curto que casam."""
+        found = {
+            ref: self.items[ref]
+            for ref in popular
+            if any(key.startswith(prefix) for key in self.top_keys[ref])
+        }
+        start = bisect.bisect_left(self.keys, prefix)
+        for i in range(start, min(start + SCAN_LIMIT, len(self.keys))):
+            if not self.keys[i].startswith(prefix):
+                break
+            ref = self.refs[i]
+            if ref not in found:
+                found[ref] = self.items[ref]
+        return found
+
+    def replace(self, removed, added):
+        """Novo índice sem as refs de `removed` e com os itens de `added`."""
+        items = {ref: item for ref, item in self.items.items() if ref not in removed}
+        items.update(added)
+        return TypeaheadIndex(items, self.max_entries)
+
+    def count(self, kind):
+        return sum(1 for k, _ in self.items if k == kind)
+
+    @classmethod
+    def from_rows(cls, products=(), categories=(), max_entries=None):
+        """Monta a partir de tuplas (id, título, slug, views) e (slug, nome), sem banco."""
+        items = {("category", slug): (name, slug, 0) for slug, name in categories}
+        items.update({("product", pid): (title, slug, views) for pid, title, slug, views in products})
+        return cls(items, max_entries or max_entries_setting())
+
+
+def _rank(entry):
+    (kind, _ident), (label, _slug, score) = entry
+    return (kind != "category", -score, label)
+
+
+@functools.lru_cache(maxsize=1)
+def _url_templates():
+    # reverse() custa mais que a busca inteira: resolvemos uma vez e só trocamos o slug
+    return {
+        "category": reverse("shop:catalog") + "?cat={}",
+        "product": reverse("shop:product_detail", args=["__slug__"]).replace("__slug__", "{}"),
+    }
+
+
+def _url(kind, slug):
+    return _url_templates()[kind].format(slug)
+
+
+def max_entries_setting():
+    return int(getattr(settings, "SUGGEST_MAX_ENTRIES", 500_000))
+
+
+def refresh_seconds():
+    return float(getattr(settings, "SUGGEST_REFRESH_SECONDS", 5))
+
+
+def _build():
+    return TypeaheadIndex.from_rows(
+        Product.objects.filter(active=True).values_list(*PRODUCT_FIELDS),
+        Category.objects.values_list("slug", "name"),
+    )
+
+
+def _apply(index, rows):
+    # categorias são poucas: a cada mudança de versão entram todas de novo
+    removed = {("product", row[0]) for row in rows} | {ref for ref in index.items if ref[0] == "category"}
+    added = {("product", pid): (title, slug, views) for pid, title, slug, views, active in rows if active}
+    added.update({("category", slug): (name, slug, 0) for slug, name in Category.objects.values_list("slug", "name")})
+    return index.replace(removed, added)
+
+
+_live = LiveIndex(
+    build=_build,
+    apply=_apply,
+    size=lambda index: index.count("product"),
+    fields=PRODUCT_FIELDS,
+    refresh_seconds=refresh_seconds,
+)
+
+
+def reset():
+    """Descarta o índice do processo (testes, ou após carga em massa)."""
+    _live.reset()
+
+
+def get_index():
+    return _live.get()
+
+
+def suggest(query, limit=8):
+    return get_index().search(query, limit)
@@ -7,12 +7,18 @@ app_name = 'shop'
 
 urlpatterns = [
     path("", views.catalog_view, name="catalog"),
+    path("api/catalog", views.api_catalog, name="api_catalog"),
+    path("api/suggest", views.api_suggest, name="api_suggest"),
+    path("api/csrf", views.api_csrf, name="api_csrf"),
+    path("img/<int:pk>/<int:width>/<str:key>.webp", views.product_image, name="product_image"),
     path("p/<slug:slug>/", views.product_detail, name="product_detail"),
     path("api/checkout", views.create_checkout, name="create_checkout"),
     path("webhooks/mercadopago", views.mp_webhook, name="mp_webhook"),
     path("pedido/<str:public_token>/", views.order_status, name="order_status"),
+    path("pedido/<str:public_token>/eventos", views.order_status_stream, name="order_status_stream"),
     path("api/orders/lookup", views.orders_lookup, name="orders_lookup"),
     path("api/orders/verify-otp", views.verify_otp, name="verify_otp"),
+    path("api/orders/history", views.orders_history, name="orders_history"),
     path("checkout/sucesso", views.checkout_success, name="checkout_success"),
     path("meu-pedido/", views.order_lookup_page, name="order_lookup_page"),
     path("carrinho/", views.cart_view, name="cart_view"),
@@ -1,24 +1,56 @@
-import os
-import hmac
-import base64
-import random
-import string
-from hashlib import sha256
+import importlib
+import importlib.util
+import secrets
 from datetime import timedelta
 from django.utils import timezone
 
-_SECRET = os.getenv("PUBLIC_TOKEN_SECRET", "change-me")
+# Base32 de Crockford: sem I, L, O e U, que se confundem ao digitar o código.
+# São 32 símbolos, então `byte & 31` escolhe um deles sem viés.
+SHORT_CODE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
 
 def gen_public_token() -> str:
-    msg = f"{timezone.now().timestamp()}:{random.random()}".encode()
-    dig = hmac.new(_SECRET.encode(), msg, sha256).digest()
-    return base64.urlsafe_b64encode(dig).decode().strip("=")[:40]
+    # 30 bytes do gerador do sistema => 40 caracteres url-safe
+    return secrets.token_urlsafe(30)
 
 def gen_short_code(n: int = 8) -> str:
-    return "".join(random.choices(string.ascii_uppercase + string.digits, k=n))
+    return "".join(SHORT_CODE_ALPHABET[b & 31] for b in secrets.token_bytes(n))
+
+def normalize_short_code(code: str) -> str:
+    """Código como o cliente digitou -> como está gravado (maiúsculas, sem espaços/hífens)."""
+    return (code or "").strip().replace("-", "").replace(" ", "").upper()
+
+def normalize_email(email: str) -> str:
+    """E-mails são gravados em minúsculas: buscas usam igualdade exata (e o índice)."""
+    return (email or "").strip().lower()
 
 def gen_otp(n: int = 6) -> str:
-    return "".join(random.choices(string.digits, k=n))
+    return str(secrets.randbelow(10 ** n)).zfill(n)
 
 def otp_expiry(minutes: int = 10):
     return timezone.now() + timedelta(minutes=minutes)
+
+class LazyModule:
+    """
+    Módulo importado só no primeiro acesso a um atributo. Mantém dependências
+    pesadas (requests, httpx, Pillow...) fora do boot dos workers que não as usam.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(importlib.import_module(self._name), attr)
+
+    def __repr__(self):
+        return f"<LazyModule {self._name}>"
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+def optional_import(name: str):
+    """Como lazy_import, mas None se o pacote não estiver instalado (sem importá-lo)."""
+    try:
+        found = importlib.util.find_spec(name)
+    except ModuleNotFoundError:  # pacote pai ausente (ex.: "PIL.Image" sem PIL)
+        found = None
+    return LazyModule(name) if found else None
@@ -1,25 +1,41 @@
+import hashlib
 import json
 import logging
 import os
+import secrets
 
+from asgiref.sync import sync_to_async
 from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
 from django.core.mail import send_mail
 from django.core.paginator import Paginator
 from django.db import transaction
-from django.db.models import F, Q
-from django.http import (HttpResponse, HttpResponseBadRequest,
-                         HttpResponseForbidden, JsonResponse)
-from django.shortcuts import redirect, get_object_or_404, render
+from django.db.models import F
+from django.http import (FileResponse, Http404, HttpResponse, HttpResponseBadRequest,
+                         HttpResponseForbidden, JsonResponse, StreamingHttpResponse)
+from django.shortcuts import aget_object_or_404, redirect, get_object_or_404, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
-from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_http_methods
+from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import csrf_exempt, ensure_csrf_cookie
+from django.views.decorators.http import condition, require_http_methods
 
+from .caching import get_or_compute
 from .cart import (add as cart_add, clear as cart_clear, items as cart_items,
-                   set_qty as cart_set_qty, total_cents as cart_total)
+                   set_qty as cart_set_qty, snapshot as cart_snapshot,
+                   total_cents as cart_total)
+from .catalog import (PAGE_SIZE, catalog_fingerprint, catalog_last_modified,
+                      only_columns, parse_fields, parse_filters, serialize_product,
+                      sorted_products)
+from . import catalog_index, categories, images, inventory, order_events, order_history, typeahead, webhooks
+from .facets import catalog_facets
+from .idempotency import client_scope, fingerprint, run_idempotent
+from .inventory import OutOfStock
 from .models import Category, Order, OrderItem, Product
-from .services.payments import MercadoPago
-from .utils import gen_otp, otp_expiry
+from .related import related_for
+from .services.payments import AsyncMercadoPago
+from .utils import gen_otp, normalize_email, normalize_short_code, otp_expiry
 
 from django.contrib.auth.decorators import login_required
 from .forms import ProductForm, CategoryForm
@@ -36,104 +52,188 @@ def catalog_view(request):
       - min_price / max_price (em reais) -> convertemos para centavos
       - sort: -created|created|price|-price|pop (popularidade desc)
       - page
+    Inclui facetas (contagem por categoria, destaques e faixas de preço).
     """
-    q = (request.GET.get("q") or "").strip()
-    cat = (request.GET.get("cat") or "").strip()
-    sort = (request.GET.get("sort") or "-created").strip()
-    featured = request.GET.get("featured") == "1"
-
-    def to_cents(val):
-        if not val:
-            return None
-        try:
-            return int(round(float(str(val).replace(",", ".")) * 100))
-        except Exception:
-            return None
-
-    min_cents = to_cents(request.GET.get("min_price"))
-    max_cents = to_cents(request.GET.get("max_price"))
-
-    products = Product.objects.filter(active=True)
-
-    print(f"--- Recebido: Categoria='{cat}', Ordenação='{sort}' ---")
-    print(f"1. Contagem de produtos ANTES do filtro: {products.count()}")
-
-    if q:
-        products = products.filter(Q(title__icontains=q) | Q(description__icontains=q))
-    if cat:
-        products = products.filter(category__slug=cat)
-    if featured:
-        products = products.filter(featured=True)
-    if min_cents is not None:
-        products = products.filter(price_cents__gte=min_cents)
-    if max_cents is not None:
-        products = products.filter(price_cents__lte=max_cents)
-
-    print(f"2. Contagem de produtos DEPOIS do filtro: {products.count()}")
-
-    sort_map = {
-        "created": "created_at",
-        "-created": "-created_at",
-        "price": "price_cents",
-        "-price": "-price_cents",
-        "pop": "-views",
-    }
-    products = products.order_by(sort_map.get(sort, "-created_at"))
+    filters = parse_filters(request.GET)
 
-    paginator = Paginator(products, 12)
+    products = sorted_products(filters).select_related("category")
+    indexed = catalog_index.search(filters, products)  # None: desligado ou com busca textual
+    paginator = Paginator(products if indexed is None else indexed, PAGE_SIZE)
     page_obj = paginator.get_page(request.GET.get("page"))
-    cats = Category.objects.all().order_by("name")
+    facets = catalog_facets(filters)
+
+    # menu e breadcrumbs vêm da árvore em cache; contagens somam as subcategorias
+    cats = categories.with_counts({c["path"]: c["count"] for c in facets["categories"]})
+
+    price_buckets = []
+    for b in facets["price_buckets"]:
+        params = request.GET.copy()
+        params.pop("page", None)
+        params["min_price"] = b["min_price"]
+        params["max_price"] = b["max_price"]
+        if not b["max_price"]:
+            params.pop("max_price")
+        price_buckets.append({**b, "querystring": params.urlencode()})
 
     ctx = {
         "products": page_obj.object_list,
         "page_obj": page_obj,
-        "q": q,
-        "sort": sort,
-        "cat": cat,
-        "featured_flag": featured,
+        "q": filters["q"],
+        "sort": filters["sort"],
+        "cat": filters["cat"],
+        "featured_flag": filters["featured"],
         "categories": cats,
+        "breadcrumbs": categories.breadcrumbs(filters["cat"]) if filters["cat"] else [],
+        "facets": facets,
+        "price_buckets": price_buckets,
         "min_price": request.GET.get("min_price") or "",
         "max_price": request.GET.get("max_price") or "",
     }
     return render(request, "shop/catalog.html", ctx)
 
 
+def _catalog_etag(request):
+    raw = f"{catalog_fingerprint()}|{request.GET.urlencode()}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def _catalog_last_modified(request):
+    return catalog_last_modified()
+
+
+@require_http_methods(["GET"])
+def api_suggest(request):
+    """
+    Sugestões para a caixa de busca: ?q=<prefixo>&limit=N. Responde do índice
+    em memória (shop/typeahead.py), sem consultar o banco na maioria das vezes.
+    """
+    q = (request.GET.get("q") or "").strip()[:80]
+    try:
+        limit = max(1, min(int(request.GET.get("limit", 8)), 20))
+    except ValueError:
+        return HttpResponseBadRequest("limit inválido")
+    results = typeahead.suggest(q, limit) if len(typeahead.normalize(q)) >= 2 else []
+    response = JsonResponse({"q": q, "results": results})
+    response["Cache-Control"] = "public, max-age=30"
+    return response
+
+
+@require_http_methods(["GET", "HEAD"])
+@condition(etag_func=_catalog_etag, last_modified_func=_catalog_last_modified)
+def api_catalog(request):
+    """
+    Versão JSON do catálogo: mesmos filtros/ordenação do `catalog_view`, mais
+      - fields=id,title,...  (sparse fieldset; ver catalog.API_FIELDS)
+      - facets=0             (omite as facetas)
+    Responde 304 quando ETag/Last-Modified do cliente ainda são válidos.
+    """
+    filters = parse_filters(request.GET)
+    fields = parse_fields(request.GET.get("fields"))
+
+    products = sorted_products(filters)
+    if "category" in fields:
+        products = products.select_related("category")
+    products = products.only(*only_columns(fields))
+    indexed = catalog_index.search(filters, products)
+
+    paginator = Paginator(products if indexed is None else indexed, PAGE_SIZE)
+    page_obj = paginator.get_page(request.GET.get("page"))
+
+    data = {
+        "results": [serialize_product(p, fields) for p in page_obj.object_list],
+        "page": page_obj.number,
+        "num_pages": paginator.num_pages,
+        "count": paginator.count,
+        "filters": filters,
+    }
+    if request.GET.get("facets") != "0":
+        data["facets"] = catalog_facets(filters)
+    return JsonResponse(data)
+
+
+@require_http_methods(["GET", "HEAD"])
+def product_image(request, pk, width, key):
+    """
+    Miniatura WebP do `image_url` do produto, cacheada em disco.
+    `key` identifica a URL de origem, então a resposta pode ser imutável.
+    """
+    product = get_object_or_404(Product.objects.only("image_url"), pk=pk)
+    if not product.image_url or width not in images.widths():
+        raise Http404("imagem não encontrada")
+    if key != images.url_key(product.image_url):
+        return redirect("shop:product_image", pk=pk, width=width, key=images.url_key(product.image_url))
+
+    try:
+        path = images.thumbnail(product.image_url, width)
+    except images.ImageError as e:
+        log.warning("thumbnail indisponível para produto %s: %s", pk, e)
+        return redirect(product.image_url)
+
+    response = FileResponse(open(path, "rb"), content_type="image/webp")
+    response["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
+
+def product_context(product):
+    """Contexto da página do produto (também usado pelo snapshot estático)."""
+    return {
+        "product": product,
+        "related_products": related_for(product),
+        "breadcrumbs": categories.breadcrumbs(pk=product.category_id) if product.category_id else [],
+    }
+
+
 def product_detail(request, slug):
     product = get_object_or_404(Product, slug=slug, active=True)
     Product.objects.filter(pk=product.pk).update(views=F("views") + 1)
     product.refresh_from_db(fields=["views"])
-    return render(request, "shop/product_detail.html", {"product": product})
+    return render(request, "shop/product_detail.html", product_context(product))
+
+
+@ensure_csrf_cookie
+@require_http_methods(["GET"])
+def api_csrf(request):
+    """Entrega o cookie csrftoken para páginas servidas do snapshot estático (sem Django)."""
+    response = HttpResponse(status=204)
+    response["Cache-Control"] = "private, no-store"
+    return response
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def create_checkout(request):
-    """Cria Order + Preference no MP (ou mock) e retorna a URL do checkout."""
+async def create_checkout(request):
+    """
+    Cria Order + Preference no MP (ou mock) e retorna a URL do checkout.
+    Com `Idempotency-Key`, repetições do mesmo payload devolvem o mesmo pedido.
+    """
     try:
         payload = json.loads(request.body)
     except Exception:
         return HttpResponseBadRequest("JSON inválido")
 
+    return await run_idempotent(
+        request, client_scope(request, "create_checkout"), fingerprint(payload),
+        lambda: _create_checkout(request, payload),
+    )
+
+
+async def _create_checkout(request, payload):
     product_id = payload.get("product_id")
     qty = int(payload.get("qty", 1))
     email = payload.get("email", "")
     phone = payload.get("phone", "")
 
-    product = get_object_or_404(Product, pk=product_id, active=True)
+    product = await aget_object_or_404(Product, pk=product_id, active=True)
+    if qty < 1:
+        return HttpResponseBadRequest("qty inválida")
 
-    if product.stock is not None and qty > product.stock > 0:
+    try:
+        order = await sync_to_async(_open_order)(email, phone, [(product, qty)])
+    except OutOfStock:
         return HttpResponseBadRequest("Sem estoque suficiente")
 
-    order = Order.objects.create(
-        customer_email=email,
-        customer_phone=phone,
-        total_cents=product.price_cents * qty,
-        payment_provider="mercadopago",
-    )
-    OrderItem.objects.create(order=order, product=product, qty=qty, unit_price_cents=product.price_cents)
-
     try:
-        pref = MercadoPago.create_preference(
+        pref = await AsyncMercadoPago.create_preference(
             title=product.title,
             quantity=qty,
             unit_price=product.price_cents / 100.0,
@@ -141,10 +241,11 @@ def create_checkout(request):
             payer_email=email,
         )
     except Exception as e:
+        await sync_to_async(_abandon_order)(order)
         return JsonResponse({"error": f"Falha no checkout: {e}"}, status=502)
 
     order.payment_provider_id = pref.get("id", "")
-    order.save(update_fields=["payment_provider_id"])
+    await order.asave(update_fields=["payment_provider_id"])
 
     return JsonResponse({
         "order_id": order.id,
@@ -154,57 +255,104 @@ def create_checkout(request):
     })
 
 
+def _open_order(email, phone, lines):
+    """
+    Cria pedido, itens e reservas de estoque numa transação: se faltar
+    estoque para qualquer item (OutOfStock), nada fica gravado.
+    """
+    with transaction.atomic():
+        order = Order.objects.create(
+            customer_email=email,
+            customer_phone=phone,
+            total_cents=sum(p.price_cents * qty for p, qty in lines),
+            items_count=sum(qty for _, qty in lines),
+            payment_provider="mercadopago",
+        )
+        OrderItem.objects.bulk_create(
+            [OrderItem(order=order, product=p, qty=qty, unit_price_cents=p.price_cents) for p, qty in lines]
+        )
+        inventory.reserve(order, [(p.pk, qty) for p, qty in lines])
+    return order
+
+
+def _abandon_order(order):
+    """Checkout que não chegou ao provedor: cancela o pedido e devolve as unidades."""
+    with transaction.atomic():
+        if Order.objects.filter(pk=order.pk, status="pending").update(status="canceled"):
+            order_events.publish_on_commit(order.public_token, "canceled")
+        inventory.release_orders([order.pk])
+
+
+def _apply_payment_status(order, status):
+    """Aplica o status do provedor ao pedido (baixa de estoque só uma vez)."""
+    if status in ("approved", "accredited"):
+        if order.status != "paid":
+            with transaction.atomic():
+                # reservas viram baixa; update condicional no banco (atualiza a versão do catálogo)
+                inventory.convert_order(order)
+                order.status = "paid"
+                order.save(update_fields=["status"])
+                order_events.publish_on_commit(order.public_token, order.status)
+    elif status in ("cancelled", "rejected", "expired"):
+        if order.status != "canceled":
+            with transaction.atomic():
+                inventory.release_orders([order.pk])
+                order.status = "canceled"
+                order.save(update_fields=["status"])
+                order_events.publish_on_commit(order.public_token, order.status)
+
+
 @csrf_exempt
 @require_http_methods(["POST"])
-def mp_webhook(request):
-    """Processa eventos do Mercado Pago. Espera `data.id` de payment."""
+async def mp_webhook(request):
+    """
+    Processa eventos do Mercado Pago. Espera `data.id` de payment (query string
+    ou corpo). A assinatura é conferida antes de consultar a API de pagamentos.
+    """
     try:
         event = json.loads(request.body)
     except Exception:
+        webhooks.count("malformed")
         return HttpResponseBadRequest("payload inválido")
+    if not isinstance(event, dict):
+        event = {}
+
+    data_id = request.GET.get("data.id") or (event.get("data") or {}).get("id")
+    try:
+        webhooks.verify(request.headers, data_id)
+    except webhooks.InvalidWebhook as exc:
+        webhooks.count(exc.reason)
+        # 200 no replay: o evento já foi aceito uma vez, não há o que reenviar
+        return HttpResponse(status=200 if exc.reason == "replay" else 401)
 
-    data_id = (event.get("data") or {}).get("id")
     if not data_id:
+        webhooks.count("ignored")
         return HttpResponse(status=200)
 
-    info = MercadoPago.get_payment_info(str(data_id))
+    info = await AsyncMercadoPago.get_payment_info(str(data_id))
     status = (info.get("status") or "").lower()
     external_reference = info.get("external_reference")
 
     order = None
     if external_reference:
         try:
-            order = Order.objects.get(pk=int(external_reference))
+            order = await Order.objects.aget(pk=int(external_reference))
         except (Order.DoesNotExist, ValueError):
             order = None
 
     if order is None:
-        order = Order.objects.filter(status="pending").order_by("-created_at").first()
+        order = await Order.objects.filter(status="pending").order_by("-created_at").afirst()
 
     if not order:
+        webhooks.count("ignored")
         return HttpResponse(status=200)
 
-    if status in ("approved", "accredited"):
-        if order.status != "paid":
-            with transaction.atomic():
-                items = list(order.items.select_related("product").all())
-                for it in items:
-                    p = it.product
-                    new_stock = p.stock - it.qty
-                    if new_stock < 0:
-                        new_stock = 0
-                    p.stock = new_stock
-                    p.save(update_fields=["stock"])
-                order.status = "paid"
-                order.save(update_fields=["status"])
-    elif status in ("cancelled", "rejected", "expired"):
-        if order.status != "canceled":
-            order.status = "canceled"
-            order.save(update_fields=["status"])
+    await sync_to_async(_apply_payment_status)(order, status)
+    webhooks.count("processed")
 
     if order.customer_email:
         try:
-            send_mail(
+            await sync_to_async(send_mail)(
                 subject="Pedido atualizado",
                 message=(
                     f"Seu pedido {order.short_code} está: {order.status}.\n"
@@ -222,7 +370,7 @@ def mp_webhook(request):
 
 @csrf_exempt
 @require_http_methods(["POST"])
-def orders_lookup(request):
+async def orders_lookup(request):
     """
     Cliente envia:
       - email + short_code  -> lookup específico
@@ -234,22 +382,18 @@ def orders_lookup(request):
     except Exception:
         return HttpResponseBadRequest("JSON inválido")
 
-    email = (payload.get("email") or "").strip()
-    short = (payload.get("short_code") or "").strip()
+    email = normalize_email(payload.get("email"))
+    short = normalize_short_code(payload.get("short_code"))
 
     if not email:
         return HttpResponseBadRequest("email é obrigatório")
 
     try:
         if short:
-            order = Order.objects.get(customer_email__iexact=email, short_code__iexact=short)
+            # short_code e e-mail são gravados normalizados: igualdade exata usa os índices
+            order = await Order.objects.aget(customer_email=email, short_code=short)
         else:
-            order = (
-                Order.objects
-                .filter(customer_email__iexact=email)
-                .order_by("-created_at")
-                .first()
-            )
+            order = await Order.objects.filter(customer_email=email).order_by("-created_at", "-id").afirst()
             if not order:
                 return HttpResponseBadRequest("nenhum pedido encontrado para este e-mail")
     except Order.DoesNotExist:
@@ -258,9 +402,9 @@ def orders_lookup(request):
     otp = gen_otp()
     order.otp_code = otp
     order.otp_expires_at = otp_expiry(10)
-    order.save(update_fields=["otp_code", "otp_expires_at"])
+    await order.asave(update_fields=["otp_code", "otp_expires_at"])
 
-    send_mail(
+    await sync_to_async(send_mail)(
         subject="Seu código de verificação",
         message=f"Seu código é: {otp}. Ele expira em 10 minutos.",
         from_email=getattr(settings, "DEFAULT_FROM_EMAIL", None),
@@ -274,21 +418,29 @@ def orders_lookup(request):
 @csrf_exempt
 @require_http_methods(["POST"])
 def verify_otp(request):
+    """
+    Confere o OTP enviado por orders_lookup (sem short_code: o do pedido mais
+    recente do e-mail). Devolve o link do pedido e um token curto para o
+    histórico de pedidos daquele e-mail (orders_history).
+    """
     try:
         payload = json.loads(request.body)
     except Exception:
         return HttpResponseBadRequest("JSON inválido")
 
-    email = payload.get("email")
-    short = payload.get("short_code")
+    email = normalize_email(payload.get("email"))
+    short = normalize_short_code(payload.get("short_code"))
     otp = payload.get("otp")
 
-    if not (email and short and otp):
+    if not (email and otp):
         return HttpResponseBadRequest("campos obrigatórios faltando")
+    otp = str(otp).strip()
+    if not (otp.isascii() and otp.isdigit()):  # compare_digest só aceita ASCII
+        return HttpResponseBadRequest("código inválido")
 
-    try:
-        order = Order.objects.get(customer_email__iexact=email, short_code__iexact=short)
-    except Order.DoesNotExist:
+    orders = Order.objects.filter(customer_email=email)
+    order = orders.filter(short_code=short).first() if short else orders.order_by("-created_at", "-id").first()
+    if order is None:
         return HttpResponseBadRequest("pedido não encontrado")
 
     if not order.otp_code or not order.otp_expires_at:
@@ -297,26 +449,96 @@ def verify_otp(request):
     if timezone.now() > order.otp_expires_at:
         return HttpResponseBadRequest("código expirado")
 
-    if str(otp) != order.otp_code:
+    if not secrets.compare_digest(otp, order.otp_code):
         return HttpResponseForbidden("código incorreto")
 
-    return JsonResponse({"public_url": request.build_absolute_uri(f"/pedido/{order.public_token}/")})
+    return JsonResponse({
+        "public_url": request.build_absolute_uri(f"/pedido/{order.public_token}/"),
+        "history_token": order_history.issue_token(email),
+        "history_url": request.build_absolute_uri(reverse("shop:orders_history")),
+    })
+
+
+@require_http_methods(["GET"])
+def orders_history(request):
+    """
+    Pedidos do e-mail verificado, mais recentes primeiro. Token no cabeçalho
+    `Authorization: Bearer <history_token>` (ou ?token=); próxima página com
+    ?cursor=<next_cursor>.
+    """
+    auth = request.headers.get("Authorization", "")
+    token = auth[7:] if auth.startswith("Bearer ") else request.GET.get("token")
+    email = order_history.read_token(token)
+    if not email:
+        return HttpResponseForbidden("token inválido ou expirado")
+    try:
+        rows, next_cursor = order_history.orders_page(email, request.GET.get("cursor"))
+    except order_history.InvalidCursor:
+        return HttpResponseBadRequest("cursor inválido")
+    results = [
+        {
+            "short_code": row["short_code"],
+            "status": row["status"],
+            "total_cents": row["total_cents"],
+            "items_count": row["items_count"],
+            "created_at": row["created_at"].isoformat(),
+            "public_url": request.build_absolute_uri(f"/pedido/{row['public_token']}/"),
+        }
+        for row in rows
+    ]
+    response = JsonResponse({"results": results, "next_cursor": next_cursor})
+    response["Cache-Control"] = "private, no-store"
+    return response
+
+
+def _order_items_summary(order):
+    """Tabela de itens renderizada (não muda depois do checkout) + total de unidades."""
+    items = list(order.items.select_related("product"))
+    html = render_to_string("shop/_order_items.html", {"order": order, "items": items})
+    return {"html": html, "items_count": sum(it.qty for it in items)}
 
 
 def order_status(request, public_token):
     """
-    Página de status do pedido com resumo dos itens.
+    Página de status do pedido com resumo dos itens. O resumo vem do cache;
+    mudanças de status chegam pelo stream SSE (order_status_stream).
     """
-    order = get_object_or_404(Order.objects.prefetch_related("items__product"), public_token=public_token)
-    items = list(order.items.all())
+    order = get_object_or_404(Order, public_token=public_token)
+    summary = get_or_compute(
+        "order-items", str(order.pk), lambda: _order_items_summary(order),
+        timeout=getattr(settings, "ORDER_SUMMARY_TTL", 3600), tags=("catalog",),
+    )
     ctx = {
         "order": order,
-        "items": items,
-        "items_count": sum(it.qty for it in items),
+        "items_html": mark_safe(summary["html"]),
+        "items_count": summary["items_count"],
     }
     return render(request, "shop/order_status.html", ctx)
 
 
+async def order_status_stream(request, public_token):
+    """
+    Server-sent events com o status do pedido: uma leitura no banco na conexão,
+    depois só o canal de notificações (shop/order_events.py). Sob WSGI um
+    gerador async seria lido inteiro antes de responder (e prenderia a thread
+    por ORDER_STREAM_MAX_SECONDS), então ali a resposta é curta e o navegador
+    reconecta após o `retry:`.
+    """
+    status = await Order.objects.filter(public_token=public_token).values_list("status", flat=True).afirst()
+    if status is None:
+        raise Http404("pedido não encontrado")
+    if isinstance(request, ASGIRequest):
+        max_seconds = float(getattr(settings, "ORDER_STREAM_MAX_SECONDS", 300))
+        response = StreamingHttpResponse(
+            order_events.status_stream(public_token, status, max_seconds), content_type="text/event-stream"
+        )
+    else:
+        response = HttpResponse(order_events.status_snapshot(status), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # nginx: não segurar o stream em buffer
+    return response
+
+
 def checkout_success(request):
     return render(request, "shop/checkout_success.html")
 
@@ -368,7 +590,12 @@ def api_cart_clear(request):
 
 
 @require_http_methods(["POST"])
-def checkout_from_cart(request):
+async def checkout_from_cart(request):
+    """
+    Fecha o carrinho da sessão. Com `Idempotency-Key`, duplicatas (mesma chave
+    e mesmo carrinho, ou carrinho já consumido pelo pedido original) recebem
+    a resposta do primeiro checkout.
+    """
     try:
         data = json.loads(request.body or "{}")
     except Exception:
@@ -377,29 +604,29 @@ def checkout_from_cart(request):
     email = (data.get("email") or "").strip()
     phone = (data.get("phone") or "").strip()
 
-    cart = cart_items(request.session)
+    snapshot = await sync_to_async(cart_snapshot)(request.session)
+    fp = fingerprint(snapshot, email, phone) if snapshot else None
+    return await run_idempotent(request, client_scope(request, "checkout_from_cart"), fp, lambda: _checkout_from_cart(request, email, phone))
+
+
+async def _checkout_from_cart(request, email, phone):
+    # sessão e carrinho usam o ORM síncrono
+    cart = await sync_to_async(cart_items)(request.session)
     if not cart:
         return HttpResponseBadRequest("carrinho vazio")
 
-    for p, qty in cart:
-        if p.stock is not None and qty > p.stock > 0:
-            return HttpResponseBadRequest(f"sem estoque suficiente para {p.title}")
-
-    order_total = sum(p.price_cents * qty for p, qty in cart)
-    order = Order.objects.create(
-        customer_email=email,
-        customer_phone=phone,
-        total_cents=order_total,
-        payment_provider="mercadopago",
-    )
-    for p, qty in cart:
-        OrderItem.objects.create(order=order, product=p, qty=qty, unit_price_cents=p.price_cents)
+    try:
+        order = await sync_to_async(_open_order)(email, phone, cart)
+    except OutOfStock as e:
+        title = next((p.title for p, _ in cart if p.pk == e.product_id), e.product_id)
+        return HttpResponseBadRequest(f"sem estoque suficiente para {title}")
+    order_total = order.total_cents
 
     distinct = len(cart)
     title = f"Pedido ({distinct} item{'s' if distinct != 1 else ''})"
 
     try:
-        pref = MercadoPago.create_preference(
+        pref = await AsyncMercadoPago.create_preference(
             title=title,
             quantity=1,
             unit_price=order_total / 100.0,
@@ -407,11 +634,12 @@ def checkout_from_cart(request):
             payer_email=email,
         )
     except Exception as e:
+        await sync_to_async(_abandon_order)(order)
         return JsonResponse({"error": f"Falha no checkout: {e}"}, status=502)
 
     order.payment_provider_id = pref.get("id", "")
-    order.save(update_fields=["payment_provider_id"])
-    cart_clear(request.session)
+    await order.asave(update_fields=["payment_provider_id"])
+    await sync_to_async(cart_clear)(request.session)
 
     return JsonResponse({
         "order_id": order.id,
@@ -461,7 +689,7 @@ def editar_produto_view(request, pk):
 
 @login_required
 def lista_categorias_view(request):
-    categorias = Category.objects.all().order_by('name')
+    categorias = Category.objects.all().order_by('path')  # subcategorias logo abaixo do pai
     return render(request, 'shop/painel/lista_categorias.html', {'categories': categorias})
 
 @login_required
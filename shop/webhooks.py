@@ -0,0 +1,133 @@
+"""
+Validação das notificações do Mercado Pago antes de qualquer trabalho caro
+(chamada à API de pagamentos, escrita no banco).
+
+O cabeçalho `x-signature: ts=<timestamp>,v1=<hmac>` assina o manifesto
+`id:<data.id>;request-id:<x-request-id>;ts:<ts>;` com HMAC-SHA256 e a chave
+MERCADO_PAGO_WEBHOOK_SECRET. Além da assinatura, recusamos:
+  - `ts` fora da janela MERCADO_PAGO_WEBHOOK_TOLERANCE (replay tardio)
+  - a mesma assinatura vista de novo dentro da janela (replay imediato)
+Sem chave configurada (dev/testes), a verificação é desligada.
+"""
+import hashlib
+import hmac
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+
+SEEN_MAX = 10000  # assinaturas lembradas por processo
+_V1_RE = re.compile(r"[0-9a-fA-F]{64}")  # HMAC-SHA256 em hexadecimal
+
+
+class InvalidWebhook(Exception):
+    """Notificação recusada; `reason` vira o rótulo da métrica."""
+
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def webhook_secret():
+    return getattr(settings, "MERCADO_PAGO_WEBHOOK_SECRET", "") or ""
+
+
+def tolerance():
+    return int(getattr(settings, "MERCADO_PAGO_WEBHOOK_TOLERANCE", 300))
+
+
+def count(result):
+    metrics.registry.counter(
+        "mp_webhook_events_total", "Notificações do Mercado Pago por resultado."
+    ).inc(result=result)
+
+
+def parse_signature(header):
+    """
+    'ts=1704908010,v1=abc...' -> (ts, v1 em minúsculas). Levanta InvalidWebhook
+    se faltar algo ou se v1 não for hex: compare_digest recusa str não-ASCII
+    com TypeError, e a mesma assinatura em maiúsculas escaparia do replay.
+    """
+    parts = {}
+    for item in (header or "").split(","):
+        key, sep, value = item.strip().partition("=")
+        if sep:
+            parts[key] = value
+    if not parts.get("ts") or not _V1_RE.fullmatch(parts.get("v1", "")):
+        raise InvalidWebhook("malformed")
+    return parts["ts"], parts["v1"].lower()
+
+
+def manifest(data_id, request_id, ts):
+    # ids alfanuméricos são assinados em minúsculas; partes ausentes saem do manifesto
+    out = f"id:{str(data_id).lower()};" if data_id else ""
+    if request_id:
+        out += f"request-id:{request_id};"
+    return out + f"ts:{ts};"
+
+
+def sign(secret, data_id, request_id, ts):
+    return hmac.new(secret.encode(), manifest(data_id, request_id, ts).encode(), hashlib.sha256).hexdigest()
+
+
+def _timestamp(ts):
+    try:
+        value = int(ts)
+    except ValueError:
+        raise InvalidWebhook("malformed")
+    return value / 1000 if value > 10**12 else value  # aceita segundos ou milissegundos
+
+
+class SeenSignatures:
+    """Conjunto LRU limitado de assinaturas já aceitas, com validade."""
+
+    def __init__(self, maxsize=SEEN_MAX):
+        self.maxsize = maxsize
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, key, ttl, now=None):
+        """True se `key` é nova (e passa a ser lembrada por `ttl` segundos)."""
+        now = now if now is not None else time.time()
+        with self._lock:
+            expires = self._items.get(key)
+            if expires is not None and expires > now:
+                return False
+            self._items[key] = now + ttl
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+seen = SeenSignatures()
+
+
+def verify(headers, data_id, now=None):
+    """
+    Confere assinatura, janela de tempo e replay. Retorna sem erro quando a
+    notificação deve ser processada; levanta InvalidWebhook caso contrário.
+    """
+    secret = webhook_secret()
+    if not secret:
+        return
+    ts, received = parse_signature(headers.get("x-signature"))
+    now = now if now is not None else time.time()
+    window = tolerance()
+    if abs(now - _timestamp(ts)) > window:
+        raise InvalidWebhook("stale")
+    expected = sign(secret, data_id, headers.get("x-request-id"), ts)
+    if not hmac.compare_digest(expected, received):
+        raise InvalidWebhook("signature")
+    # local primeiro (sem ida ao cache); o cache compartilhado pega o replay em outro worker
+    if not seen.add(received, window, now) or not cache.add(f"mp-webhook:{received}", 1, window * 2):
+        raise InvalidWebhook("replay")